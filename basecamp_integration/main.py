@@ -2,6 +2,8 @@ import json
 import base64
 import os
 import requests # Could be used for Basecamp API calls in real scenario
+from shared.idempotency import SideEffectInProgress, run_side_effect_once
+from shared.profiling import profiled
 
 # --- Configuration ---
 # !!! IMPORTANT: REPLACE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID !!!
@@ -59,6 +61,7 @@ def create_basecamp_todo(todo_title, todo_description):
 
     return "SIMULATED_BASECAMP_TODO_ID_XYZ" # Return a dummy ID for simulation
 
+@profiled
 def basecamp_integration_entrypoint(event, context):
     """
     Cloud Function entry point for Basecamp Integration.
@@ -98,14 +101,20 @@ def basecamp_integration_entrypoint(event, context):
                 f"\n---\nAutomated by InsightStream AI"
             )
 
-            basecamp_id = create_basecamp_todo(title, description)
-            if basecamp_id:
+            # Redeliveries of an already-filed message stop here (see shared/idempotency.py).
+            created, basecamp_id = run_side_effect_once("basecamp", message_id, lambda: create_basecamp_todo(title, description))
+            if not created:
+                print(f"Skipping duplicate delivery of feature request {message_id}. Basecamp To-do: {basecamp_id}")
+            elif basecamp_id:
                 print(f"Successfully processed feature request {message_id}. Simulated Basecamp To-do ID: {basecamp_id}")
             else:
                 print(f"Failed to simulate Basecamp To-do creation for {message_id}.")
         else:
             print(f"No Basecamp action for category '{category}'. Data is stored and other integrations handled.")
 
+    except SideEffectInProgress as e:
+        print(f"WARNING: {e}; failing this delivery so Pub/Sub redelivers it.")
+        raise
     except json.JSONDecodeError as e:
         print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}. Raw data: {message_data_b64}")
     except Exception as e:
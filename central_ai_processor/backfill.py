@@ -0,0 +1,243 @@
+"""
+Re-enriches historical rows in enriched_feedback after category rules, the competitor
+list, the category model or prompts change (i.e. after PROCESSOR_VERSION is bumped).
+
+Pipeline:
+  1. Rows are streamed in message_id order with a server-side cursor.
+  2. Local steps (preprocessing, low-value filter, category model, competitor detection)
+     run in a process pool, one chunk per task.
+  3. Remote steps (NLP sentiment, Gemini replies) are opt-in and run with bounded
+     asyncio concurrency.
+  4. Results are written back with one multi-row upsert per chunk, tagged with
+     PROCESSOR_VERSION, and the last committed message_id is checkpointed so an
+     interrupted run resumes where it stopped.
+
+Usage (from the repository root, with DB_* or DB_SQLITE_PATH set):
+    python -m central_ai_processor.backfill --workers 8
+    python -m central_ai_processor.backfill --refresh-sentiment --remote-concurrency 32
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import datetime
+import json
+import os
+import sys
+import time
+
+from shared.db import execute, get_db_connection, load_json, row_updated_at, stream_dicts
+from shared.schema import ensure_schema
+
+from central_ai_processor.feedback_filter import DEFAULT_FILTER_POLICY, should_filter_feedback
+from central_ai_processor.main import (
+    FILTERED_CATEGORY, PROCESSOR_VERSION, analyze_sentiment_with_nlp, apply_category_overrides,
+    classify_category_with_keywords, detect_competitors, generate_auto_reply_with_gemini,
+    get_category_classifier,
+)
+from central_ai_processor.text_preprocessing import preprocess_feedback_text
+
+DEFAULT_CHECKPOINT_PATH = "backfill_checkpoint.json"
+# Historical rows are not a live stream, so the per-author rate limit does not apply.
+BACKFILL_FILTER_POLICY = dict(DEFAULT_FILTER_POLICY, author_rate_limit=float("inf"))
+
+ROWS_SQL = """
+SELECT message_id, text_content, source_platform, author_info, sentiment, auto_reply_text, auto_reply_template
+FROM enriched_feedback
+WHERE message_id > %s {version_filter}
+ORDER BY message_id
+"""
+STALE_VERSION_FILTER = "AND (processor_version IS NULL OR processor_version <> %s)"
+
+UPSERT_SQL = """
+INSERT INTO enriched_feedback (
+    message_id, sentiment, category, detected_competitors, auto_reply_text, auto_reply_template,
+    processing_timestamp_utc, processor_version, updated_at
+) VALUES {values}
+ON CONFLICT (message_id) DO UPDATE SET
+    sentiment = EXCLUDED.sentiment,
+    category = EXCLUDED.category,
+    detected_competitors = EXCLUDED.detected_competitors,
+    auto_reply_text = EXCLUDED.auto_reply_text,
+    auto_reply_template = EXCLUDED.auto_reply_template,
+    processing_timestamp_utc = EXCLUDED.processing_timestamp_utc,
+    processor_version = EXCLUDED.processor_version,
+    updated_at = EXCLUDED.updated_at
+"""
+UPSERT_COLUMNS = 9
+
+# --- Checkpointing ---
+def load_checkpoint(path):
+    """Returns (last committed message_id, rows done) for this PROCESSOR_VERSION."""
+    if not os.path.exists(path):
+        return "", 0
+    with open(path) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    if checkpoint.get("processor_version") != PROCESSOR_VERSION:
+        print(f"Checkpoint is for processor version {checkpoint.get('processor_version')}; starting over.")
+        return "", 0
+    return checkpoint["last_message_id"], checkpoint.get("rows_done", 0)
+
+def save_checkpoint(path, last_message_id, rows_done):
+    """Atomically records progress after a chunk has been committed."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as checkpoint_file:
+        json.dump({
+            "processor_version": PROCESSOR_VERSION,
+            "last_message_id": last_message_id,
+            "rows_done": rows_done,
+            "updated_at": datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        }, checkpoint_file)
+    os.replace(temp_path, path)
+
+# --- Local Stage (process pool) ---
+def enrich_rows_locally(rows):
+    """
+    Runs in a pool worker: preprocessing, low-value filter, batched category model
+    inference and competitor detection for one chunk of rows.
+    """
+    preprocessed = [preprocess_feedback_text(row["text_content"], row["source_platform"]) for row in rows]
+    texts = [item["nlp_text"] for item in preprocessed]
+
+    classifier = get_category_classifier()
+    if classifier is not None:
+        predictions = classifier.predict_batch(texts)
+    else:
+        predictions = [(classify_category_with_keywords(text.lower()), None) for text in texts]
+
+    results = []
+    for row, item, (category, confidence) in zip(rows, preprocessed, predictions):
+        feedback = {
+            "text_content": row["text_content"],
+            "source_platform": row["source_platform"],
+            "author_info": load_json(row["author_info"], {}),
+        }
+        is_filtered, _ = should_filter_feedback(feedback, item["clean_text"], BACKFILL_FILTER_POLICY)
+        results.append({
+            "message_id": row["message_id"],
+            "nlp_text": item["nlp_text"],
+            "prompt_text": item["prompt_text"],
+            "filtered": is_filtered,
+            "base_category": FILTERED_CATEGORY if is_filtered else category,
+            "detected_competitors": [] if is_filtered else detect_competitors(item["nlp_text"]),
+            "sentiment": None if is_filtered else row["sentiment"],
+            "auto_reply_text": None if is_filtered else row["auto_reply_text"],
+            "auto_reply_template": None if is_filtered else row["auto_reply_template"],
+        })
+    return results
+
+# --- Remote Stage (bounded asyncio concurrency) ---
+async def enrich_result_remotely(result, semaphore, refresh_sentiment, refresh_replies):
+    """Refreshes sentiment and/or the reply for one row, then applies the category overrides."""
+    if result["filtered"]:
+        result["category"] = result["base_category"]
+        return result
+
+    if refresh_sentiment:
+        async with semaphore:
+            result["sentiment"] = await asyncio.to_thread(analyze_sentiment_with_nlp, result["nlp_text"])
+
+    result["category"] = apply_category_overrides(
+        result["base_category"], result["sentiment"], result["detected_competitors"]
+    )
+
+    if refresh_replies:
+        async with semaphore:
+            result["auto_reply_text"] = await asyncio.to_thread(
+                generate_auto_reply_with_gemini, result["prompt_text"], result["sentiment"], result["category"]
+            )
+        result["auto_reply_template"] = None # The regenerated reply no longer comes from a template
+    return result
+
+async def process_chunk(pool, rows, semaphore, refresh_sentiment, refresh_replies):
+    """Runs one chunk through the local stage (pool) and then the remote stage (asyncio)."""
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(pool, enrich_rows_locally, rows)
+    return await asyncio.gather(*(
+        enrich_result_remotely(result, semaphore, refresh_sentiment, refresh_replies) for result in results
+    ))
+
+# --- Write Stage ---
+def upsert_results(conn, results):
+    """Writes one chunk of results with a single multi-row upsert."""
+    processed_at = datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    updated_at = row_updated_at()
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * UPSERT_COLUMNS) + ")"] * len(results))
+    params = []
+    for result in results:
+        params += [
+            result["message_id"], result["sentiment"], result["category"],
+            json.dumps(result["detected_competitors"]), result["auto_reply_text"], result["auto_reply_template"],
+            processed_at, PROCESSOR_VERSION, updated_at,
+        ]
+    execute(conn, UPSERT_SQL.format(values=placeholders), params)
+    conn.commit()
+
+async def run_backfill(args):
+    """Streams, enriches and writes back rows, keeping a bounded number of chunks in flight."""
+    read_conn, write_conn = get_db_connection(), get_db_connection()
+    ensure_schema(write_conn)
+
+    last_message_id, rows_done = load_checkpoint(args.checkpoint)
+    if last_message_id:
+        print(f"Resuming after message_id {last_message_id!r} ({rows_done} rows already done).")
+
+    version_filter = "" if args.all_rows else STALE_VERSION_FILTER
+    params = (last_message_id,) if args.all_rows else (last_message_id, PROCESSOR_VERSION)
+    chunks = stream_dicts(read_conn, ROWS_SQL.format(version_filter=version_filter), params, args.chunk_size)
+
+    semaphore = asyncio.Semaphore(args.remote_concurrency)
+    started, rows_this_run = time.time(), 0
+
+    async def commit(task):
+        nonlocal rows_done, rows_this_run
+        results = await task
+        if not args.dry_run:
+            await asyncio.to_thread(upsert_results, write_conn, results)
+            save_checkpoint(args.checkpoint, results[-1]["message_id"], rows_done + len(results))
+        rows_done += len(results)
+        rows_this_run += len(results)
+        rate = rows_this_run / max(time.time() - started, 1e-6)
+        print(f"Committed {rows_done} rows (last message_id {results[-1]['message_id']!r}, {rate:.0f} rows/s).")
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(args.workers, initializer=get_category_classifier) as pool:
+            in_flight = collections.deque()
+            while True:
+                rows = await asyncio.to_thread(next, chunks, None)
+                if rows is None:
+                    break
+                in_flight.append(asyncio.create_task(
+                    process_chunk(pool, rows, semaphore, args.refresh_sentiment, args.refresh_replies)
+                ))
+                # Commit strictly in stream order so the checkpoint only ever moves forward.
+                while len(in_flight) >= args.max_in_flight:
+                    await commit(in_flight.popleft())
+            while in_flight:
+                await commit(in_flight.popleft())
+    finally:
+        read_conn.close()
+        write_conn.close()
+
+    print(f"Backfill complete: {rows_this_run} rows re-enriched with processor version {PROCESSOR_VERSION} "
+          f"in {time.time() - started:.1f}s.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-enrich enriched_feedback with the current processor version.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Process pool size for local steps.")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Rows per chunk (and per upsert).")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Chunks in flight (default: 2 x workers).")
+    parser.add_argument("--remote-concurrency", type=int, default=16, help="Concurrent NLP/Gemini calls.")
+    parser.add_argument("--refresh-sentiment", action="store_true", help="Re-run NLP sentiment (paid).")
+    parser.add_argument("--refresh-replies", action="store_true", help="Regenerate Gemini replies (paid).")
+    parser.add_argument("--all-rows", action="store_true", help="Include rows already at the current version.")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Enrich but do not write or checkpoint.")
+    args = parser.parse_args(argv)
+    args.max_in_flight = args.max_in_flight or 2 * args.workers
+
+    asyncio.run(run_backfill(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import re
+import zlib
+
+import numpy as np
+
+# --- Local Category Classifier ---
+# A hashed-feature linear model (multinomial logistic regression) that replaces the
+# keyword rules in analyze_text_with_nlp. It runs on CPU with NumPy only: no network
+# call per message, and the saved model is a single compressed .npz that loads in
+# milliseconds at cold start.
+
+# Base categories predicted by the model. "negative_competitor_review" is not learned:
+# it is still derived from sentiment + detected competitors in analyze_text_with_nlp.
+CATEGORY_LABELS = ["bug_report", "feature_request", "general_feedback"]
+
+DEFAULT_HASH_BITS = 18 # 262,144 hashed features
+BIAS_FEATURE = "__bias__"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+CHAR_NGRAM_SIZE = 4 # Sub-word features so "crash", "crashes" and "crashing" share weights
+MODEL_FORMAT_VERSION = 1
+
+def feature_strings(text):
+    """Yields the raw (unhashed) features for a text: word unigrams/bigrams and char n-grams."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    yield BIAS_FEATURE
+    for i, token in enumerate(tokens):
+        yield "w:" + token
+        if i:
+            yield "b:" + tokens[i - 1] + " " + token
+        if len(token) > CHAR_NGRAM_SIZE:
+            padded = f"<{token}>"
+            for j in range(len(padded) - CHAR_NGRAM_SIZE + 1):
+                yield "c:" + padded[j:j + CHAR_NGRAM_SIZE]
+
+def hash_features(text, hash_bits=DEFAULT_HASH_BITS):
+    """
+    Hashing-trick feature extractor. Returns (indices, values) for one text: each feature
+    string is hashed with CRC32 into 2**hash_bits buckets, with a sign bit to cancel out
+    collisions on average, and the resulting vector is L2-normalized.
+    """
+    mask = (1 << hash_bits) - 1
+    buckets = {}
+    for feature in feature_strings(text):
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        index = hashed & mask
+        sign = 1.0 if (hashed >> 31) & 1 else -1.0
+        buckets[index] = buckets.get(index, 0.0) + sign
+
+    indices = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+    values = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+    norm = np.linalg.norm(values)
+    if norm:
+        values /= norm
+    return indices, values
+
+def vectorize_batch(texts, hash_bits=DEFAULT_HASH_BITS):
+    """
+    Vectorizes a batch of texts into CSR arrays (indptr, indices, values).
+    Every row has at least the bias feature, so no row is empty.
+    """
+    rows = [hash_features(text, hash_bits) for text in texts]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(indices) for indices, _ in rows])
+    if not rows:
+        return indptr, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indices = np.concatenate([indices for indices, _ in rows])
+    values = np.concatenate([values for _, values in rows])
+    return indptr, indices, values
+
+def csr_dot(indptr, indices, values, weights):
+    """Computes X @ weights for a CSR batch X without materializing X."""
+    contributions = weights[indices] * values[:, None]
+    return np.add.reduceat(contributions, indptr[:-1], axis=0)
+
+def softmax(scores):
+    """Row-wise softmax, stable for large scores."""
+    shifted = scores - scores.max(axis=1, keepdims=True)
+    exp_scores = np.exp(shifted)
+    return exp_scores / exp_scores.sum(axis=1, keepdims=True)
+
+class CategoryClassifier:
+    """Multinomial logistic regression over hashed features."""
+
+    def __init__(self, weights, labels=CATEGORY_LABELS, hash_bits=DEFAULT_HASH_BITS):
+        self.weights = weights.astype(np.float32, copy=False)
+        self.labels = list(labels)
+        self.hash_bits = hash_bits
+
+    @classmethod
+    def empty(cls, labels=CATEGORY_LABELS, hash_bits=DEFAULT_HASH_BITS):
+        """Returns an untrained classifier (all-zero weights)."""
+        return cls(np.zeros((1 << hash_bits, len(labels)), dtype=np.float32), labels, hash_bits)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a model saved with save()."""
+        with np.load(path, allow_pickle=False) as model_file:
+            if int(model_file["format_version"]) != MODEL_FORMAT_VERSION:
+                raise ValueError(f"Unsupported category model format in {path}")
+            hash_bits = int(model_file["hash_bits"])
+            labels = [str(label) for label in model_file["labels"]]
+            weights = np.zeros((1 << hash_bits, len(labels)), dtype=np.float32)
+            # Only non-zero rows are stored, which keeps the file small.
+            weights[model_file["rows"]] = model_file["row_weights"].astype(np.float32)
+        return cls(weights, labels, hash_bits)
+
+    def save(self, path):
+        """Saves the model as a compressed .npz holding only the non-zero weight rows (float16)."""
+        rows = np.flatnonzero(np.any(self.weights != 0, axis=1))
+        np.savez_compressed(
+            path,
+            format_version=np.int32(MODEL_FORMAT_VERSION),
+            hash_bits=np.int32(self.hash_bits),
+            labels=np.array(self.labels),
+            rows=rows.astype(np.int32),
+            row_weights=self.weights[rows].astype(np.float16),
+        )
+
+    def predict_proba_batch(self, texts):
+        """Returns an (n_texts, n_labels) array of class probabilities."""
+        if not texts:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        indptr, indices, values = vectorize_batch(texts, self.hash_bits)
+        return softmax(csr_dot(indptr, indices, values, self.weights))
+
+    def predict_batch(self, texts):
+        """Returns a list of (category, confidence) tuples, one per text."""
+        probabilities = self.predict_proba_batch(texts)
+        best = probabilities.argmax(axis=1)
+        return [(self.labels[label_index], float(probabilities[row, label_index]))
+                for row, label_index in enumerate(best)]
+
+    def predict(self, text):
+        """Returns (category, confidence) for a single text."""
+        return self.predict_batch([text])[0]
+
+    def partial_fit(self, texts, labels, learning_rate=0.2, l2=1e-6, sample_weights=None):
+        """
+        One mini-batch gradient step of multinomial logistic regression. The gradient is
+        summed (not averaged) over the batch, so the step size behaves like per-example SGD.
+        Returns the mean cross-entropy loss of the batch before the update.
+        """
+        indptr, indices, values = vectorize_batch(texts, self.hash_bits)
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        targets = np.array([label_index[label] for label in labels], dtype=np.int64)
+        sample_weights = (np.ones(len(texts), dtype=np.float32) if sample_weights is None
+                          else np.asarray(sample_weights, dtype=np.float32))
+
+        probabilities = softmax(csr_dot(indptr, indices, values, self.weights))
+        loss = -np.log(probabilities[np.arange(len(targets)), targets] + 1e-12)
+
+        errors = probabilities
+        errors[np.arange(len(targets)), targets] -= 1.0
+        errors *= sample_weights[:, None]
+
+        # Gradient X^T @ errors, accumulated per class with bincount (sparse-friendly).
+        row_of_entry = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        touched = np.unique(indices)
+        for class_index in range(len(self.labels)):
+            gradient = np.bincount(indices, weights=values * errors[row_of_entry, class_index],
+                                   minlength=self.weights.shape[0])
+            column = self.weights[:, class_index]
+            # Lazy L2: only decay the rows this batch touched.
+            column[touched] -= learning_rate * (gradient[touched] + l2 * column[touched])
+
+        return float(np.average(loss, weights=sample_weights))
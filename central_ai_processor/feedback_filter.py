@@ -0,0 +1,141 @@
+import collections
+import os
+import re
+import threading
+import time
+
+# --- Low-Value Feedback Filter ---
+# A cheap, local scoring stage that runs before any paid NLP/Gemini call. Messages that
+# score at or above the threshold are stored with category "filtered" and skip AI processing.
+#
+# FILTER_MODE:
+#   "enforce" - filtered messages skip the AI calls (default)
+#   "shadow"  - signals are scored and counted, but every message is still processed
+#   "off"     - the filter is bypassed entirely
+DEFAULT_FILTER_POLICY = {
+    "mode": os.environ.get("FILTER_MODE", "enforce"),
+    "score_threshold": float(os.environ.get("FILTER_SCORE_THRESHOLD", "1.0")),
+    "min_informative_tokens": int(os.environ.get("FILTER_MIN_INFORMATIVE_TOKENS", "2")),
+    "min_unique_token_ratio": float(os.environ.get("FILTER_MIN_UNIQUE_TOKEN_RATIO", "0.35")),
+    "max_links": int(os.environ.get("FILTER_MAX_LINKS", "2")),
+    "bot_authors": {name.strip().lower() for name in os.environ.get("FILTER_BOT_AUTHORS", "").split(",") if name.strip()},
+    "author_rate_limit": int(os.environ.get("FILTER_AUTHOR_RATE_LIMIT", "5")), # Messages per window, per author
+    "author_rate_window_seconds": int(os.environ.get("FILTER_AUTHOR_RATE_WINDOW_SECONDS", "3600")),
+}
+
+# How much each signal contributes to the filter score. Hard signals filter on their own.
+# Rate limiting is soft: a customer posting a long bug report thread is busy, not spam,
+# so it needs a second signal (spam phrase, repetition, a bot-like name) to filter.
+SIGNAL_WEIGHTS = {
+    "too_few_informative_tokens": 1.0,
+    "known_bot_author": 1.0,
+    "author_rate_limited": 0.6,
+    "spam_phrase": 0.6,
+    "repetitive": 0.6,
+    "too_many_links": 0.5,
+    "bot_like_author_name": 0.4,
+}
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "be", "to", "of", "in", "on",
+    "it", "this", "that", "i", "you", "me", "my", "we", "so", "lol", "omg", "wow", "ok", "yes", "no",
+}
+WORD_PATTERN = re.compile(r"\w[\w']+") # Unicode-aware: Cyrillic, Greek and accented Latin words count too
+# Scripts written without spaces between words (Chinese, Japanese, Thai): a whole sentence
+# is one "token", so such a token is enough to pass the informative-token rule.
+UNSEGMENTED_SCRIPT_PATTERN = re.compile(r"[\u0e00-\u0e7f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]")
+LINK_PATTERN = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+SPAM_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r"^\W*first\W*$",
+        r"\bfollow (me|back)\b",
+        r"\b(check|visit) (out )?my (profile|page|channel)\b",
+        r"\blink in (my )?bio\b",
+        r"\bdm me\b",
+        r"\b(promo|discount|coupon) code\b",
+        r"\bgiveaway\b",
+        r"\bfree (followers|likes|views)\b",
+        r"\bearn \$?\d+",
+    )
+]
+BOT_NAME_PATTERN = re.compile(r"(bot\d*|\d{6,})$", re.IGNORECASE)
+MAX_TRACKED_AUTHORS = 10000 # Bounds the rate limiter's memory
+
+# --- Counters ---
+# Per-instance counters, logged with every decision so they show up in Cloud Logging.
+FILTER_COUNTERS = collections.Counter()
+
+_author_history = collections.OrderedDict() # author key -> deque of message timestamps
+_author_history_lock = threading.Lock()
+
+def author_key(feedback):
+    """
+    Stable per-platform author identifier for bot lists and rate limiting. Returns
+    (key, name, handle): `handle` is the username/nickname only (empty when only a numeric
+    platform id is known), so bot-name heuristics never run on ids.
+    """
+    author_info = feedback.get("author_info") or {}
+    handle = str(author_info.get("username") or author_info.get("nickname") or "").lower()
+    name = handle or str(author_info.get("id") or "").lower()
+    return f"{feedback.get('source_platform')}:{name}", name, handle
+
+def is_author_rate_limited(key, policy, now=None):
+    """Records one message for `key` and returns True if it exceeds the per-author rate limit."""
+    now = time.time() if now is None else now
+    window_start = now - policy["author_rate_window_seconds"]
+    with _author_history_lock:
+        history = _author_history.pop(key, None) or collections.deque()
+        while history and history[0] < window_start:
+            history.popleft()
+        history.append(now)
+        _author_history[key] = history # Re-insert as most recently seen
+        while len(_author_history) > MAX_TRACKED_AUTHORS:
+            _author_history.popitem(last=False)
+        return len(history) > policy["author_rate_limit"]
+
+def score_feedback(feedback, clean_text, policy=DEFAULT_FILTER_POLICY):
+    """
+    Scores one normalized feedback message. `clean_text` is the preprocessed text
+    (see text_preprocessing.py). Returns (score, [signal names]).
+    """
+    signals = []
+    words = WORD_PATTERN.findall(clean_text.lower())
+    informative = [word for word in words if word not in STOPWORDS]
+
+    if len(informative) < policy["min_informative_tokens"] and not any(
+            UNSEGMENTED_SCRIPT_PATTERN.search(word) for word in informative):
+        signals.append("too_few_informative_tokens")
+    if len(words) >= 6 and len(set(words)) / len(words) < policy["min_unique_token_ratio"]:
+        signals.append("repetitive")
+    if any(pattern.search(clean_text) for pattern in SPAM_PATTERNS):
+        signals.append("spam_phrase")
+    if len(LINK_PATTERN.findall(feedback.get("text_content") or "")) > policy["max_links"]:
+        signals.append("too_many_links")
+
+    key, name, handle = author_key(feedback)
+    if name and name in policy["bot_authors"]:
+        signals.append("known_bot_author")
+    elif handle and BOT_NAME_PATTERN.search(handle):
+        signals.append("bot_like_author_name")
+    if name and is_author_rate_limited(key, policy):
+        signals.append("author_rate_limited")
+
+    return sum(SIGNAL_WEIGHTS[signal] for signal in signals), signals
+
+def should_filter_feedback(feedback, clean_text, policy=DEFAULT_FILTER_POLICY):
+    """
+    Applies the filter policy to one message and updates FILTER_COUNTERS.
+    Returns (filtered, signals); `filtered` is only ever True in "enforce" mode.
+    """
+    if policy["mode"] == "off":
+        return False, []
+
+    score, signals = score_feedback(feedback, clean_text, policy)
+    low_value = score >= policy["score_threshold"]
+
+    FILTER_COUNTERS["evaluated"] += 1
+    FILTER_COUNTERS["low_value" if low_value else "passed"] += 1
+    for signal in signals:
+        FILTER_COUNTERS[f"signal:{signal}"] += 1
+
+    return low_value and policy["mode"] == "enforce", signals
@@ -2,30 +2,54 @@ import json
 import base64
 import random # For simulating AI output
 import datetime
-from google.cloud import language_v1 # For actual NLP calls
-from google.cloud import pubsub_v1 # For publishing classified data
+import functools
+import os
 import re # For competitor detection (simple regex for demo)
-# For Vertex AI/GEMINI API calls
-from vertexai.preview.generative_models import GenerativeModel, Part
+# Google Cloud clients are created lazily (see shared/clients.py) to keep cold starts fast.
+from shared.clients import get_gemini_model, get_nlp_client, get_publisher, get_topic_path
+from shared.profiling import profiled
+
+try:
+    from .feedback_filter import FILTER_COUNTERS, should_filter_feedback
+    from .near_duplicate_index import NearDuplicateIndex, get_near_duplicate_index, sync_near_duplicate_index
+    from .reply_templates import TEMPLATE_COUNTERS, get_reply_template_library, reply_from_template
+    from .text_preprocessing import preprocess_feedback_text
+except ImportError: # Deployed as a standalone Cloud Function source directory
+    from feedback_filter import FILTER_COUNTERS, should_filter_feedback
+    from near_duplicate_index import NearDuplicateIndex, get_near_duplicate_index, sync_near_duplicate_index
+    from reply_templates import TEMPLATE_COUNTERS, get_reply_template_library, reply_from_template
+    from text_preprocessing import preprocess_feedback_text
 
 # --- Configuration ---
 # !!! IMPORTANT: REPLACE THESE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID AND TOPIC NAMES !!!
 PROJECT_ID = "zenithflow-feedback-automation"
 RAW_FEEDBACK_TOPIC_NAME = "raw-feedback-toc" # Topic this function consumes from
 CLASSIFIED_FEEDBACK_TOPIC_NAME = "classified-feedback-topics" # Topic this function publishes to
+# Reply lane: ai_processor_entrypoint requests replies on AUTO_REPLY_REQUESTS_TOPIC_NAME,
+# reply_generation_entrypoint answers with auto_reply_text patches on AUTO_REPLY_PATCHES_TOPIC_NAME
+# (consumed by data_storage_listener and email_reply_integration).
+AUTO_REPLY_REQUESTS_TOPIC_NAME = "auto-reply-requests"
+AUTO_REPLY_PATCHES_TOPIC_NAME = "auto-reply-patches"
+AUTO_REPLY_PATCH_RECORD_TYPE = "auto_reply_patch"
 REGION = "us-central1" # Your Google Cloud region
+GEMINI_MODEL_NAME = "gemini-2.5-pro" # Vertex AI / Gemini model used for reply generation
+# Bump whenever category rules, the competitor list, models or prompts change, so the
+# backfill (central_ai_processor/backfill.py) can find and re-enrich rows processed by older logic.
+PROCESSOR_VERSION = "2.0.0"
+# "google" uses the Natural Language API and Gemini. "local" swaps in an offline word-list
+# sentiment and a fixed reply, for development and the in-process runner (local_pipeline_runner.py).
+AI_BACKEND = os.environ.get("AI_BACKEND", "google")
+FALLBACK_REPLY_TEXT = "Thank you for your feedback!"
 
-# Pub/Sub client for publishing classified data
-publisher = pubsub_v1.PublisherClient()
-classified_feedback_topic_path = publisher.topic_path(PROJECT_ID, CLASSIFIED_FEEDBACK_TOPIC_NAME)
-
-# Google Cloud Natural Language API client (for real NLP)
-nlp_client = language_v1.LanguageServiceClient()
-
+classified_feedback_topic_path = get_topic_path(PROJECT_ID, CLASSIFIED_FEEDBACK_TOPIC_NAME)
+auto_reply_requests_topic_path = get_topic_path(PROJECT_ID, AUTO_REPLY_REQUESTS_TOPIC_NAME)
+auto_reply_patches_topic_path = get_topic_path(PROJECT_ID, AUTO_REPLY_PATCHES_TOPIC_NAME)
 
-# Vertex AI / Gemini API client
-# Use 'gemini-pro' for text generation
-gemini_model = GenerativeModel("gemini-2.5-pro")
+# Cloud Functions imports main.py while an instance starts, before its first event, so the
+# deployed ai_processor loads the reply template library (~65 ms) here instead of on the
+# first message. Tools that import this module for its helpers skip it.
+if os.environ.get("FUNCTION_TARGET") == "ai_processor_entrypoint":
+    get_reply_template_library()
 
 # --- Standardized Normalized Feedback Schema (Expected Input) ---
 # This schema must match the output of your connector functions.
@@ -44,11 +68,18 @@ NORMALIZED_SCHEMA = {
 ENRICHED_SCHEMA = NORMALIZED_SCHEMA.copy()
 ENRICHED_SCHEMA.update({
     "sentiment": None,               # e.g., "positive", "negative", "neutral"
-    "category": None,                # e.g., "bug_report", "feature_request", "general_feedback", "negative_competitor"
+    "category": None,                # e.g., "bug_report", "feature_request", "general_feedback", "negative_competitor", "filtered"
+    "category_confidence": None,     # Local classifier probability for the category (None for keyword rules)
     "detected_competitors": [],      # List of detected competitor names
-    "auto_reply_text": None,         # Generated reply for positive feedback
+    "auto_reply_text": None,         # Reply for positive feedback (usually filled in later by an auto_reply_text patch)
+    "auto_reply_pending": False,     # True if a reply was requested from the reply lane
+    "enrichment_reused_from": None,  # message_id of the near-duplicate whose enrichment was reused
+    "processor_version": None,       # PROCESSOR_VERSION that produced this enrichment
     "processing_timestamp_utc": None # When AI processing occurred
 })
+# Messages rejected by the low-value filter (feedback_filter.py) are stored with this
+# category and never reach the NLP or Gemini calls.
+FILTERED_CATEGORY = "filtered"
 
 # --- Dummy AI Logic & Competitor List ---
 # In a real system, these would be sophisticated AI model calls.
@@ -66,49 +97,123 @@ ENRICHED_SCHEMA.update({
 # or potentially train a custom entity extraction model in Natural Language AI / Vertex AI.
 COMPETITOR_KEYWORDS = ["asana", "monday.com", "clickup", "trello", "jira", "basecamp"] # Lowercase for matching
 
-def analyze_text_with_nlp(text_content):
+# --- Local Category Classifier ---
+# Trained with `python -m central_ai_processor.train_category_classifier`. When no model
+# file is deployed, the keyword rules below are used instead.
+CATEGORY_MODEL_PATH = os.environ.get(
+    "CATEGORY_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_model.npz")
+)
+
+@functools.lru_cache(maxsize=None)
+def get_category_classifier():
+    """Loads the local category model once per instance; returns None if none is deployed."""
+    if not os.path.exists(CATEGORY_MODEL_PATH):
+        return None
+    try:
+        from .category_classifier import CategoryClassifier
+    except ImportError: # Deployed as a standalone Cloud Function source directory
+        from category_classifier import CategoryClassifier
+    return CategoryClassifier.load(CATEGORY_MODEL_PATH)
+
+def classify_category_with_keywords(text_lower):
+    """Simple keyword-based category assignment (fallback when no local model is deployed)."""
+    if "bug" in text_lower or "crash" in text_lower or "error" in text_lower or "laggy" in text_lower:
+        return "bug_report"
+    elif "feature" in text_lower or "idea" in text_lower or "wish" in text_lower or "suggestion" in text_lower:
+        return "feature_request"
+    return "general_feedback"
+
+def classify_category(text_content):
     """
-    Uses Google Cloud Natural Language API for sentiment and entity analysis.
-    Returns detected sentiment, entities, and attempts a basic category.
+    Returns (category, confidence) using the local classifier when a model is deployed.
+    Keyword-rule results have no confidence score (None).
     """
-    document = language_v1.Document(content=text_content, type_=language_v1.Document.Type.PLAIN_TEXT)
+    classifier = get_category_classifier()
+    if classifier is not None:
+        return classifier.predict(text_content)
+    return classify_category_with_keywords(text_content.lower()), None
 
-    # Sentiment Analysis
-    sentiment_response = nlp_client.analyze_sentiment(document=document)
+# --- Offline Sentiment (AI_BACKEND=local) ---
+POSITIVE_WORDS = {"love", "loving", "great", "awesome", "amazing", "saved", "smoother", "clearer", "thanks",
+                  "thank", "excellent", "happy", "best", "easy", "helpful", "fantastic", "perfect", "good"}
+NEGATIVE_WORDS = {"crash", "crashing", "broken", "mess", "hate", "slow", "laggy", "bug", "error", "worst",
+                  "frustrated", "frustrating", "switching", "terrible", "bad", "fails", "failing", "useless"}
+
+def analyze_sentiment_locally(text_content):
+    """Word-list sentiment with the same labels and thresholds as the NLP path."""
+    words = re.findall(r"[a-z']+", text_content.lower())
+    if not words:
+        return "neutral"
+    hits = sum(word in POSITIVE_WORDS for word in words) - sum(word in NEGATIVE_WORDS for word in words)
+    score = max(-1.0, min(1.0, hits / 3.0)) # Same -1.0 to 1.0 range as the NLP score
+    if score >= 0.2:
+        return "positive"
+    elif score <= -0.2:
+        return "negative"
+    return "neutral"
+
+def analyze_sentiment_with_nlp(text_content):
+    """
+    Uses Google Cloud Natural Language API for sentiment analysis.
+    Returns "positive", "negative" or "neutral".
+    """
+    if AI_BACKEND == "local":
+        return analyze_sentiment_locally(text_content)
+
+    from google.cloud import language_v1 # Deferred: the SDK import dominates cold start
+
+    document = language_v1.Document(content=text_content, type_=language_v1.Document.Type.PLAIN_TEXT)
+    sentiment_response = get_nlp_client().analyze_sentiment(document=document)
     sentiment_score = sentiment_response.document_sentiment.score # -1.0 to 1.0
-    sentiment_magnitude = sentiment_response.document_sentiment.magnitude # 0.0 to +inf
     sentiment = "neutral"
     if sentiment_score >= 0.2:
         sentiment = "positive"
     elif sentiment_score <= -0.2:
         sentiment = "negative"
+    return sentiment
 
-    # Entity Analysis (to help with competitor detection and other keywords)
-    entity_response = nlp_client.analyze_entities(document=document, encoding_type=language_v1.EncodingType.UTF8)
-    detected_competitors = []
+def detect_competitors(text_content):
+    """Returns the competitor keywords mentioned in the text."""
     text_lower = text_content.lower()
+    return [comp_keyword for comp_keyword in COMPETITOR_KEYWORDS if comp_keyword in text_lower]
 
-    for comp_keyword in COMPETITOR_KEYWORDS:
-        if comp_keyword in text_lower:
-            detected_competitors.append(comp_keyword)
+def apply_category_overrides(category, sentiment, detected_competitors):
+    """Applies the category rules that depend on sentiment (and so on the NLP result)."""
+    if sentiment == "negative" and detected_competitors:
+        return "negative_competitor_review" # Prioritize this specific negative category
+    return category
 
-    # Simple keyword-based category assignment after NLP (can be replaced by custom NLP classification)
-    category = "general_feedback"
-    if "bug" in text_lower or "crash" in text_lower or "error" in text_lower or "laggy" in text_lower:
-        category = "bug_report"
-    elif "feature" in text_lower or "idea" in text_lower or "wish" in text_lower or "suggestion" in text_lower:
-        category = "feature_request"
+def analyze_text_with_nlp(text_content):
+    """
+    Uses Google Cloud Natural Language API for sentiment and entity analysis.
+    Returns detected sentiment, category, category confidence and detected competitors.
+    """
+    # Sentiment Analysis
+    sentiment = analyze_sentiment_with_nlp(text_content)
 
-    if sentiment == "negative" and detected_competitors:
-        category = "negative_competitor_review" # Prioritize this specific negative category
+    # Entity Analysis (to help with competitor detection and other keywords)
+    if AI_BACKEND != "local":
+        from google.cloud import language_v1 # Deferred: the SDK import dominates cold start
+
+        document = language_v1.Document(content=text_content, type_=language_v1.Document.Type.PLAIN_TEXT)
+        entity_response = get_nlp_client().analyze_entities(document=document, encoding_type=language_v1.EncodingType.UTF8)
+    detected_competitors = detect_competitors(text_content)
+
+    # Category from the local classifier (or keyword rules when no model is deployed)
+    category, category_confidence = classify_category(text_content)
+    category = apply_category_overrides(category, sentiment, detected_competitors)
 
-    return sentiment, category, detected_competitors
+    return sentiment, category, category_confidence, detected_competitors
+
+def needs_auto_reply(sentiment, category):
+    """Only positive feedback gets an automated reply."""
+    return sentiment == "positive" and category != "bug_report" # Don't auto-reply to positive bug reports (usually need human review)
 
 def generate_auto_reply_with_gemini(original_text, sentiment, category):
     """
     Uses Vertex AI (Gemini API) to generate an automated reply for positive feedback.
     """
-    if sentiment == "positive" and category != "bug_report": # Don't auto-reply to positive bug reports (usually need human review)
+    if needs_auto_reply(sentiment, category):
         prompt_text = (
             f"You are a helpful and appreciative customer support bot for FlowHub. "
             f"A customer left the following positive feedback: '{original_text}'. "
@@ -116,17 +221,90 @@ def generate_auto_reply_with_gemini(original_text, sentiment, category):
             f"Do not ask questions or offer further help unless specifically related to their positive comment. "
             f"Keep it concise, under 50 words."
         )
+        if AI_BACKEND == "local":
+            return FALLBACK_REPLY_TEXT
         try:
+            from vertexai.preview.generative_models import Part # Deferred: see shared/clients.py
+
             # Generate content using Gemini
             # For demonstration, we'll use generate_content which is synchronous.
             # For production, consider async calls or batching if high volume.
-            response = gemini_model.generate_content([Part.from_text(prompt_text)])
+            response = get_gemini_model(GEMINI_MODEL_NAME).generate_content([Part.from_text(prompt_text)])
             return response.text.strip()
         except Exception as e:
             print(f"ERROR: Gemini API call failed: {e}")
-            return "Thank you for your feedback!" # Fallback reply
+            return FALLBACK_REPLY_TEXT
     return None
 
+# --- Reply Lane ---
+# Fields of the enriched record that travel with reply requests and patches, so the email
+# integration can act on a patch alone.
+REPLY_CONTEXT_FIELDS = ["source_platform", "text_content", "author_info", "sentiment", "category"]
+
+def reply_context(record):
+    return {field: record.get(field) for field in REPLY_CONTEXT_FIELDS}
+
+def publish_auto_reply_patch(record, auto_reply_text):
+    """Publishes an auto_reply_text patch for one message; returns the publish future."""
+    patch = {
+        "record_type": AUTO_REPLY_PATCH_RECORD_TYPE,
+        "message_id": record["message_id"],
+        "auto_reply_text": auto_reply_text,
+        **reply_context(record),
+        "processor_version": PROCESSOR_VERSION,
+        "processing_timestamp_utc": datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+    return get_publisher().publish(auto_reply_patches_topic_path, json.dumps(patch).encode('utf-8'))
+
+@functools.lru_cache(maxsize=None)
+def get_reply_index():
+    """Near-duplicate index of generated replies in this instance (reposts reuse a reply)."""
+    return NearDuplicateIndex()
+
+@profiled
+def reply_generation_entrypoint(event, context):
+    """
+    Cloud Function entry point for the Reply Lane.
+    Triggered by messages in the 'auto-reply-requests' Pub/Sub topic. Generates the reply with
+    Gemini and publishes it as an auto_reply_text patch to 'auto-reply-patches'.
+    """
+    print(f"Reply Generation triggered. Project: {PROJECT_ID}, Requests Topic: {AUTO_REPLY_REQUESTS_TOPIC_NAME}")
+
+    if not event or not 'data' in event:
+        print("No data in Pub/Sub message. Exiting.")
+        return
+
+    try:
+        message_data_b64 = event['data']
+        reply_request = json.loads(base64.b64decode(message_data_b64).decode('utf-8'))
+        message_id = reply_request.get("message_id")
+
+        reused, _ = get_reply_index().find(reply_request.get("normalized_text") or "")
+        if reused:
+            auto_reply_text = reused["auto_reply_text"]
+            print(f"Reusing auto-reply of near-duplicate {reused['message_id']} for {message_id}.")
+        else:
+            auto_reply_text = generate_auto_reply_with_gemini(
+                reply_request.get("prompt_text", ""), reply_request.get("sentiment"), reply_request.get("category")
+            )
+            if auto_reply_text:
+                get_reply_index().add(reply_request.get("normalized_text") or "", {
+                    "message_id": message_id, "auto_reply_text": auto_reply_text,
+                })
+
+        if not auto_reply_text:
+            print(f"No auto-reply generated for {message_id}.")
+            return
+
+        patch_message_id = publish_auto_reply_patch(reply_request, auto_reply_text).result()
+        print(f"Published auto-reply patch {patch_message_id} for {message_id} to {AUTO_REPLY_PATCHES_TOPIC_NAME}.")
+
+    except json.JSONDecodeError as e:
+        print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}. Raw data: {message_data_b64}")
+    except Exception as e:
+        print(f"ERROR: An unexpected error occurred during reply generation: {e}")
+
+@profiled
 def ai_processor_entrypoint(event, context):
     """
     Cloud Function entry point for the AI Processor.
@@ -153,27 +331,98 @@ def ai_processor_entrypoint(event, context):
         # --- REAL AI Processing with Google Cloud NLP & Vertex AI Gemini ---
         text_content = normalized_feedback.get("text_content", "")
 
-        # 1. Natural Language API for Sentiment, Category & Entity Detection
-        sentiment, category, detected_competitors = analyze_text_with_nlp(text_content)
+        # 0. Preprocessing: strip noise and quoted history, bound NLP/LLM input size.
+        # The original text_content is kept untouched for storage.
+        preprocessed = preprocess_feedback_text(text_content, normalized_feedback.get("source_platform"))
 
-        # 2. Vertex AI Gemini for Auto-Reply Generation
-        auto_reply_text = generate_auto_reply_with_gemini(text_content, sentiment, category)
+        # 0b. Low-value filter: emoji-only replies, "first!", bot spam and promo text skip the paid AI calls.
+        is_filtered, filter_signals = should_filter_feedback(normalized_feedback, preprocessed["clean_text"])
+
+        # 0c. Near-duplicate lookup: reposts of a recently enriched message reuse its enrichment.
+        near_duplicate, near_duplicate_distance = (None, None) if is_filtered else \
+            get_near_duplicate_index().find(preprocessed["normalized_text"])
+
+        enrichment_reused_from = None
+        auto_reply_text = None
+        if is_filtered:
+            sentiment, category, category_confidence, detected_competitors = None, FILTERED_CATEGORY, None, []
+            print(f"Filtered low-value message {normalized_feedback.get('message_id')}: {filter_signals}. Counters: {dict(FILTER_COUNTERS)}")
+        elif near_duplicate:
+            sentiment = near_duplicate["sentiment"]
+            category = near_duplicate["category"]
+            category_confidence = near_duplicate.get("category_confidence") # Absent from older snapshots
+            detected_competitors = near_duplicate["detected_competitors"]
+            enrichment_reused_from = near_duplicate["message_id"]
+            print(f"Reusing enrichment of near-duplicate {enrichment_reused_from} (Hamming distance {near_duplicate_distance}).")
+        else:
+            # 1. Natural Language API for Sentiment, Category & Entity Detection
+            sentiment, category, category_confidence, detected_competitors = analyze_text_with_nlp(preprocessed["nlp_text"])
+
+            # 2. Auto-reply generation (Gemini) runs in the reply lane (reply_generation_entrypoint),
+            # so routing bug reports never waits on the LLM. Replies are not part of the shared
+            # enrichment: near-duplicates get theirs from the templates below or from the reply
+            # lane's own index (get_reply_index), personalized for their author.
+            get_near_duplicate_index().add(preprocessed["normalized_text"], {
+                "message_id": normalized_feedback.get("message_id"),
+                "sentiment": sentiment,
+                "category": category,
+                "category_confidence": category_confidence,
+                "detected_competitors": detected_competitors,
+            })
+
+        # 3. Approved reply templates answer most positive feedback in-process; only novel
+        # feedback goes to the reply lane for Gemini (see reply_templates.py).
+        auto_reply_template = None
+        if needs_auto_reply(sentiment, category):
+            auto_reply_text, auto_reply_template, similarity = reply_from_template(
+                preprocessed["normalized_text"], category, normalized_feedback.get("author_info")
+            )
+            if auto_reply_template:
+                print(f"Reply template {auto_reply_template} matched (similarity {similarity:.2f}). Counters: {dict(TEMPLATE_COUNTERS)}")
+
+        auto_reply_pending = auto_reply_text is None and needs_auto_reply(sentiment, category)
 
         # --- Construct Enriched Feedback ---
         enriched_feedback = normalized_feedback.copy()
         enriched_feedback.update({
             "sentiment": sentiment,
             "category": category,
+            "category_confidence": category_confidence,
             "detected_competitors": detected_competitors,
             "auto_reply_text": auto_reply_text,
+            "auto_reply_pending": auto_reply_pending,
+            "auto_reply_template": auto_reply_template,
+            "filter_signals": filter_signals,
+            "enrichment_reused_from": enrichment_reused_from,
+            "processor_version": PROCESSOR_VERSION,
             "processing_timestamp_utc": datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z'
         })
 
         # --- Publish to Classified Feedback Topic ---
         classified_data_bytes = json.dumps(enriched_feedback).encode('utf-8')
-        future = publisher.publish(classified_feedback_topic_path, classified_data_bytes)
+        future = get_publisher().publish(classified_feedback_topic_path, classified_data_bytes)
+
+        # --- Hand the reply to the reply lane (or publish a template reply as a patch right away) ---
+        reply_future = None
+        if auto_reply_pending:
+            reply_request = {
+                "message_id": enriched_feedback["message_id"],
+                "prompt_text": preprocessed["prompt_text"],
+                "normalized_text": preprocessed["normalized_text"],
+                **reply_context(enriched_feedback),
+            }
+            reply_future = get_publisher().publish(auto_reply_requests_topic_path, json.dumps(reply_request).encode('utf-8'))
+        elif auto_reply_text:
+            reply_future = publish_auto_reply_patch(enriched_feedback, auto_reply_text)
+
         classified_message_id = future.result()
         print(f"Published enriched message {classified_message_id} to classified-feedback-topics. Category: {category}, Sentiment: {sentiment}")
+        if reply_future is not None:
+            reply_future.result()
+            print(f"{'Requested' if auto_reply_pending else 'Published template'} auto-reply for {enriched_feedback['message_id']}.")
+
+        # Share newly indexed fingerprints with other instances (rate-limited internally).
+        sync_near_duplicate_index()
 
     except json.JSONDecodeError as e:
         print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}. Raw data: {message_data_b64}")
@@ -0,0 +1,318 @@
+import collections
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# --- Near-Duplicate Index ---
+# Viral complaints get reposted with small edits. A 64-bit SimHash of the normalized text
+# changes by only a few bits for such variants, so a message within NEAR_DUP_MAX_HAMMING
+# bits of a recently enriched one reuses its enrichment instead of paying for NLP/Gemini.
+#
+# Lookup uses banded tables: the fingerprint is split into NEAR_DUP_BANDS 16-bit bands and
+# each band value indexes a bucket. Lookups probe each band's bucket plus the buckets of
+# every band value within PROBE_RADIUS bits of it. If two fingerprints differ in at most
+# NEAR_DUP_BANDS * (PROBE_RADIUS + 1) - 1 bits, some band differs in at most PROBE_RADIUS
+# bits (pigeonhole), so the probes find every match within the threshold.
+#
+# A one-word edit can flip the meaning of a short message while moving its fingerprint by
+# only a few bits ("app is crashing" vs "app is not crashing anymore" differ by 4), so the
+# threshold is tight and a match is also refused when the two texts differ in their
+# POLARITY_TOKENS (negations and sentiment-flipping words).
+NEAR_DUP_BANDS = 4 # 4 x 16-bit bands
+NEAR_DUP_MAX_HAMMING = int(os.environ.get("NEAR_DUP_MAX_HAMMING", "3"))
+NEAR_DUP_MAX_ENTRIES = int(os.environ.get("NEAR_DUP_MAX_ENTRIES", "200000")) # Bounds memory
+NEAR_DUP_TTL_SECONDS = int(os.environ.get("NEAR_DUP_TTL_SECONDS", str(7 * 24 * 3600)))
+NEAR_DUP_MIN_TOKENS = 5 # SimHash is unreliable on very short texts
+# Snapshot location shared by all instances: a local path or gs://bucket/object.
+NEAR_DUP_SNAPSHOT_PATH = os.environ.get("NEAR_DUP_SNAPSHOT_PATH")
+NEAR_DUP_SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("NEAR_DUP_SNAPSHOT_INTERVAL_SECONDS", "300"))
+
+# Normalized text has no punctuation, so "don't" arrives as "don t": "t" stands for n't.
+POLARITY_TOKENS = frozenset({
+    "not", "no", "never", "t", "dont", "doesnt", "isnt", "cant", "wont", "nothing", "without",
+    "anymore", "longer", "fixed", "resolved", "works", "working", "broken", "love", "hate",
+    "great", "terrible", "better", "worse",
+})
+
+BAND_BITS = 64 // NEAR_DUP_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+BIT_WEIGHTS = 1 << np.arange(63, -1, -1, dtype=np.uint64) # Big-endian bit order, matches np.unpackbits
+
+def text_shingles(normalized_text):
+    """Word unigrams and bigrams of an already-normalized text."""
+    tokens = normalized_text.split()
+    return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+def simhash64(normalized_text):
+    """
+    64-bit SimHash of the normalized text (see text_preprocessing.normalize_for_cache).
+    Each shingle is hashed to 64 bits; every output bit is the majority vote of that
+    bit across all shingles. Vectorized with NumPy.
+    """
+    shingles = text_shingles(normalized_text)
+    if not shingles:
+        return 0
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(shingles), 64)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles) # +1 per set bit, -1 per clear bit
+    return int((BIT_WEIGHTS * (votes > 0).astype(np.uint64)).sum())
+
+def polarity_tokens(normalized_text):
+    """The sorted POLARITY_TOKENS present in a normalized text."""
+    return sorted(POLARITY_TOKENS.intersection(normalized_text.split()))
+
+def band_values(fingerprint):
+    """Splits a 64-bit fingerprint into (band number, band value) keys."""
+    return [(band, (fingerprint >> (band * BAND_BITS)) & BAND_MASK) for band in range(NEAR_DUP_BANDS)]
+
+def probe_keys(fingerprint, probe_radius):
+    """Bucket keys to probe: each band value, plus all values within probe_radius bits (0 or 1)."""
+    keys = band_values(fingerprint)
+    if probe_radius:
+        keys += [(band, value ^ (1 << bit)) for band, value in keys[:NEAR_DUP_BANDS] for bit in range(BAND_BITS)]
+    return keys
+
+class NearDuplicateIndex:
+    """
+    In-process SimHash index with bounded size and time-based eviction.
+    Entries map fingerprint -> (inserted_at, enrichment dict); the oldest entry is evicted
+    first, both when the index is full and when entries outlive the TTL.
+    """
+
+    def __init__(self, max_entries=NEAR_DUP_MAX_ENTRIES, ttl_seconds=NEAR_DUP_TTL_SECONDS,
+                 max_hamming=NEAR_DUP_MAX_HAMMING):
+        self.probe_radius = max_hamming // NEAR_DUP_BANDS
+        if self.probe_radius > 1:
+            raise ValueError(f"max_hamming must be below {2 * NEAR_DUP_BANDS} for banded lookup")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_hamming = max_hamming
+        self._entries = collections.OrderedDict() # fingerprint -> (inserted_at, enrichment)
+        self._buckets = {} # (band, band value) -> [fingerprints]
+        self._lock = threading.Lock()
+        self._dirty_since_snapshot = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, fingerprint):
+        self._entries.pop(fingerprint, None)
+        for key in band_values(fingerprint):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.remove(fingerprint)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _evict(self, now):
+        cutoff = now - self.ttl_seconds
+        while self._entries:
+            fingerprint, (inserted_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and inserted_at >= cutoff:
+                break
+            self._remove(fingerprint)
+
+    def add_fingerprint(self, fingerprint, enrichment, inserted_at=None):
+        """Adds (or refreshes) one fingerprint with its enrichment."""
+        inserted_at = time.time() if inserted_at is None else inserted_at
+        with self._lock:
+            if fingerprint in self._entries:
+                self._remove(fingerprint)
+            self._entries[fingerprint] = (inserted_at, enrichment)
+            for key in band_values(fingerprint):
+                self._buckets.setdefault(key, []).append(fingerprint)
+            self._evict(time.time())
+            self._dirty_since_snapshot = True
+
+    def find_fingerprint(self, fingerprint, polarity=None):
+        """
+        Returns (enrichment, hamming distance) of the closest live match, or (None, None).
+        With `polarity` set, only entries indexed with the same polarity tokens match.
+        """
+        now = time.time()
+        best, best_distance = None, self.max_hamming + 1
+        with self._lock:
+            for key in probe_keys(fingerprint, self.probe_radius):
+                for candidate in self._buckets.get(key, ()):
+                    distance = (candidate ^ fingerprint).bit_count()
+                    if distance < best_distance:
+                        inserted_at, enrichment = self._entries[candidate]
+                        if polarity is not None and enrichment.get("polarity_tokens") != polarity:
+                            continue
+                        if now - inserted_at <= self.ttl_seconds:
+                            best, best_distance = enrichment, distance
+        return (best, best_distance) if best is not None else (None, None)
+
+    def add(self, normalized_text, enrichment):
+        """Indexes a normalized text; texts too short to fingerprint reliably are skipped."""
+        if len(normalized_text.split()) >= NEAR_DUP_MIN_TOKENS:
+            self.add_fingerprint(simhash64(normalized_text),
+                                 dict(enrichment, polarity_tokens=polarity_tokens(normalized_text)))
+
+    def find(self, normalized_text):
+        """
+        Looks up the closest near-duplicate of a normalized text with the same polarity
+        tokens. Returns (enrichment, distance).
+        """
+        if len(normalized_text.split()) < NEAR_DUP_MIN_TOKENS:
+            return None, None
+        return self.find_fingerprint(simhash64(normalized_text), polarity_tokens(normalized_text))
+
+    # --- Persistence ---
+    def to_bytes(self):
+        """Serializes the index as a compressed .npz (fingerprints, timestamps, JSON payloads)."""
+        with self._lock:
+            items = list(self._entries.items())
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            fingerprints=np.array([fingerprint for fingerprint, _ in items], dtype=np.uint64),
+            inserted_at=np.array([inserted_at for _, (inserted_at, _) in items], dtype=np.float64),
+            payloads=np.frombuffer(json.dumps([enrichment for _, (_, enrichment) in items]).encode("utf-8"), dtype=np.uint8),
+        )
+        return buffer.getvalue()
+
+    def merge_bytes(self, data):
+        """Merges a serialized index into this one, keeping the newer entry per fingerprint."""
+        with np.load(io.BytesIO(data), allow_pickle=False) as snapshot:
+            fingerprints = snapshot["fingerprints"].tolist()
+            inserted_at = snapshot["inserted_at"].tolist()
+            payloads = json.loads(snapshot["payloads"].tobytes().decode("utf-8"))
+        cutoff = time.time() - self.ttl_seconds
+        for fingerprint, timestamp, enrichment in sorted(zip(fingerprints, inserted_at, payloads), key=lambda item: item[1]):
+            existing = self._entries.get(fingerprint)
+            if timestamp >= cutoff and (existing is None or existing[0] < timestamp):
+                self.add_fingerprint(fingerprint, enrichment, inserted_at=timestamp)
+
+# --- Snapshot Storage (local file or Cloud Storage) ---
+def read_snapshot(path):
+    """Returns (bytes, generation) for a snapshot, or (None, 0) if it does not exist yet."""
+    if path.startswith("gs://"):
+        from google.api_core import exceptions as gcs_exceptions
+        from shared.clients import get_storage_client
+
+        bucket_name, blob_name = path[len("gs://"):].split("/", 1)
+        blob = get_storage_client().bucket(bucket_name).blob(blob_name)
+        try:
+            blob.reload()
+            return blob.download_as_bytes(if_generation_match=blob.generation), blob.generation
+        except gcs_exceptions.NotFound:
+            return None, 0
+    if not os.path.exists(path):
+        return None, 0
+    with open(path, "rb") as snapshot_file:
+        return snapshot_file.read(), 0
+
+def write_snapshot(path, data, generation):
+    """
+    Writes a snapshot. On Cloud Storage the write only succeeds if nobody else wrote since
+    `generation` was read; returns False on such a conflict so the caller can re-merge.
+    """
+    if path.startswith("gs://"):
+        from google.api_core import exceptions as gcs_exceptions
+        from shared.clients import get_storage_client
+
+        bucket_name, blob_name = path[len("gs://"):].split("/", 1)
+        blob = get_storage_client().bucket(bucket_name).blob(blob_name)
+        try:
+            blob.upload_from_string(data, if_generation_match=generation)
+            return True
+        except gcs_exceptions.PreconditionFailed:
+            return False
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(data)
+    os.replace(temp_path, path)
+    return True
+
+_index = None
+_index_lock = threading.Lock()
+_last_sync = 0.0
+
+def get_near_duplicate_index():
+    """Returns this instance's index, loading the shared snapshot on first use."""
+    global _index, _last_sync
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex()
+            if NEAR_DUP_SNAPSHOT_PATH:
+                try:
+                    data, _ = read_snapshot(NEAR_DUP_SNAPSHOT_PATH)
+                    if data:
+                        _index.merge_bytes(data)
+                    print(f"Loaded near-duplicate index snapshot ({len(_index)} entries).")
+                except Exception as e:
+                    print(f"ERROR: Could not load near-duplicate index snapshot: {e}")
+            _last_sync = time.time()
+        return _index
+
+def sync_near_duplicate_index(force=False, attempts=3):
+    """
+    Shares this instance's new entries with other instances: re-reads the snapshot, merges
+    it into the local index and writes the union back. Runs at most once per
+    NEAR_DUP_SNAPSHOT_INTERVAL_SECONDS unless `force` is set.
+    """
+    global _last_sync
+    index = get_near_duplicate_index()
+    if not NEAR_DUP_SNAPSHOT_PATH or not index._dirty_since_snapshot:
+        return
+    if not force and time.time() - _last_sync < NEAR_DUP_SNAPSHOT_INTERVAL_SECONDS:
+        return
+    _last_sync = time.time()
+    try:
+        for _ in range(attempts):
+            data, generation = read_snapshot(NEAR_DUP_SNAPSHOT_PATH)
+            if data:
+                index.merge_bytes(data)
+            index._dirty_since_snapshot = False
+            if write_snapshot(NEAR_DUP_SNAPSHOT_PATH, index.to_bytes(), generation):
+                print(f"Saved near-duplicate index snapshot ({len(index)} entries).")
+                return
+        print("WARNING: Near-duplicate index snapshot kept changing; will retry next interval.")
+        index._dirty_since_snapshot = True
+    except Exception as e:
+        index._dirty_since_snapshot = True
+        print(f"ERROR: Could not save near-duplicate index snapshot: {e}")
+
+def run_benchmark(entries, lookups=10000):
+    """Measures insert and lookup cost for an index holding `entries` random fingerprints."""
+    rng = np.random.default_rng(42)
+    fingerprints = rng.integers(0, np.iinfo(np.uint64).max, size=entries, dtype=np.uint64, endpoint=True).tolist()
+    index = NearDuplicateIndex(max_entries=entries, ttl_seconds=10 ** 9)
+    enrichment = {"message_id": "bench", "sentiment": "negative", "category": "bug_report", "detected_competitors": []}
+
+    started = time.perf_counter()
+    for fingerprint in fingerprints:
+        index.add_fingerprint(fingerprint, enrichment)
+    insert_seconds = time.perf_counter() - started
+
+    # Half the probes are near-duplicates of indexed entries (2 bits flipped), half are misses.
+    probes = []
+    for i in range(lookups):
+        base = fingerprints[int(rng.integers(entries))]
+        if i % 2 == 0:
+            bit_a, bit_b = rng.choice(64, size=2, replace=False)
+            probes.append(base ^ (1 << int(bit_a)) ^ (1 << int(bit_b)))
+        else:
+            probes.append(int(rng.integers(0, np.iinfo(np.uint64).max, dtype=np.uint64, endpoint=True)))
+
+    started = time.perf_counter()
+    hits = sum(1 for probe in probes if index.find_fingerprint(probe)[0] is not None)
+    lookup_seconds = time.perf_counter() - started
+
+    print(f"Entries: {entries:,}  insert: {insert_seconds / entries * 1e6:.2f} us/entry")
+    print(f"Lookups: {lookups:,}  hits: {hits:,}  lookup: {lookup_seconds / lookups * 1e6:.2f} us/lookup")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the near-duplicate index.")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+    run_benchmark(args.entries, args.lookups)
@@ -0,0 +1,147 @@
+"""
+Promotes good Gemini-generated replies into the reply template library.
+
+Generated replies are already stored in enriched_feedback (rows answered by a template
+have auto_reply_template set and are skipped). Positive feedback that no template matches
+(under the current library) is grouped by similarity; a large group
+means the same kind of message keeps reaching Gemini, and the group's most central reply
+that passes the quality checks is the candidate template. `promote` adds it to the
+library file (the author's name becomes the {name} slot) and bumps the library version;
+review the diff and deploy it with the function.
+
+Usage (from the repository root, with DB_* or DB_SQLITE_PATH set):
+    python -m central_ai_processor.promote_reply_templates suggest
+    python -m central_ai_processor.promote_reply_templates promote --message-id <id> --template-id <new-id> \\
+        --example "another typical feedback text"
+"""
+import argparse
+import collections
+import sys
+
+import numpy as np
+
+from shared.db import execute, get_db_connection, load_json, stream_dicts
+
+from central_ai_processor.main import FALLBACK_REPLY_TEXT
+from central_ai_processor.reply_templates import (REPLY_TEMPLATE_MIN_SIMILARITY, REPLY_TEMPLATES_PATH,
+                                                  ReplyTemplateLibrary, reply_quality_problems, template_guard_reason,
+                                                  text_vector)
+from central_ai_processor.text_preprocessing import preprocess_feedback_text
+
+GENERATED_REPLIES_SQL = """
+SELECT message_id, text_content, category, author_info, auto_reply_text
+FROM enriched_feedback
+WHERE auto_reply_text IS NOT NULL AND auto_reply_template IS NULL AND sentiment = 'positive'
+"""
+REPLY_ROW_SQL = """
+SELECT message_id, text_content, category, author_info, auto_reply_text
+FROM enriched_feedback WHERE message_id = %s
+"""
+MAX_GROUPS = 2000 # Bounds the centroid matrix (16 KB per group)
+EXAMPLES_PER_GROUP = 5
+
+def stream_generated_replies(conn, fetch_size):
+    """Yields positive rows with a reply Gemini actually wrote."""
+    for rows in stream_dicts(conn, GENERATED_REPLIES_SQL, fetch_size=fetch_size):
+        for row in rows:
+            # The fallback text is what failed (or offline) generation returns, not a written reply.
+            if row["auto_reply_text"] != FALLBACK_REPLY_TEXT:
+                yield row
+
+def group_unmatched_replies(library, rows, min_similarity=REPLY_TEMPLATE_MIN_SIMILARITY, max_groups=MAX_GROUPS):
+    """
+    Greedily groups rows whose feedback no template matches: each row joins the most
+    similar group (one matrix-vector product against the group centroids) or starts a new
+    one. Returns groups sorted by size, each with its most central row whose reply passes
+    reply_quality_problems().
+    """
+    centroids = np.zeros((max_groups, 1 << library.hash_bits), dtype=np.float32)
+    groups = []
+    for row in rows:
+        normalized_text = preprocess_feedback_text(row["text_content"] or "")["normalized_text"]
+        if template_guard_reason(normalized_text, row["category"]):
+            continue # Always needs a written reply, so never a template candidate
+        if library.match(normalized_text, row["category"], min_similarity)[0] is not None:
+            continue # Already covered (promoted since it was replied to)
+        vector = text_vector(normalized_text, library.hash_bits)
+        group_index, similarity = None, 0.0
+        if groups:
+            scores = centroids[:len(groups)] @ vector
+            best = int(scores.argmax())
+            if scores[best] >= min_similarity:
+                group_index, similarity = best, float(scores[best])
+        if group_index is None:
+            if len(groups) == max_groups:
+                continue
+            group_index = len(groups)
+            groups.append({"size": 0, "sum": np.zeros_like(vector), "categories": collections.Counter(),
+                           "best": None, "best_similarity": -1.0, "examples": []})
+        group = groups[group_index]
+        group["size"] += 1
+        group["sum"] += vector
+        centroids[group_index] = group["sum"] / np.linalg.norm(group["sum"])
+        group["categories"][row["category"]] += 1
+        if len(group["examples"]) < EXAMPLES_PER_GROUP:
+            group["examples"].append(normalized_text)
+        if similarity > group["best_similarity"] and not reply_quality_problems(row["auto_reply_text"]):
+            group["best"], group["best_similarity"] = row, similarity
+    groups.sort(key=lambda group: group["size"], reverse=True)
+    return groups
+
+def print_suggestions(groups, min_group_size, limit):
+    groups = [group for group in groups if group["size"] >= min_group_size]
+    if not groups:
+        print("No groups of unmatched generated replies are large enough to promote.")
+    for group in groups[:limit]:
+        best = group["best"]
+        category = group["categories"].most_common(1)[0][0]
+        print(f"\n{group['size']} unmatched messages, mostly {category}. Examples:")
+        for example in group["examples"]:
+            print(f"  - {example}")
+        if best is None:
+            print("  (no generated reply in this group passes the quality checks)")
+        else:
+            print(f"  Candidate reply ({best['message_id']}): {best['auto_reply_text']}")
+            print(f"  Promote with: python -m central_ai_processor.promote_reply_templates promote "
+                  f"--message-id {best['message_id']} --template-id <new-id>")
+
+def promote_message_reply(conn, library, message_id, template_id, extra_examples):
+    """Adds the reply stored for `message_id` to the library; returns the stored template."""
+    cursor = execute(conn, REPLY_ROW_SQL, (message_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"No enriched_feedback row for message_id {message_id}")
+    row = dict(zip([column[0] for column in cursor.description], row))
+    examples = [preprocess_feedback_text(text)["normalized_text"] for text in [row["text_content"] or ""] + extra_examples]
+    return library.promote(template_id, row["auto_reply_text"], examples, [row["category"]], load_json(row["author_info"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Promote generated replies into the reply template library.")
+    parser.add_argument("--library", default=REPLY_TEMPLATES_PATH)
+    parser.add_argument("--fetch-size", type=int, default=1000, help="Rows per server-side cursor fetch.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    suggest_parser = commands.add_parser("suggest", help="List groups of unmatched feedback with a candidate reply.")
+    suggest_parser.add_argument("--min-group-size", type=int, default=3)
+    suggest_parser.add_argument("--limit", type=int, default=10)
+    promote_parser = commands.add_parser("promote", help="Add the reply generated for one message as a template.")
+    promote_parser.add_argument("--message-id", required=True)
+    promote_parser.add_argument("--template-id", required=True)
+    promote_parser.add_argument("--example", action="append", default=[], help="Extra example feedback text (repeatable).")
+    args = parser.parse_args(argv)
+
+    library = ReplyTemplateLibrary.load(args.library)
+    conn = get_db_connection()
+    try:
+        if args.command == "suggest":
+            groups = group_unmatched_replies(library, stream_generated_replies(conn, args.fetch_size))
+            print_suggestions(groups, args.min_group_size, args.limit)
+            return 0
+        template = promote_message_reply(conn, library, args.message_id, args.template_id, args.example)
+    finally:
+        conn.close()
+    library.save(args.library)
+    print(f"Saved {template['id']}@{template['version']} to {args.library} (library v{library.version}): {template['reply']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
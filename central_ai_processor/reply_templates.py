@@ -0,0 +1,295 @@
+import collections
+import functools
+import json
+import os
+import re
+import string
+import time
+import zlib
+
+import numpy as np
+
+try:
+    from .category_classifier import BIAS_FEATURE, feature_strings
+    from .text_preprocessing import preprocess_feedback_text
+except ImportError: # Deployed as a standalone Cloud Function source directory
+    from category_classifier import BIAS_FEATURE, feature_strings
+    from text_preprocessing import preprocess_feedback_text
+
+# --- Reply Template Library ---
+# Most positive feedback is a variant of a handful of messages ("love FlowHub", "it saved
+# our team"), so replies come from a curated, versioned library of approved templates
+# (reply_templates.json) before Gemini is asked. Each template lists example feedback
+# texts; every example is a hashed n-gram vector (the category classifier's word and
+# character n-gram features, L2-normalized) and all of them form one NumPy matrix, so
+# finding the nearest template is a single matrix-vector product. Below
+# REPLY_TEMPLATE_MIN_SIMILARITY (cosine) the feedback is novel and goes to Gemini; good
+# generated replies are promoted into the library with promote_reply_templates.py.
+#
+# The threshold sits between the best-scoring feedback that is not praise (0.32: questions,
+# bug reports, account requests) and the worst-scoring paraphrase of a template (0.52) on
+# the calibration set in tests/test_reply_templates.py; re-run it after editing the library.
+REPLY_TEMPLATES_ENABLED = os.environ.get("REPLY_TEMPLATES_ENABLED", "true").lower() == "true"
+REPLY_TEMPLATES_PATH = os.environ.get(
+    "REPLY_TEMPLATES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "reply_templates.json")
+)
+REPLY_TEMPLATE_MIN_SIMILARITY = float(os.environ.get("REPLY_TEMPLATE_MIN_SIMILARITY", "0.42"))
+REPLY_TEMPLATE_HASH_BITS = 12 # 4,096 dimensions: 16 KB per example row
+LIBRARY_FORMAT_VERSION = 1
+
+# Brand names appear in nearly every message; their n-grams would make any two short texts look alike.
+REPLY_TEMPLATE_IGNORED_TOKENS = {"flowhub", "zenithflow", "zenithflowsupport"}
+
+# Positive feedback can still carry a complaint ("great job on the release but my data is
+# gone"), which shares most n-grams with plain praise. A canned thank-you would ignore it,
+# so feedback with a contrast word or a negative term always gets a written reply. Feature
+# requests are the exception for contrast words: "love it, but please add X" is the request.
+REPLY_TEMPLATE_CONTRAST_TOKENS = {"but", "however", "though", "although", "except", "unfortunately"}
+REPLY_TEMPLATE_NEGATIVE_TOKENS = {
+    "bug", "bugs", "broken", "broke", "crash", "crashes", "crashing", "error", "errors", "fail", "failed",
+    "failing", "fails", "gone", "lost", "missing", "deleted", "down", "outage", "slow", "issue", "issues",
+    "problem", "problems", "charged", "overcharged", "refund", "cancel", "disappointed", "frustrated",
+    "frustrating", "annoying", "hate", "terrible", "awful", "worst", "useless",
+}
+CONTRAST_ALLOWED_CATEGORIES = {"feature_request"}
+
+# Personalization slots a template may use, filled from the feedback's author_info.
+REPLY_TEMPLATE_SLOTS = {"name"}
+DEFAULT_SLOT_VALUES = {"name": "there"}
+MAX_REPLY_WORDS = 50 # Same limit as the Gemini prompt
+
+TEMPLATE_COUNTERS = collections.Counter() # "matched" / "novel" / "guarded", for the log lines
+
+def text_vector(normalized_text, hash_bits=REPLY_TEMPLATE_HASH_BITS):
+    """Dense, L2-normalized hashed n-gram vector of a normalized text (see normalize_for_cache)."""
+    vector = np.zeros(1 << hash_bits, dtype=np.float32)
+    mask = (1 << hash_bits) - 1
+    normalized_text = " ".join(token for token in normalized_text.split() if token not in REPLY_TEMPLATE_IGNORED_TOKENS)
+    for feature in feature_strings(normalized_text):
+        if feature == BIAS_FEATURE:
+            continue # Shared by every text: it would only inflate similarities
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        vector[hashed & mask] += 1.0 if (hashed >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+def vectorize_texts(texts, hash_bits=REPLY_TEMPLATE_HASH_BITS):
+    """Stacks text_vector() rows into an (n_texts, 2**hash_bits) matrix."""
+    matrix = np.zeros((len(texts), 1 << hash_bits), dtype=np.float32)
+    for row, text in enumerate(texts):
+        matrix[row] = text_vector(text, hash_bits)
+    return matrix
+
+def template_slots(reply):
+    """Names of the {slots} used in a reply template."""
+    return {field for _, field, _, _ in string.Formatter().parse(reply) if field is not None}
+
+def author_display_name(author_info):
+    """The name to greet an author by: display name or nickname first, then username."""
+    author_info = author_info or {}
+    for field in ("name", "nickname", "display_name", "username"):
+        value = str(author_info.get(field) or "").strip()
+        if value:
+            return value
+    return None
+
+def slot_values(author_info):
+    values = dict(DEFAULT_SLOT_VALUES)
+    name = author_display_name(author_info)
+    if name:
+        values["name"] = name
+    return values
+
+def template_guard_reason(normalized_text, category=None):
+    """Why this feedback must get a written reply instead of a template (None if a template may answer it)."""
+    tokens = set(normalized_text.split())
+    negative = tokens & REPLY_TEMPLATE_NEGATIVE_TOKENS
+    if negative:
+        return f"negative term '{min(negative)}'"
+    contrast = tokens & REPLY_TEMPLATE_CONTRAST_TOKENS
+    if contrast and category not in CONTRAST_ALLOWED_CATEGORIES:
+        return f"contrast word '{min(contrast)}'"
+    return None
+
+def reply_quality_problems(reply_text):
+    """Reasons a generated reply should not become a template (empty list if it is fine)."""
+    problems = []
+    if not reply_text or not reply_text.strip():
+        return ["empty"]
+    if len(reply_text.split()) > MAX_REPLY_WORDS:
+        problems.append(f"longer than {MAX_REPLY_WORDS} words")
+    if "?" in reply_text:
+        problems.append("asks a question")
+    return problems
+
+class ReplyTemplateLibrary:
+    """
+    Approved reply templates plus the matrix of their example vectors.
+
+    Each template is a dict {"id", "version", "categories", "reply", "examples"}; the
+    library `version` goes up whenever a template is added or changed, and each template
+    keeps its own version too, so logged matches can be traced to the exact wording.
+    """
+
+    def __init__(self, templates, version=1, hash_bits=REPLY_TEMPLATE_HASH_BITS):
+        self.templates = [dict(template) for template in templates]
+        self.version = version
+        self.hash_bits = hash_bits
+        self.template_index = {}
+        for index, template in enumerate(self.templates):
+            if template["id"] in self.template_index:
+                raise ValueError(f"Duplicate reply template id '{template['id']}'")
+            unknown = template_slots(template["reply"]) - REPLY_TEMPLATE_SLOTS
+            if unknown:
+                raise ValueError(f"Reply template '{template['id']}' uses unknown slots: {sorted(unknown)}")
+            if not template.get("examples"):
+                raise ValueError(f"Reply template '{template['id']}' has no examples")
+            self.template_index[template["id"]] = index
+
+        # One row per example; row_template maps a row back to its template.
+        examples = [(index, example) for index, template in enumerate(self.templates) for example in template["examples"]]
+        self.vectors = vectorize_texts([example for _, example in examples], hash_bits)
+        self.row_template = np.array([index for index, _ in examples], dtype=np.int32)
+        categories = {category for template in self.templates for category in template.get("categories", [])}
+        self.category_rows = {
+            category: np.array([category in self.templates[index].get("categories", []) for index, _ in examples])
+            for category in categories
+        }
+
+    def __len__(self):
+        return len(self.templates)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as library_file:
+            data = json.load(library_file)
+        if data.get("format_version") != LIBRARY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported reply template library format in {path}")
+        return cls(data["templates"], version=data["version"])
+
+    def save(self, path):
+        data = {"format_version": LIBRARY_FORMAT_VERSION, "version": self.version, "templates": self.templates}
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as library_file:
+            json.dump(data, library_file, indent=2, ensure_ascii=False)
+            library_file.write("\n")
+        os.replace(temp_path, path)
+
+    def similarities(self, query_vector, category=None):
+        """Cosine similarity of one query vector to every example row (-1 for other categories)."""
+        scores = self.vectors @ query_vector
+        if category is not None:
+            rows = self.category_rows.get(category)
+            if rows is None:
+                return np.full(len(scores), -1.0, dtype=np.float32)
+            scores = np.where(rows, scores, np.float32(-1.0))
+        return scores
+
+    def match(self, normalized_text, category=None, min_similarity=REPLY_TEMPLATE_MIN_SIMILARITY):
+        """
+        Returns (template, similarity) for the nearest template allowed for `category`, or
+        (None, best similarity) if nothing reaches min_similarity. Feedback stopped by
+        template_guard_reason() never matches: (None, 0.0).
+        """
+        if not len(self.row_template) or not normalized_text or template_guard_reason(normalized_text, category):
+            return None, 0.0
+        scores = self.similarities(text_vector(normalized_text, self.hash_bits), category)
+        best_row = int(scores.argmax())
+        similarity = float(scores[best_row])
+        if similarity < min_similarity:
+            return None, similarity
+        return self.templates[self.row_template[best_row]], similarity
+
+    def render(self, template, author_info):
+        """Fills the template's personalization slots from author_info."""
+        return template["reply"].format_map(slot_values(author_info))
+
+    def promote(self, template_id, reply_text, examples, categories, author_info=None):
+        """
+        Adds a generated reply as a template (or updates the template with that id). The
+        author's name in the reply becomes the {name} slot. Returns the stored template.
+        """
+        problems = reply_quality_problems(reply_text)
+        if problems:
+            raise ValueError(f"Reply is not suitable as a template: {', '.join(problems)}")
+        reply = reply_text.strip().replace("{", "{{").replace("}", "}}")
+        name = author_display_name(author_info)
+        if name:
+            reply = re.sub(rf"(?<!\w)@?{re.escape(name)}(?!\w)", "{name}", reply)
+
+        existing_index = self.template_index.get(template_id)
+        if existing_index is None:
+            template = {"id": template_id, "version": 1, "categories": sorted(categories), "reply": reply,
+                        "examples": list(dict.fromkeys(examples))}
+            templates = self.templates + [template]
+        else:
+            existing = self.templates[existing_index]
+            template = {"id": template_id, "version": existing["version"] + 1,
+                        "categories": sorted(set(existing.get("categories", [])) | set(categories)), "reply": reply,
+                        "examples": list(dict.fromkeys(existing["examples"] + list(examples)))}
+            templates = self.templates[:existing_index] + [template] + self.templates[existing_index + 1:]
+        # Rebuild so the vectors and validation cover the new template.
+        self.__init__(templates, version=self.version + 1, hash_bits=self.hash_bits)
+        return template
+
+@functools.lru_cache(maxsize=None)
+def get_reply_template_library():
+    """Loads the reply library once per instance; returns None if disabled or unavailable."""
+    if not REPLY_TEMPLATES_ENABLED or not os.path.exists(REPLY_TEMPLATES_PATH):
+        return None
+    try:
+        library = ReplyTemplateLibrary.load(REPLY_TEMPLATES_PATH)
+        print(f"Loaded reply template library v{library.version} ({len(library)} templates).")
+        return library
+    except Exception as e:
+        print(f"ERROR: Could not load reply template library: {e}")
+        return None
+
+def reply_from_template(normalized_text, category, author_info):
+    """
+    Returns (reply text, "template id@version", similarity) from the approved library, or
+    (None, None, similarity) when the feedback is novel and needs a generated reply.
+    """
+    library = get_reply_template_library()
+    if library is None:
+        return None, None, 0.0
+    if template_guard_reason(normalized_text, category):
+        TEMPLATE_COUNTERS["guarded"] += 1
+        return None, None, 0.0
+    template, similarity = library.match(normalized_text, category)
+    if template is None:
+        TEMPLATE_COUNTERS["novel"] += 1
+        return None, None, similarity
+    TEMPLATE_COUNTERS["matched"] += 1
+    return library.render(template, author_info), f"{template['id']}@{template['version']}", similarity
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show which reply template a feedback text would get.")
+    parser.add_argument("text")
+    parser.add_argument("--category", default="general_feedback")
+    parser.add_argument("--library", default=REPLY_TEMPLATES_PATH)
+    parser.add_argument("--benchmark", type=int, default=0, help="Also time N lookups.")
+    args = parser.parse_args()
+
+    library = ReplyTemplateLibrary.load(args.library)
+    normalized_text = preprocess_feedback_text(args.text)["normalized_text"]
+    template, similarity = library.match(normalized_text, args.category)
+    guard_reason = template_guard_reason(normalized_text, args.category)
+    if guard_reason:
+        print(f"No template ({guard_reason}); Gemini would write this reply.")
+    elif template is None:
+        print(f"No template (best similarity {similarity:.3f} < {REPLY_TEMPLATE_MIN_SIMILARITY}); Gemini would write this reply.")
+    else:
+        print(f"Template {template['id']}@{template['version']} (similarity {similarity:.3f}): "
+              f"{library.render(template, {'username': 'example_user'})}")
+    if args.benchmark:
+        started = time.perf_counter()
+        for _ in range(args.benchmark):
+            library.match(normalized_text, args.category)
+        elapsed = time.perf_counter() - started
+        print(f"{args.benchmark:,} lookups against {len(library.row_template)} examples: "
+              f"{elapsed / args.benchmark * 1e6:.1f} us/lookup")
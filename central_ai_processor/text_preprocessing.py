@@ -0,0 +1,119 @@
+import hashlib
+import os
+import re
+import unicodedata
+
+# --- Preprocessing Configuration ---
+# The Natural Language API bills per 1,000-character unit, so the NLP budget is kept
+# a whole number of units: anything past the last full unit is paid for but adds little.
+NLP_BILLING_UNIT_CHARS = 1000
+MAX_NLP_CHARS = int(os.environ.get("PREPROCESS_MAX_NLP_CHARS", "2000"))
+# Gemini prompt budget for the feedback text, in (estimated) tokens.
+MAX_PROMPT_TOKENS = int(os.environ.get("PREPROCESS_MAX_PROMPT_TOKENS", "200"))
+CHARS_PER_TOKEN_ESTIMATE = 4 # Rough average for English text
+
+# --- Noise Patterns ---
+URL_PATTERN = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+MENTION_PATTERN = re.compile(r"(?<![\w@])@\w+")
+HASHTAG_PATTERN = re.compile(r"(?<![\w#])#(\w+)")
+# Underscore emphasis only counts at word boundaries, so snake_case identifiers and
+# usernames in bug reports ("upload_file fails") are left alone.
+MARKDOWN_EMPHASIS_PATTERN = re.compile(r"(\*\*|\*|~~)(\S(?:.*?\S)?)\1|(?<!\w)(__|_)(\S(?:.*?\S)?)\3(?!\w)")
+ZERO_WIDTH_PATTERN = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+CACHE_STRIP_PATTERN = re.compile(r"[^\w\s]")
+
+# --- Quoted Email History & Signatures ---
+# Everything from the first matching line onwards is dropped. Only applied to sources that
+# carry email threads: on social platforms a line like "From: @user ..." is the message.
+EMAIL_HISTORY_PLATFORMS = {"email", "basecamp"}
+EMAIL_HISTORY_MARKERS = [
+    re.compile(r"^\s*On .{1,200}wrote:\s*$", re.IGNORECASE), # Gmail/Apple Mail reply header
+    re.compile(r"^\s*-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE), # Outlook
+    re.compile(r"^\s*From:\s.*[@<].*$", re.IGNORECASE), # Outlook header block ("From: Name <address>")
+    re.compile(r"^\s*_{10,}\s*$"), # Outlook separator line
+    re.compile(r"^--\s*$"), # RFC 3676 signature delimiter
+    re.compile(r"^\s*Sent from my \w+", re.IGNORECASE), # Mobile signatures
+]
+QUOTED_LINE_PATTERN = re.compile(r"^\s*>")
+
+def strip_quoted_email(text):
+    """
+    Removes quoted reply chains (lines starting with '>'), reply/forward headers and
+    everything after them, and trailing signatures. Returns only the author's new text.
+    """
+    kept_lines = []
+    for line in text.splitlines():
+        if any(marker.match(line) for marker in EMAIL_HISTORY_MARKERS):
+            break
+        if QUOTED_LINE_PATTERN.match(line):
+            continue
+        kept_lines.append(line)
+    return "\n".join(kept_lines)
+
+def canonicalize_text(text):
+    """
+    Canonicalizes Unicode and strips social-media noise: URLs and @mentions are removed,
+    hashtags keep their words ('#feature_request' -> 'feature request') because they often
+    carry the category signal, Markdown emphasis markers are dropped and whitespace is collapsed.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = ZERO_WIDTH_PATTERN.sub("", text)
+    text = URL_PATTERN.sub(" ", text)
+    text = MENTION_PATTERN.sub(" ", text)
+    text = HASHTAG_PATTERN.sub(lambda match: match.group(1).replace("_", " "), text)
+    text = MARKDOWN_EMPHASIS_PATTERN.sub(lambda match: match.group(2) or match.group(4), text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+def truncate_text(text, max_chars):
+    """Truncates text to at most max_chars, preferring to cut on a word boundary."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    last_space = cut.rfind(" ")
+    if last_space > max_chars // 2:
+        cut = cut[:last_space]
+    return cut.rstrip()
+
+def nlp_char_budget():
+    """Returns MAX_NLP_CHARS rounded down to whole NLP billing units (minimum one unit)."""
+    return max(NLP_BILLING_UNIT_CHARS, MAX_NLP_CHARS - MAX_NLP_CHARS % NLP_BILLING_UNIT_CHARS)
+
+def normalize_for_cache(text):
+    """Lowercased, punctuation-free form of the cleaned text, used as a cache/dedup key."""
+    text = CACHE_STRIP_PATTERN.sub(" ", text.lower())
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+def preprocess_feedback_text(text_content, source_platform=None):
+    """
+    Runs the preprocessing stage for one piece of feedback. Quoted email history is only
+    stripped for EMAIL_HISTORY_PLATFORMS.
+    Returns a dict with:
+      original_text   - the untouched input (this is what gets stored)
+      clean_text      - quoted history removed and noise stripped
+      nlp_text        - clean_text bounded to the NLP billing budget
+      prompt_text     - clean_text bounded to the Gemini prompt token budget
+      normalized_text - canonical form for caching and near-duplicate detection
+      cache_key       - SHA-256 of normalized_text
+      was_truncated   - True if either budget cut the text
+    """
+    original_text = text_content or ""
+    own_text = strip_quoted_email(original_text) if source_platform in EMAIL_HISTORY_PLATFORMS else original_text
+    clean_text = canonicalize_text(own_text)
+    if not clean_text:
+        # Nothing left after stripping (e.g. a bare link): fall back to the collapsed original.
+        clean_text = WHITESPACE_PATTERN.sub(" ", original_text).strip()
+
+    nlp_text = truncate_text(clean_text, nlp_char_budget())
+    prompt_text = truncate_text(clean_text, MAX_PROMPT_TOKENS * CHARS_PER_TOKEN_ESTIMATE)
+    normalized_text = normalize_for_cache(clean_text)
+
+    return {
+        "original_text": original_text,
+        "clean_text": clean_text,
+        "nlp_text": nlp_text,
+        "prompt_text": prompt_text,
+        "normalized_text": normalized_text,
+        "cache_key": hashlib.sha256(normalized_text.encode("utf-8")).hexdigest(),
+        "was_truncated": len(nlp_text) < len(clean_text) or len(prompt_text) < len(clean_text),
+    }
@@ -0,0 +1,142 @@
+"""
+Trains the local category classifier from labeled rows in enriched_feedback.
+
+By default only human-corrected rows (feedback_category_corrections) are used: the
+machine labels in enriched_feedback.category were produced by the keyword rules, so
+training on them mostly teaches the model to copy those rules. --include-machine-labels
+adds them back (weighted lower than corrections) when there are too few corrections
+to train on. Rows are streamed
+with a server-side cursor, so memory use does not grow with the table size.
+Every tenth message (by a stable hash of message_id) is held out and used to compare
+the trained model against the current keyword rules.
+
+Usage (from the repository root, with DB_* or DB_SQLITE_PATH set):
+    python -m central_ai_processor.train_category_classifier --output central_ai_processor/category_model.npz
+"""
+import argparse
+import random
+import sys
+import time
+import zlib
+
+from shared.db import get_db_connection, stream_dicts
+
+from central_ai_processor.category_classifier import CATEGORY_LABELS, DEFAULT_HASH_BITS, CategoryClassifier
+from central_ai_processor.main import CATEGORY_MODEL_PATH, classify_category_with_keywords
+from central_ai_processor.text_preprocessing import preprocess_feedback_text
+
+TRAINING_ROWS_SQL = """
+SELECT e.message_id, e.text_content, e.source_platform, e.category, c.corrected_category
+FROM enriched_feedback e
+LEFT JOIN feedback_category_corrections c ON c.message_id = e.message_id
+WHERE e.text_content IS NOT NULL
+"""
+CORRECTED_ROWS_SQL = """
+SELECT e.message_id, e.text_content, e.source_platform, e.category, c.corrected_category
+FROM enriched_feedback e
+JOIN feedback_category_corrections c ON c.message_id = e.message_id
+WHERE e.text_content IS NOT NULL
+"""
+CORRECTION_SAMPLE_WEIGHT = 5.0 # Human-reviewed labels count more than machine labels
+HOLDOUT_BUCKETS = 10
+
+def stream_labeled_rows(conn, fetch_size, include_machine_labels=False):
+    """
+    Yields (message_id, text, label, weight) for rows with a learnable label: human-corrected
+    rows only, unless include_machine_labels is set.
+    """
+    sql = TRAINING_ROWS_SQL if include_machine_labels else CORRECTED_ROWS_SQL
+    for rows in stream_dicts(conn, sql, fetch_size=fetch_size):
+        for row in rows:
+            label = row["corrected_category"] or row["category"]
+            if label not in CATEGORY_LABELS:
+                continue # e.g. negative_competitor_review, which is derived, not learned
+            weight = CORRECTION_SAMPLE_WEIGHT if row["corrected_category"] else 1.0
+            text = preprocess_feedback_text(row["text_content"], row["source_platform"])["nlp_text"]
+            yield row["message_id"], text, label, weight
+
+def is_holdout(message_id):
+    """Stable train/holdout split on message_id."""
+    return zlib.crc32(str(message_id).encode("utf-8")) % HOLDOUT_BUCKETS == 0
+
+def fit_batch(model, batch, learning_rate):
+    """Runs one shuffled mini-batch step over [(text, label, weight), ...]. Returns the loss."""
+    random.shuffle(batch)
+    texts, labels, weights = zip(*batch)
+    return model.partial_fit(list(texts), list(labels), learning_rate=learning_rate, sample_weights=weights)
+
+def train(conn, epochs, batch_size, fetch_size, learning_rate, hash_bits, include_machine_labels=False):
+    """Streams the table once per epoch and fits the classifier. Returns (model, holdout rows)."""
+    model = CategoryClassifier.empty(hash_bits=hash_bits)
+    holdout = []
+    for epoch in range(epochs):
+        started = time.time()
+        batch, losses, seen = [], [], 0
+        for message_id, text, label, weight in stream_labeled_rows(conn, fetch_size, include_machine_labels):
+            if is_holdout(message_id):
+                if epoch == 0:
+                    holdout.append((text, label, weight == CORRECTION_SAMPLE_WEIGHT))
+                continue
+            batch.append((text, label, weight))
+            if len(batch) >= batch_size:
+                losses.append(fit_batch(model, batch, learning_rate))
+                seen += len(batch)
+                batch = []
+        if batch:
+            losses.append(fit_batch(model, batch, learning_rate))
+            seen += len(batch)
+        mean_loss = sum(losses) / len(losses) if losses else float("nan")
+        print(f"Epoch {epoch + 1}/{epochs}: {seen} rows, mean loss {mean_loss:.4f}, {time.time() - started:.1f}s")
+    return model, holdout
+
+def accuracy(predictions, labels):
+    return sum(prediction == label for prediction, label in zip(predictions, labels)) / len(labels)
+
+def evaluate(model, holdout):
+    """
+    Prints holdout accuracy for the model and for the keyword rules it replaces, overall
+    and on human-corrected rows only (machine labels were produced by the keyword rules,
+    so the corrected rows are the fair comparison).
+    """
+    if not holdout:
+        print("No holdout rows; skipping evaluation.")
+        return
+    texts, labels, corrected = zip(*holdout)
+    predictions = [category for category, _ in model.predict_batch(list(texts))]
+    keyword_predictions = [classify_category_with_keywords(text.lower()) for text in texts]
+    print(f"Holdout ({len(labels)} rows): model accuracy {accuracy(predictions, labels):.3f}, "
+          f"keyword rules {accuracy(keyword_predictions, labels):.3f}")
+
+    corrected_rows = [i for i, is_corrected in enumerate(corrected) if is_corrected]
+    if corrected_rows:
+        corrected_labels = [labels[i] for i in corrected_rows]
+        print(f"Human-corrected holdout ({len(corrected_rows)} rows): "
+              f"model accuracy {accuracy([predictions[i] for i in corrected_rows], corrected_labels):.3f}, "
+              f"keyword rules {accuracy([keyword_predictions[i] for i in corrected_rows], corrected_labels):.3f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local category classifier.")
+    parser.add_argument("--output", default=CATEGORY_MODEL_PATH, help="Where to write the .npz model.")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--fetch-size", type=int, default=5000)
+    parser.add_argument("--learning-rate", type=float, default=0.2)
+    parser.add_argument("--hash-bits", type=int, default=DEFAULT_HASH_BITS)
+    parser.add_argument("--include-machine-labels", action="store_true",
+                        help="Also train on uncorrected rows, labeled by the keyword rules.")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    try:
+        model, holdout = train(conn, args.epochs, args.batch_size, args.fetch_size,
+                               args.learning_rate, args.hash_bits, args.include_machine_labels)
+    finally:
+        conn.close()
+
+    evaluate(model, holdout)
+    model.save(args.output)
+    print(f"Saved category model to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import json
+from shared.clients import get_topic_path
+from shared.connectors import run_enabled_connectors
+from shared.profiling import profiled
+
+# --- Configuration ---
+# !!! IMPORTANT: REPLACE THESE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID AND TOPIC NAME !!!
+PROJECT_ID = "zenithflow-feedback-automation"
+RAW_FEEDBACK_TOPIC_NAME = "raw-feedback-toc" # This is the Pub/Sub topic for all raw, normalized data
+
+raw_feedback_topic_path = get_topic_path(PROJECT_ID, RAW_FEEDBACK_TOPIC_NAME)
+
+def requested_connectors(request):
+    """Optional ?connectors=twitter,tiktok override from the scheduler request."""
+    args = getattr(request, "args", None) or {}
+    requested = args.get("connectors")
+    return [name.strip() for name in requested.split(",") if name.strip()] if requested else None
+
+@profiled
+def connector_scheduler_entrypoint(request):
+    """
+    Cloud Function entry point for the Connector Scheduler.
+    Triggered on a schedule (e.g., via Cloud Scheduler). Runs every enabled connector
+    (see shared/connectors.py) concurrently in one instance with one shared publisher,
+    instead of one Cloud Function (and one cold start) per source.
+    """
+    print(f"Connector Scheduler triggered. Project: {PROJECT_ID}, Topic: {RAW_FEEDBACK_TOPIC_NAME}")
+
+    summaries = run_enabled_connectors(raw_feedback_topic_path, requested_connectors(request))
+
+    for summary in summaries:
+        print(f"Connector '{summary['connector']}': {summary['status']}, {summary['published']} published, "
+              f"{summary['publish_failed']} publish failures, {summary['normalize_failed']} skipped "
+              f"in {summary['duration_seconds']}s.")
+
+    # Only report failure (so Cloud Scheduler retries) when no connector got anything through;
+    # a retry after a partial success would republish what already went out.
+    all_failed = bool(summaries) and all(summary["status"] == "error" for summary in summaries)
+    return json.dumps({"connectors": summaries}), 500 if all_failed else 200
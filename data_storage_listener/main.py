@@ -1,7 +1,11 @@
 import json
 import base64
 import os
+import threading
+import time
 import pg8000.dbapi # PostgreSQL database driver
+from shared.db import DB_SQLITE_PATH, adapt_sql, get_db_connection as get_local_db_connection, row_updated_at
+from shared.profiling import profiled
 
 # --- Configuration for Database Connection ---
 # These values will be set as environment variables in the Cloud Function deployment.
@@ -10,16 +14,26 @@ DB_USER = os.environ.get("DB_USER")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 DB_NAME = os.environ.get("DB_NAME")
 DB_PORT = os.environ.get("DB_PORT", "5432") # Default PostgreSQL port
+# A warm instance keeps its connection between messages; one idle longer than this is
+# reopened rather than trusted (Cloud SQL and proxies drop idle connections).
+DB_CONNECTION_MAX_IDLE_SECONDS = float(os.environ.get("DB_CONNECTION_MAX_IDLE_SECONDS", "60"))
 
 # Expected Enriched Schema (Input from ai_processor)
 ENRICHED_SCHEMA_KEYS = [
     "message_id", "source_platform", "timestamp_utc", "text_content",
     "author_info", "original_url", "raw_metadata", "sentiment",
-    "category", "detected_competitors", "auto_reply_text", "processing_timestamp_utc"
+    "category", "detected_competitors", "auto_reply_text", "processing_timestamp_utc",
+    "processor_version", "auto_reply_template"
 ]
 
 def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
+    """
+    Establishes a connection to the PostgreSQL database, or to the local SQLite
+    stand-in when DB_SQLITE_PATH is set (e.g. under local_pipeline_runner.py).
+    """
+    if DB_SQLITE_PATH:
+        return get_local_db_connection()
+
     if not all([DB_HOST, DB_USER, DB_PASSWORD, DB_NAME]):
         raise ValueError("Database connection environment variables are not set.")
 
@@ -33,10 +47,62 @@ def get_db_connection():
     )
     return conn
 
+# Reply patches from central_ai_processor's reply lane ('auto-reply-patches' topic; this
+# function is deployed with a second trigger on it). A patch may arrive before its record,
+# so it upserts; the record's upsert keeps an existing reply (see COALESCE below). Both
+# bump updated_at, so incremental readers pick up the reply.
+AUTO_REPLY_PATCH_RECORD_TYPE = "auto_reply_patch"
+AUTO_REPLY_PATCH_SQL = """
+INSERT INTO enriched_feedback (message_id, auto_reply_text, updated_at) VALUES (%s, %s, %s)
+ON CONFLICT (message_id) DO UPDATE SET auto_reply_text = EXCLUDED.auto_reply_text, updated_at = EXCLUDED.updated_at
+"""
+
+# One reusable connection per thread (Cloud Functions runs one message at a time per
+# instance; the in-process runner may run several storage workers).
+reusable_connection = threading.local()
+
+def get_reusable_db_connection():
+    """Returns this thread's open connection, reconnecting if there is none or it sat idle too long."""
+    conn = getattr(reusable_connection, "conn", None)
+    if conn is not None and time.monotonic() - reusable_connection.last_used > DB_CONNECTION_MAX_IDLE_SECONDS:
+        discard_reusable_db_connection()
+        conn = None
+    if conn is None:
+        conn = get_db_connection()
+        reusable_connection.conn = conn
+    reusable_connection.last_used = time.monotonic()
+    return conn
+
+def discard_reusable_db_connection():
+    """Closes and forgets this thread's connection (after an error it may be unusable)."""
+    conn = getattr(reusable_connection, "conn", None)
+    reusable_connection.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def merge_auto_reply_patch(patch):
+    """Stores the auto_reply_text of a reply patch on its enriched_feedback row."""
+    conn = None
+    try:
+        conn = get_reusable_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(adapt_sql(conn, AUTO_REPLY_PATCH_SQL), (patch.get("message_id"), patch.get("auto_reply_text"), row_updated_at()))
+        conn.commit()
+        print(f"Successfully merged auto-reply patch for {patch.get('message_id')} into Cloud SQL.")
+    except Exception as e:
+        if conn:
+            discard_reusable_db_connection()
+        print(f"ERROR: Could not merge auto-reply patch for {patch.get('message_id')}: {e}")
+
+@profiled
 def data_storage_listener_entrypoint(event, context):
     """
     Cloud Function entry point for the Data Storage Listener.
-    Triggered by new messages in the 'classified-feedback-topics' Pub/Sub topic.
+    Triggered by new messages in the 'classified-feedback-topics' Pub/Sub topic
+    (and by auto_reply_text patches in 'auto-reply-patches').
     """
     print("Data Storage Listener triggered.")
 
@@ -50,11 +116,15 @@ def data_storage_listener_entrypoint(event, context):
         decoded_data_str = base64.b64decode(message_data_b64).decode('utf-8')
         enriched_feedback = json.loads(decoded_data_str)
 
+        if enriched_feedback.get("record_type") == AUTO_REPLY_PATCH_RECORD_TYPE:
+            merge_auto_reply_patch(enriched_feedback)
+            return
+
         print(f"Received classified message for ID: {enriched_feedback.get('message_id')} (Category: {enriched_feedback.get('category')})")
 
         conn = None
         try:
-            conn = get_db_connection()
+            conn = get_reusable_db_connection()
             cursor = conn.cursor()
 
             # Prepare data for insertion
@@ -68,9 +138,10 @@ def data_storage_listener_entrypoint(event, context):
             INSERT INTO enriched_feedback (
                 message_id, source_platform, timestamp_utc, text_content,
                 author_info, original_url, raw_metadata, sentiment,
-                category, detected_competitors, auto_reply_text, processing_timestamp_utc
+                category, detected_competitors, auto_reply_text, processing_timestamp_utc,
+                processor_version, auto_reply_template, updated_at
             ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
             ) ON CONFLICT (message_id) DO UPDATE SET -- Handle potential duplicates gracefully
                 source_platform = EXCLUDED.source_platform,
                 timestamp_utc = EXCLUDED.timestamp_utc,
@@ -81,8 +152,11 @@ def data_storage_listener_entrypoint(event, context):
                 sentiment = EXCLUDED.sentiment,
                 category = EXCLUDED.category,
                 detected_competitors = EXCLUDED.detected_competitors,
-                auto_reply_text = EXCLUDED.auto_reply_text,
-                processing_timestamp_utc = EXCLUDED.processing_timestamp_utc;
+                auto_reply_text = COALESCE(EXCLUDED.auto_reply_text, enriched_feedback.auto_reply_text), -- Keep a reply patch that arrived first
+                processing_timestamp_utc = EXCLUDED.processing_timestamp_utc,
+                processor_version = EXCLUDED.processor_version,
+                auto_reply_template = EXCLUDED.auto_reply_template,
+                updated_at = EXCLUDED.updated_at;
             """
             # Values in the same order as placeholders
             values = (
@@ -97,24 +171,26 @@ def data_storage_listener_entrypoint(event, context):
                 enriched_feedback.get("category"),
                 detected_competitors_json, # JSON string
                 enriched_feedback.get("auto_reply_text"),
-                enriched_feedback.get("processing_timestamp_utc")
+                enriched_feedback.get("processing_timestamp_utc"),
+                enriched_feedback.get("processor_version"),
+                enriched_feedback.get("auto_reply_template"), # Set when the reply came from a template
+                row_updated_at() # Write time, not processing time: see shared.db.row_updated_at
             )
 
-            cursor.execute(insert_sql, values)
+            cursor.execute(adapt_sql(conn, insert_sql), values)
             conn.commit()
             print(f"Successfully inserted/updated feedback {enriched_feedback['message_id']} into Cloud SQL.")
 
         except pg8000.dbapi.Error as db_err:
             if conn:
-                conn.rollback() # Rollback in case of error
+                discard_reusable_db_connection() # Closing rolls back; the next message reconnects
             print(f"ERROR: Database error during insert for {enriched_feedback.get('message_id')}: {db_err}")
             # Log to Cloud Logging. Consider a dead-letter queue for these messages.
         except Exception as e:
+            if conn:
+                discard_reusable_db_connection()
             print(f"ERROR: An unexpected error occurred in data_storage_listener: {e}")
             # Log to Cloud Logging.
-        finally:
-            if conn:
-                conn.close() # Always close the connection
 
     except json.JSONDecodeError as e:
         print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}. Raw data: {message_data_b64}")
@@ -2,11 +2,13 @@ import json
 import base64
 import os
 import requests # Could be used for SendGrid/Mailgun API calls in real scenario
+from shared.idempotency import SideEffectInProgress, run_side_effect_once
+from shared.profiling import profiled
 
 # --- Configuration ---
 # !!! IMPORTANT: REPLACE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID !!!
 PROJECT_ID = "zenithflow-feedback-automation"
-CLASSIFIED_FEEDBACK_TOPIC_NAME = "classified-feedback-topics" # Topic this function consumes from
+AUTO_REPLY_PATCHES_TOPIC_NAME = "auto-reply-patches" # Topic this function consumes from (reply lane output)
 
 # --- Email Service Configuration (Conceptual for Dummy Integration) ---
 # In a real scenario, these would be actual SendGrid/Mailgun API details.
@@ -46,10 +48,12 @@ def send_simulated_email(to_email, subject, body):
 
     return True # Return True for simulation success
 
+@profiled
 def email_reply_integration_entrypoint(event, context):
     """
     Cloud Function entry point for Email Reply Integration.
-    Triggered by new messages in the 'classified-feedback-topics' Pub/Sub topic.
+    Triggered by auto_reply_text patches in the 'auto-reply-patches' Pub/Sub topic, which
+    carry the reply together with the sentiment, category and author of the feedback.
     """
     print("Email Reply Integration Function triggered.")
 
@@ -83,13 +87,20 @@ def email_reply_integration_entrypoint(event, context):
             subject = f"Thank You for your Feedback on FlowHub! (Ref: {message_id})"
             body = auto_reply_text # The AI-generated reply
 
-            if send_simulated_email(to_email, subject, body):
+            # Redeliveries of an already-answered message stop here (see shared/idempotency.py).
+            sent, result = run_side_effect_once("email", message_id, lambda: send_simulated_email(to_email, subject, body))
+            if not sent:
+                print(f"Skipping duplicate delivery of auto-reply for message {message_id}; it was already sent.")
+            elif result:
                 print(f"Successfully simulated sending auto-reply for message {message_id}.")
             else:
                 print(f"Failed to simulate sending auto-reply for message {message_id}.")
         else:
             print(f"No auto-reply action for message ID {message_id} (Category: {category}, Sentiment: {sentiment}).")
 
+    except SideEffectInProgress as e:
+        print(f"WARNING: {e}; failing this delivery so Pub/Sub redelivers it.")
+        raise
     except json.JSONDecodeError as e:
         print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}. Raw data: {message_data_b64}")
     except Exception as e:
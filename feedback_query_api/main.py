@@ -0,0 +1,361 @@
+"""
+Read-side HTTP query API over enriched_feedback.
+
+Endpoints (GET):
+    /feedback                  Filtered listing, newest first, with keyset pagination.
+                               Filters: source_platform, category, sentiment, competitor,
+                               since, until (ISO 8601, on timestamp_utc); limit; cursor.
+    /feedback/<message_id>     One enriched feedback row.
+    /aggregates                Counts grouped by group_by = source_platform | category |
+                               sentiment | competitor | day, with the same filters.
+
+Pages are fetched with `WHERE (timestamp_utc, message_id) < (last seen)` on an index, so
+page 1000 costs the same as page 1 (unlike OFFSET). The `next_cursor` of a response is
+passed back as `cursor` to get the next page.
+
+Responses are cached for QUERY_CACHE_TTL_SECONDS. At most every QUERY_CHANGE_POLL_SECONDS,
+one indexed query looks for rows written since the last check (updated_at, which record
+upserts and reply patches both set) and drops only the cached responses they can affect:
+those whose filters match the row's new values, and those that contain the row.
+
+Run locally against the SQLite stand-in (from the repository root):
+    DB_SQLITE_PATH=local.db python -m feedback_query_api.main --port 8080
+    curl 'http://localhost:8080/feedback?category=bug_report&limit=20'
+"""
+import argparse
+import base64
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from shared.db import ConnectionPool, execute, is_sqlite, load_json
+from shared.profiling import profiled
+
+try:
+    from .response_cache import ResponseCache, cache_key
+except ImportError: # Deployed as a standalone Cloud Function source directory
+    from response_cache import ResponseCache, cache_key
+
+# --- Configuration ---
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get("QUERY_CACHE_TTL_SECONDS", "30"))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "1000"))
+QUERY_CHANGE_POLL_SECONDS = float(os.environ.get("QUERY_CHANGE_POLL_SECONDS", "1"))
+QUERY_DEFAULT_PAGE_SIZE = 50
+QUERY_MAX_PAGE_SIZE = 200
+# More changed rows than this in one poll simply clears the whole cache.
+CHANGE_FEED_BATCH_SIZE = 1000
+
+FILTER_COLUMNS = ["source_platform", "category", "sentiment"]
+GROUP_BY_OPTIONS = ["source_platform", "category", "sentiment", "competitor", "day"]
+LIST_COLUMNS = [
+    "message_id", "source_platform", "timestamp_utc", "text_content", "author_info",
+    "original_url", "sentiment", "category", "detected_competitors", "auto_reply_text",
+    "processing_timestamp_utc", "processor_version",
+]
+JSON_COLUMNS = {"author_info", "raw_metadata", "detected_competitors"}
+
+class QueryError(ValueError):
+    """A bad request parameter; reported to the client as HTTP 400."""
+
+@functools.lru_cache(maxsize=None)
+def get_connection_pool():
+    """Returns the process-wide connection pool, created on first use."""
+    return ConnectionPool()
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache():
+    return ResponseCache(QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_MAX_ENTRIES)
+
+# --- Change Detection ---
+LATEST_UPDATED_SQL = """
+SELECT updated_at, message_id FROM enriched_feedback
+WHERE updated_at IS NOT NULL
+ORDER BY updated_at DESC, message_id DESC
+LIMIT 1
+"""
+CHANGED_ROWS_SQL = """
+SELECT message_id, source_platform, timestamp_utc, sentiment, category, detected_competitors,
+       updated_at
+FROM enriched_feedback
+WHERE (updated_at, message_id) > (%s, %s)
+ORDER BY updated_at, message_id
+LIMIT %s
+"""
+# Columns a re-enrichment can change. The change feed only sees a row's new values, so a
+# cached aggregate filtered on one of these may have lost the row from its buckets.
+ENRICHMENT_FILTERS = ["sentiment", "category", "competitor"]
+
+class FeedbackChangeFeed:
+    """
+    Tracks the newest (updated_at, message_id) seen and invalidates cached responses for
+    rows written after it. A write still in flight when its updated_at was passed is not
+    seen here; the cache TTL bounds its staleness.
+    """
+
+    def __init__(self, cache, poll_seconds):
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self.watermark = None
+        self.last_poll = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self, conn):
+        if time.monotonic() - self.last_poll < self.poll_seconds:
+            return
+        if not self.lock.acquire(blocking=False):
+            return # Another request is already polling
+        try:
+            self.last_poll = time.monotonic()
+            if self.watermark is None:
+                self.watermark = execute(conn, LATEST_UPDATED_SQL).fetchone() or ("", "")
+                return
+            cursor = execute(conn, CHANGED_ROWS_SQL, (*self.watermark, CHANGE_FEED_BATCH_SIZE))
+            column_names = [column[0] for column in cursor.description]
+            rows = [dict(zip(column_names, row)) for row in cursor.fetchall()]
+            if not rows:
+                return
+            self.watermark = (rows[-1]["updated_at"], rows[-1]["message_id"])
+            if len(rows) >= CHANGE_FEED_BATCH_SIZE:
+                self.cache.clear()
+                return
+            for row in rows:
+                row["timestamp_utc"] = format_timestamp(row["timestamp_utc"])
+                row["detected_competitors"] = load_json(row["detected_competitors"], [])
+            self.cache.invalidate_rows(rows)
+        finally:
+            self.lock.release()
+
+@functools.lru_cache(maxsize=None)
+def get_change_feed():
+    return FeedbackChangeFeed(get_response_cache(), QUERY_CHANGE_POLL_SECONDS)
+
+# --- Parameter Parsing ---
+def format_timestamp(value):
+    """Timestamps come back as datetimes from PostgreSQL and ISO strings from SQLite."""
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+def parse_timestamp_param(name, value):
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise QueryError(f"'{name}' must be an ISO 8601 date or timestamp.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc).isoformat(timespec='seconds')
+
+def parse_filters(args):
+    """Extracts and validates the filters shared by the listing and aggregate endpoints."""
+    filters = {column: args.get(column) or None for column in FILTER_COLUMNS}
+    filters["competitor"] = (args.get("competitor") or "").lower() or None
+    for name in ("since", "until"):
+        filters[name] = parse_timestamp_param(name, args.get(name)) if args.get(name) else None
+    return filters
+
+def parse_limit(args):
+    try:
+        limit = int(args.get("limit") or QUERY_DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise QueryError("'limit' must be an integer.")
+    if not 1 <= limit <= QUERY_MAX_PAGE_SIZE:
+        raise QueryError(f"'limit' must be between 1 and {QUERY_MAX_PAGE_SIZE}.")
+    return limit
+
+def encode_cursor(row):
+    position = json.dumps([format_timestamp(row["timestamp_utc"]), row["message_id"]])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+def decode_cursor(value):
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(value.encode('ascii')))
+    except Exception:
+        raise QueryError("'cursor' is not valid; pass back the next_cursor of a previous page.")
+    return timestamp, message_id
+
+# --- SQL Building ---
+def build_where(conn, filters):
+    """Returns (WHERE clause, params) for the filters; works on PostgreSQL and SQLite."""
+    clauses, params = ["timestamp_utc IS NOT NULL"], []
+    for column in FILTER_COLUMNS:
+        if filters.get(column) is not None:
+            clauses.append(f"{column} = %s")
+            params.append(filters[column])
+    if filters.get("competitor") is not None:
+        if is_sqlite(conn):
+            clauses.append("EXISTS (SELECT 1 FROM json_each(detected_competitors) AS mention WHERE mention.value = %s)")
+            params.append(filters["competitor"])
+        else:
+            clauses.append("detected_competitors @> %s::jsonb")
+            params.append(json.dumps([filters["competitor"]]))
+    if filters.get("since") is not None:
+        clauses.append("timestamp_utc >= %s")
+        params.append(filters["since"])
+    if filters.get("until") is not None:
+        clauses.append("timestamp_utc < %s")
+        params.append(filters["until"])
+    return "WHERE " + " AND ".join(clauses), params
+
+def serialize_row(row):
+    for column in JSON_COLUMNS & row.keys():
+        row[column] = load_json(row[column], None)
+    for column in ("timestamp_utc", "processing_timestamp_utc"):
+        row[column] = format_timestamp(row.get(column))
+    return row
+
+def fetch_dicts(conn, sql, params):
+    cursor = execute(conn, sql, params)
+    column_names = [column[0] for column in cursor.description]
+    return [dict(zip(column_names, row)) for row in cursor.fetchall()]
+
+# --- Queries ---
+def list_feedback(conn, filters, limit, cursor_value):
+    """One page of feedback, newest first. Fetches limit + 1 rows to know if there is more."""
+    where, params = build_where(conn, filters)
+    if cursor_value:
+        where += " AND (timestamp_utc, message_id) < (%s, %s)"
+        params += list(decode_cursor(cursor_value))
+    sql = (f"SELECT {', '.join(LIST_COLUMNS)} FROM enriched_feedback {where} "
+           "ORDER BY timestamp_utc DESC, message_id DESC LIMIT %s")
+    rows = fetch_dicts(conn, sql, params + [limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [serialize_row(row) for row in rows],
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+    }
+
+def get_feedback(conn, message_id):
+    rows = fetch_dicts(conn, "SELECT * FROM enriched_feedback WHERE message_id = %s", [message_id])
+    return serialize_row(rows[0]) if rows else None
+
+def aggregate_feedback(conn, filters, group_by):
+    """Row counts per value of `group_by` (competitor counts each mention)."""
+    if group_by not in GROUP_BY_OPTIONS:
+        raise QueryError(f"'group_by' must be one of: {', '.join(GROUP_BY_OPTIONS)}.")
+    where, params = build_where(conn, filters)
+    source = "enriched_feedback"
+    if group_by == "competitor":
+        if is_sqlite(conn):
+            source += ", json_each(enriched_feedback.detected_competitors) AS competitor"
+        else:
+            source += ", jsonb_array_elements_text(enriched_feedback.detected_competitors) AS competitor(value)"
+        key = "competitor.value"
+    elif group_by == "day":
+        key = "substr(timestamp_utc, 1, 10)" if is_sqlite(conn) else "to_char(timestamp_utc AT TIME ZONE 'UTC', 'YYYY-MM-DD')"
+    else:
+        key = group_by
+    sql = f"SELECT {key} AS bucket, COUNT(*) AS count FROM {source} {where} GROUP BY {key} ORDER BY count DESC, bucket"
+    buckets = [{"key": bucket, "count": count} for bucket, count in execute(conn, sql, params).fetchall()]
+    return {"group_by": group_by, "buckets": buckets, "total": sum(bucket["count"] for bucket in buckets)}
+
+# --- Request Handling ---
+def route(path, args):
+    """
+    Maps a request to (endpoint, cacheable params, filters used for invalidation, query
+    callable). Listings are also invalidated by the message_ids they contain (see
+    handle_request); aggregates have no such list, so they drop ENRICHMENT_FILTERS and are
+    invalidated by any changed row in their platform and time range.
+    """
+    parts = [part for part in path.split("/") if part]
+    if parts == ["feedback"]:
+        filters, limit, cursor_value = parse_filters(args), parse_limit(args), args.get("cursor")
+        return ("feedback", dict(filters, limit=limit, cursor=cursor_value), filters,
+                lambda conn: list_feedback(conn, filters, limit, cursor_value))
+    if len(parts) == 2 and parts[0] == "feedback":
+        message_id = parts[1]
+        return ("feedback_item", {"message_id": message_id}, {"message_id": message_id},
+                lambda conn: get_feedback(conn, message_id))
+    if parts == ["aggregates"]:
+        filters, group_by = parse_filters(args), args.get("group_by") or "category"
+        invalidation_filters = {name: value for name, value in filters.items() if name not in ENRICHMENT_FILTERS}
+        return ("aggregates", dict(filters, group_by=group_by), invalidation_filters,
+                lambda conn: aggregate_feedback(conn, filters, group_by))
+    return None
+
+def handle_request(method, path, args):
+    """Returns (status, response body dict, extra headers). Framework-independent."""
+    if method != "GET":
+        return 405, {"error": "Only GET is supported."}, {}
+    if path.rstrip("/") == "/stats":
+        return 200, {"cache": get_response_cache().stats()}, {}
+    try:
+        routed = route(path, args)
+    except QueryError as e:
+        return 400, {"error": str(e)}, {}
+    if routed is None:
+        return 404, {"error": f"Unknown endpoint {path}"}, {}
+    endpoint, params, filters, query = routed
+
+    cache = get_response_cache()
+    key = cache_key(endpoint, params)
+    with get_connection_pool().connection() as conn:
+        get_change_feed().refresh(conn)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], {"X-Cache": "HIT"}
+        try:
+            result = query(conn)
+        except QueryError as e:
+            return 400, {"error": str(e)}, {}
+    status, body = (404, {"error": f"No feedback with message_id {filters['message_id']}"}) if result is None else (200, result)
+    message_ids = [item["message_id"] for item in body.get("items", [])]
+    cache.put(key, filters, (status, body), message_ids)
+    return status, body, {"X-Cache": "MISS"}
+
+@profiled
+def feedback_query_api_entrypoint(request):
+    """
+    Cloud Function entry point for the Feedback Query API (HTTP trigger).
+    """
+    try:
+        status, body, headers = handle_request(request.method, request.path, request.args)
+    except Exception as e:
+        print(f"ERROR: Query API request {request.path} failed: {e}")
+        status, body, headers = 500, {"error": "Internal error"}, {}
+    return json.dumps(body, default=str), status, dict(headers, **{"Content-Type": "application/json"})
+
+# --- Local Server ---
+def serve(host, port):
+    """Serves the API with the standard library HTTP server (for local development)."""
+    import http.server
+    import urllib.parse
+
+    class QueryApiHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            args = {name: values[-1] for name, values in urllib.parse.parse_qs(url.query).items()}
+            try:
+                status, body, headers = handle_request("GET", url.path, args)
+            except Exception as e:
+                print(f"ERROR: Query API request {url.path} failed: {e}")
+                status, body, headers = 500, {"error": "Internal error"}, {}
+            payload = json.dumps(body, default=str).encode('utf-8')
+            self.send_response(status)
+            for name, value in dict(headers, **{"Content-Type": "application/json"}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = http.server.ThreadingHTTPServer((host, port), QueryApiHandler)
+    print(f"Feedback Query API listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        get_connection_pool().close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the feedback query API locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    cli_args = parser.parse_args()
+
+    from shared.schema import ensure_schema
+
+    with get_connection_pool().connection() as schema_conn:
+        ensure_schema(schema_conn)
+    serve(cli_args.host, cli_args.port)
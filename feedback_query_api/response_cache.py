@@ -0,0 +1,90 @@
+import collections
+import json
+import threading
+import time
+
+# --- Filter-Aware Response Cache ---
+# Dashboards poll the same few pages constantly. Responses are cached for a short TTL
+# keyed by endpoint and filters, and entries are dropped early as soon as a changed row
+# that matches their filters, or that they contain, is seen (see FeedbackChangeFeed in
+# main.py), so a poll only reaches the database when its answer may actually have changed.
+# Matching on filters alone would miss a row re-enriched out of a cached listing (say from
+# category bug_report to general_feedback): its new values no longer match the listing.
+
+def cache_key(endpoint, params):
+    """Stable key for an endpoint and its (already validated) parameters."""
+    return endpoint + "?" + json.dumps(params, sort_keys=True, default=str)
+
+def row_matches_filters(row, filters):
+    """True if a changed enriched_feedback row could appear in a response with these filters."""
+    if filters.get("message_id") is not None and row["message_id"] != filters["message_id"]:
+        return False
+    for column in ("source_platform", "category", "sentiment"):
+        if filters.get(column) is not None and row.get(column) != filters[column]:
+            return False
+    if filters.get("competitor") is not None and filters["competitor"] not in (row.get("detected_competitors") or []):
+        return False
+    timestamp = row.get("timestamp_utc")
+    if timestamp is not None:
+        if filters.get("since") is not None and str(timestamp) < filters["since"]:
+            return False
+        if filters.get("until") is not None and str(timestamp) >= filters["until"]:
+            return False
+    return True
+
+class ResponseCache:
+    """
+    TTL + LRU cache of JSON responses that remembers the filters each response depends on
+    and the message_ids it contains.
+    """
+
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict() # key -> (expires_at, filters, message_ids, response)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key, filters, response, message_ids=()):
+        if self.ttl_seconds <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, filters, frozenset(message_ids), response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate_rows(self, rows):
+        """Drops every entry that contains, or whose filters match, at least one of the changed rows."""
+        changed_ids = {row["message_id"] for row in rows}
+        with self.lock:
+            stale = [key for key, (_, filters, message_ids, _) in self.entries.items()
+                     if not message_ids.isdisjoint(changed_ids) or any(row_matches_filters(row, filters) for row in rows)]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "invalidations": self.invalidations, "ttl_seconds": self.ttl_seconds}
@@ -2,6 +2,8 @@ import json
 import base64
 import os
 import requests # Used for making HTTP requests to Jira API (simulated)
+from shared.idempotency import SideEffectInProgress, run_side_effect_once
+from shared.profiling import profiled
 
 # --- Configuration ---
 # !!! IMPORTANT: REPLACE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID !!!
@@ -71,6 +73,7 @@ def create_jira_issue(issue_summary, issue_description, issue_priority="Medium")
 
     return "SIMULATED_JIRA_KEY_XYZ" # Return a dummy key for simulation
 
+@profiled
 def jira_integration_entrypoint(event, context):
     """
     Cloud Function entry point for Jira Integration.
@@ -115,8 +118,11 @@ def jira_integration_entrypoint(event, context):
             if sentiment == "negative":
                 priority = "High"
 
-            jira_key = create_jira_issue(summary, description, priority)
-            if jira_key:
+            # Redeliveries of an already-ticketed message stop here (see shared/idempotency.py).
+            created, jira_key = run_side_effect_once("jira", message_id, lambda: create_jira_issue(summary, description, priority))
+            if not created:
+                print(f"Skipping duplicate delivery of bug report {message_id}. Jira issue: {jira_key}")
+            elif jira_key:
                 print(f"Successfully processed bug report {message_id}. Simulated Jira key: {jira_key}")
             else:
                 print(f"Failed to simulate Jira issue creation for {message_id}.")
@@ -126,12 +132,15 @@ def jira_integration_entrypoint(event, context):
         elif category == "negative_competitor_review":
             print(f"Category is 'negative_competitor_review'. Data stored for review.")
             # This is handled by storage, no immediate action here
-        elif sentiment == "positive" and enriched_feedback.get("auto_reply_text"):
+        elif sentiment == "positive" and (enriched_feedback.get("auto_reply_text") or enriched_feedback.get("auto_reply_pending")):
             print(f"Category is 'positive' with auto-reply text. Will be handled by Email Reply integration.")
             # This is where Email Reply integration would be triggered
         else:
             print(f"No specific integration action for category '{category}' and sentiment '{sentiment}'. Data is stored.")
 
+    except SideEffectInProgress as e:
+        print(f"WARNING: {e}; failing this delivery so Pub/Sub redelivers it.")
+        raise
     except json.JSONDecodeError as e:
         print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}. Raw data: {message_data_b64}")
         # Consider acknowledging to move past bad messages
@@ -1,3 +1,4 @@
+import datetime
 import json
 import os
 import pg8000.dbapi
@@ -7,6 +8,7 @@ from google.cloud import pubsub_v1
 # !!! IMPORTANT: REPLACE THESE WITH YOUR ACTUAL VALUES !!!
 PROJECT_ID = "zenithflow-feedback-automation"
 CLASSIFIED_FEEDBACK_TOPIC_NAME = "classified-feedback-topics"
+AUTO_REPLY_PATCHES_TOPIC_NAME = "auto-reply-patches" # Replies from central_ai_processor's reply lane
 
 # --- Cloud SQL Database Configuration ---
 # These are your Cloud SQL instance's Public IP, user, password, etc.
@@ -22,6 +24,9 @@ subscriber = pubsub_v1.SubscriberClient()
 # Create a subscription for this local script to listen to.
 # This creates a NEW subscription, don't reuse the one for the data_storage_listener CF.
 SUBSCRIPTION_PATH = subscriber.subscription_path(PROJECT_ID, "local-db-writer-subscription")
+# A second subscription, on AUTO_REPLY_PATCHES_TOPIC_NAME, delivers the reply patches:
+# without it the auto_reply_patch branch below never runs and replies never reach the table.
+PATCH_SUBSCRIPTION_PATH = subscriber.subscription_path(PROJECT_ID, "local-db-writer-patches-subscription")
 
 # --- Database Connection ---
 def get_db_connection():
@@ -40,10 +45,24 @@ def get_db_connection():
         raise # Re-raise to stop execution if connection fails
 
 # --- Data Insertion Logic (Copied from data_storage_listener) ---
+def row_updated_at():
+    """Write time for enriched_feedback.updated_at (same format as shared.db.row_updated_at)."""
+    return datetime.datetime.utcnow().isoformat(timespec='microseconds') + 'Z'
+
 def insert_enriched_feedback(conn, enriched_feedback):
-    """Inserts a single enriched feedback message into the database."""
+    """Inserts a single enriched feedback message (or merges an auto-reply patch) into the database."""
     cursor = conn.cursor()
 
+    if enriched_feedback.get("record_type") == "auto_reply_patch": # From the reply lane
+        cursor.execute(
+            "INSERT INTO enriched_feedback (message_id, auto_reply_text, updated_at) VALUES (%s, %s, %s) "
+            "ON CONFLICT (message_id) DO UPDATE SET auto_reply_text = EXCLUDED.auto_reply_text, updated_at = EXCLUDED.updated_at",
+            (enriched_feedback.get("message_id"), enriched_feedback.get("auto_reply_text"), row_updated_at())
+        )
+        conn.commit()
+        print(f"Successfully merged auto-reply patch for {enriched_feedback['message_id']} into Cloud SQL.")
+        return
+
     author_info_json = json.dumps(enriched_feedback.get("author_info", {}))
     raw_metadata_json = json.dumps(enriched_feedback.get("raw_metadata", {}))
     detected_competitors_json = json.dumps(enriched_feedback.get("detected_competitors", []))
@@ -52,9 +71,10 @@ def insert_enriched_feedback(conn, enriched_feedback):
     INSERT INTO enriched_feedback (
         message_id, source_platform, timestamp_utc, text_content,
         author_info, original_url, raw_metadata, sentiment,
-        category, detected_competitors, auto_reply_text, processing_timestamp_utc
+        category, detected_competitors, auto_reply_text, processing_timestamp_utc,
+        processor_version, auto_reply_template, updated_at
     ) VALUES (
-        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
     ) ON CONFLICT (message_id) DO UPDATE SET
         source_platform = EXCLUDED.source_platform,
         timestamp_utc = EXCLUDED.timestamp_utc,
@@ -65,8 +85,11 @@ def insert_enriched_feedback(conn, enriched_feedback):
         sentiment = EXCLUDED.sentiment,
         category = EXCLUDED.category,
         detected_competitors = EXCLUDED.detected_competitors,
-        auto_reply_text = EXCLUDED.auto_reply_text,
-        processing_timestamp_utc = EXCLUDED.processing_timestamp_utc;
+        auto_reply_text = COALESCE(EXCLUDED.auto_reply_text, enriched_feedback.auto_reply_text), -- Keep a reply patch that arrived first
+        processing_timestamp_utc = EXCLUDED.processing_timestamp_utc,
+        processor_version = EXCLUDED.processor_version,
+        auto_reply_template = EXCLUDED.auto_reply_template,
+        updated_at = EXCLUDED.updated_at;
     """
     values = (
         enriched_feedback.get("message_id"),
@@ -80,7 +103,10 @@ def insert_enriched_feedback(conn, enriched_feedback):
         enriched_feedback.get("category"),
         detected_competitors_json,
         enriched_feedback.get("auto_reply_text"),
-        enriched_feedback.get("processing_timestamp_utc")
+        enriched_feedback.get("processing_timestamp_utc"),
+        enriched_feedback.get("processor_version"),
+        enriched_feedback.get("auto_reply_template"),
+        row_updated_at()
     )
 
     cursor.execute(insert_sql, values)
@@ -117,19 +143,24 @@ def callback(message: pubsub_v1.subscriber.message.Message):
         message.nack()
 
 if __name__ == "__main__":
-    print(f"Listening for messages on {SUBSCRIPTION_PATH}...")
+    print(f"Listening for messages on {SUBSCRIPTION_PATH} and {PATCH_SUBSCRIPTION_PATH}...")
     # The subscriber client is an asynchronous context manager.
-    # It starts a thread to pull messages.
-    streaming_pull_future = subscriber.subscribe(SUBSCRIPTION_PATH, callback=callback)
+    # It starts a thread to pull messages for each subscription; both share the callback.
+    streaming_pull_futures = [
+        subscriber.subscribe(SUBSCRIPTION_PATH, callback=callback),
+        subscriber.subscribe(PATCH_SUBSCRIPTION_PATH, callback=callback),
+    ]
     print("Listening... Press Ctrl+C to exit.")
 
     # Wrap the subscribe call in a try/finally block to ensure resources are properly cleaned up.
     try:
         # Blocks the main thread to keep the script running and listening
-        streaming_pull_future.result()
+        for streaming_pull_future in streaming_pull_futures:
+            streaming_pull_future.result()
     except KeyboardInterrupt:
-        streaming_pull_future.cancel() # Triggers the shutdown
-        streaming_pull_future.result() # Wait for the shutdown to complete
+        for streaming_pull_future in streaming_pull_futures:
+            streaming_pull_future.cancel() # Triggers the shutdown
+            streaming_pull_future.result() # Wait for the shutdown to complete
     finally:
         subscriber.api.transport.close() # Close the Pub/Sub transport
         print("Stopped listening.")
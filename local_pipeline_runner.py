@@ -0,0 +1,409 @@
+"""
+Runs the whole feedback pipeline in one process, with no Pub/Sub, GCP project or
+Cloud SQL instance.
+
+The production entrypoints are called unchanged. Every topic becomes a set of bounded
+asyncio queues, one per subscribing function, and get_publisher() is pointed at an
+in-process publisher (see shared/clients.py), so:
+
+    connectors -> raw-feedback-toc -> ai_processor_entrypoint
+               -> classified-feedback-topics -> data_storage_listener / jira / basecamp / spike_detector entrypoints
+               -> auto-reply-requests -> reply_generation_entrypoint
+               -> auto-reply-patches -> data_storage_listener / email_reply entrypoints
+
+A publish waits while the next queue is full. The backpressure therefore reaches all the
+way back to the source. Each stage runs a configurable number of workers, and the
+handlers run in a thread pool sized to fit. On Ctrl+C or SIGTERM the sources stop and
+every queue is drained in topic order before the process exits.
+
+By default the runner sets AI_BACKEND=local (offline sentiment, no Gemini) and stores
+rows in a SQLite file.
+
+Usage (from the repository root):
+    python local_pipeline_runner.py                         # run the registered connectors once
+    python local_pipeline_runner.py --synthetic 20000       # throughput run with generated feedback
+    python local_pipeline_runner.py --synthetic 20000 --workers ai_processor=8,data_storage=1
+    python local_pipeline_runner.py --synthetic 5000 --redeliver-fraction 0.2   # exercise at-least-once delivery
+"""
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import contextlib
+import datetime
+import importlib
+import itertools
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+RAW_FEEDBACK_TOPIC_NAME = "raw-feedback-toc"
+CLASSIFIED_FEEDBACK_TOPIC_NAME = "classified-feedback-topics"
+AUTO_REPLY_REQUESTS_TOPIC_NAME = "auto-reply-requests"
+AUTO_REPLY_PATCHES_TOPIC_NAME = "auto-reply-patches"
+LOCAL_PROJECT_ID = "local-pipeline"
+
+# topic name -> [(stage name, handler module, entrypoint name)]; mirrors the deployed subscriptions.
+SUBSCRIPTIONS = {
+    RAW_FEEDBACK_TOPIC_NAME: [
+        ("ai_processor", "central_ai_processor.main", "ai_processor_entrypoint"),
+    ],
+    CLASSIFIED_FEEDBACK_TOPIC_NAME: [
+        ("data_storage", "data_storage_listener.main", "data_storage_listener_entrypoint"),
+        ("jira", "jira_integration.main", "jira_integration_entrypoint"),
+        ("basecamp", "basecamp_integration.main", "basecamp_integration_entrypoint"),
+        ("spike_detector", "spike_detector.main", "spike_detector_entrypoint"),
+    ],
+    AUTO_REPLY_REQUESTS_TOPIC_NAME: [
+        ("reply_generation", "central_ai_processor.main", "reply_generation_entrypoint"),
+    ],
+    AUTO_REPLY_PATCHES_TOPIC_NAME: [
+        ("reply_storage", "data_storage_listener.main", "data_storage_listener_entrypoint"),
+        ("email_reply", "email_reply_integration.main", "email_reply_integration_entrypoint"),
+    ],
+}
+# Topics in pipeline order, so draining them one after the other empties everything.
+TOPIC_ORDER = [RAW_FEEDBACK_TOPIC_NAME, CLASSIFIED_FEEDBACK_TOPIC_NAME,
+               AUTO_REPLY_REQUESTS_TOPIC_NAME, AUTO_REPLY_PATCHES_TOPIC_NAME]
+
+# SQLite has a single writer, so more storage workers would only wait on its lock. The
+# spike detector keeps its windows in memory and is deployed as a single instance.
+DEFAULT_STAGE_WORKERS = {
+    "ai_processor": 4, "data_storage": 1, "jira": 2, "basecamp": 2, "spike_detector": 1,
+    "reply_generation": 4, "reply_storage": 1, "email_reply": 2,
+}
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 128
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+def log(message):
+    """Runner output; goes to the real stdout even while handler output is silenced."""
+    print(message, file=sys.__stdout__, flush=True)
+
+class HandlerOutput:
+    """
+    Stands in for sys.stdout while the pipeline runs. The handlers catch their own
+    exceptions and report them with an "ERROR: ..." line, as they do in Cloud Logging, so
+    those lines are counted per thread: a message whose handler printed one has failed.
+    Everything is passed on to `stream` (None drops it).
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        if text.startswith("ERROR:"):
+            self.local.errors = self.error_count() + 1
+            self.local.last_error = text
+        return self.stream.write(text) if self.stream is not None else len(text)
+
+    def flush(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+    def error_count(self):
+        """ERROR lines printed so far by the calling thread."""
+        return getattr(self.local, "errors", 0)
+
+    def last_error(self):
+        return getattr(self.local, "last_error", None)
+
+# --- In-Process Pub/Sub ---
+class PipelineStage:
+    """
+    One subscribing function: a bounded queue plus its worker tasks.
+
+    The queue bound is enforced with a thread-side semaphore ("credits"): a publisher takes
+    a credit before enqueueing and a worker returns it on dequeue. Handler threads can then
+    publish without a round trip through the event loop while the queue has room, and
+    still block, like a full Pub/Sub flow-control buffer, when it does not.
+    """
+
+    def __init__(self, name, handler, workers, queue_size, batch_size):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.credits = threading.BoundedSemaphore(queue_size)
+        self.tasks = []
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.first_error = None
+
+    def run_batch(self, batch):
+        """
+        Runs the handler once per message, in one worker thread. Returns the failure count:
+        messages whose handler raised or printed an ERROR line (see HandlerOutput).
+        """
+        output = sys.stdout if isinstance(sys.stdout, HandlerOutput) else None
+        failed = 0
+        for data in batch:
+            errors_before = output.error_count() if output else 0
+            try:
+                # The same event shape Cloud Functions delivers for a Pub/Sub trigger.
+                self.handler({"data": base64.b64encode(data).decode('ascii')}, None)
+            except Exception as e:
+                failed += 1
+                log(f"ERROR: Stage '{self.name}' handler raised: {e}")
+                continue
+            if output and output.error_count() > errors_before:
+                failed += 1
+                if self.first_error is None:
+                    self.first_error = output.last_error()
+                    log(f"Stage '{self.name}' handler reported: {self.first_error.strip()}")
+        return failed
+
+    async def worker(self):
+        while True:
+            # Take whatever is already queued (up to batch_size) so a busy stage hands its
+            # messages to a thread in one hop instead of one hop per message.
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            for _ in batch:
+                self.credits.release()
+            try:
+                failed = await asyncio.to_thread(self.run_batch, batch)
+                self.processed += len(batch) - failed
+                self.failed += failed
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+class InProcessPublisher:
+    """
+    Stands in for pubsub_v1.PublisherClient. publish() is called from handler and source
+    threads: it blocks until every subscriber queue of the topic has room, then hands the
+    message to the event loop and returns an already-resolved future.
+
+    Like Pub/Sub, delivery can be at-least-once: a `redeliver_fraction` of messages reach
+    every subscriber twice.
+    """
+
+    def __init__(self, loop, stages_by_topic, redeliver_fraction=0.0):
+        self.loop = loop
+        self.stages_by_topic = stages_by_topic
+        self.message_ids = itertools.count(1)
+        self.redeliver_fraction = redeliver_fraction
+        self.redelivered = 0
+
+    def publish(self, topic, data, **attributes):
+        stages = self.stages_by_topic.get(topic.rsplit("/", 1)[-1], [])
+        copies = 2 if self.redeliver_fraction and random.random() < self.redeliver_fraction else 1
+        self.redelivered += copies - 1
+        for _ in range(copies):
+            for stage in stages:
+                stage.credits.acquire() # Backpressure: waits while this subscriber's queue is full
+            self.loop.call_soon_threadsafe(self.deliver, stages, data)
+        future = concurrent.futures.Future()
+        future.set_result(str(next(self.message_ids)))
+        return future
+
+    def deliver(self, stages, data):
+        for stage in stages:
+            stage.queue.put_nowait(data) # Cannot overflow: a credit was taken for it
+            stage.max_depth = max(stage.max_depth, stage.queue.qsize())
+
+# --- Sources ---
+# Written independently of reply_templates.json, so the template hit rate seen here is what
+# unseen feedback gets rather than a replay of the library's own examples.
+SYNTHETIC_TEMPLATES = [
+    "Since switching to FlowHub our {team} team is far more organized, planning takes {n} minutes now.",
+    "FlowHub is great, any chance of a native {feature} for {team} projects? Feature idea #{n}",
+    "FlowHub mobile app is crashing on iOS 17.{n} when I try to {action}. Please fix this bug",
+    "This FlowHub update is a mess for our {team} team. Thinking of switching back to {competitor}.",
+    "Does FlowHub integrate with {integration}? We have {n} people on the {team} team asking.",
+    "The new {feature} release is great, nice job! Our {team} team closed {n} tickets early.",
+]
+SYNTHETIC_WORDS = {
+    "team": ["remote", "design", "marketing", "support", "backend", "sales", "ops", "finance"],
+    "feature": ["time tracker", "gantt chart", "dark mode", "calendar sync", "offline mode", "wiki"],
+    "action": ["upload files", "share a board", "log in", "export a report", "add a comment"],
+    "competitor": ["Asana", "Monday.com", "ClickUp", "Trello", "Jira", "Basecamp"],
+    "integration": ["Google Drive", "Slack", "Dropbox", "GitHub", "Zoom", "Outlook"],
+}
+
+def synthetic_feedback(count, seed=0):
+    """Yields `count` normalized feedback messages built from varied templates."""
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for index in range(count):
+        platform = "twitter" if index % 2 == 0 else "tiktok"
+        text = rng.choice(SYNTHETIC_TEMPLATES).format(
+            n=rng.randint(1, 500), **{key: rng.choice(words) for key, words in SYNTHETIC_WORDS.items()}
+        )
+        yield {
+            "message_id": f"synthetic-{seed}-{index}",
+            "source_platform": platform,
+            "timestamp_utc": (now - datetime.timedelta(seconds=index)).isoformat(timespec='seconds'),
+            "text_content": text,
+            "author_info": {"id": str(index % 5000), "username": f"synthetic_user_{index % 5000}x"},
+            "original_url": None,
+            "raw_metadata": {"synthetic": True},
+        }
+
+def publish_synthetic(topic_path, count, seed, stop_event):
+    """Publishes generated feedback; blocks whenever the raw queue is full."""
+    from shared.clients import get_publisher
+
+    published = 0
+    for feedback in synthetic_feedback(count, seed):
+        if stop_event.is_set():
+            break
+        get_publisher().publish(topic_path, json.dumps(feedback).encode('utf-8')).result()
+        published += 1
+    return published
+
+def publish_from_connectors(topic_path, connector_names):
+    """Runs the registered connectors (shared/connectors.py) once, as the scheduler would."""
+    from shared.connectors import run_enabled_connectors
+
+    summaries = run_enabled_connectors(topic_path, connector_names)
+    for summary in summaries:
+        log(f"Connector '{summary['connector']}': {summary['status']}, {summary['published']} published.")
+    return sum(summary["published"] for summary in summaries)
+
+# --- Runner ---
+def parse_worker_counts(value):
+    """'ai_processor=8,data_storage=1' -> dict merged over DEFAULT_STAGE_WORKERS."""
+    counts = dict(DEFAULT_STAGE_WORKERS)
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, count = item.partition("=")
+        if name not in counts or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"Invalid worker setting '{item}' (stages: {', '.join(counts)}).")
+        counts[name] = int(count)
+    return counts
+
+def build_stages(worker_counts, queue_size, batch_size, skip_stages):
+    """Imports every handler and returns {topic name: [PipelineStage, ...]}."""
+    stages_by_topic = {}
+    for topic_name, subscribers in SUBSCRIPTIONS.items():
+        stages_by_topic[topic_name] = []
+        for stage_name, module_name, entrypoint_name in subscribers:
+            if stage_name in skip_stages:
+                continue
+            handler = getattr(importlib.import_module(module_name), entrypoint_name)
+            stages_by_topic[topic_name].append(
+                PipelineStage(stage_name, handler, worker_counts[stage_name], queue_size, batch_size)
+            )
+    return stages_by_topic
+
+async def report_progress(stages, started):
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+        elapsed = time.monotonic() - started
+        log("Progress: " + ", ".join(
+            f"{stage.name} {stage.processed} ({stage.processed / elapsed:.0f}/s, queue {stage.queue.qsize()})"
+            for stage in stages
+        ))
+
+async def run_pipeline(args):
+    from shared.clients import get_topic_path, set_publisher_override
+
+    loop = asyncio.get_running_loop()
+    stages_by_topic = build_stages(args.workers, args.queue_size, args.batch_size, set(args.skip_stage))
+    stages = [stage for topic in TOPIC_ORDER for stage in stages_by_topic[topic]]
+    # Every worker may be inside a blocking handler (or a publish waiting on backpressure)
+    # at once, so the pool needs a thread per worker plus some for the sources.
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+        max_workers=sum(stage.workers for stage in stages) + 8, thread_name_prefix="pipeline"
+    ))
+
+    publisher = InProcessPublisher(loop, stages_by_topic, args.redeliver_fraction)
+    set_publisher_override(publisher)
+    stop_event = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError): # Not available on Windows event loops
+            loop.add_signal_handler(signal_number, stop_event.set)
+
+    for stage in stages:
+        stage.start()
+    started = time.monotonic()
+    progress = asyncio.create_task(report_progress(stages, started))
+
+    raw_topic_path = get_topic_path(LOCAL_PROJECT_ID, RAW_FEEDBACK_TOPIC_NAME)
+    try:
+        if args.synthetic:
+            source_count = await asyncio.to_thread(publish_synthetic, raw_topic_path, args.synthetic, args.seed, stop_event)
+        else:
+            source_count = await asyncio.to_thread(publish_from_connectors, raw_topic_path, args.connectors)
+        if stop_event.is_set():
+            log("Shutdown requested; draining queued messages...")
+
+        # Graceful drain: a stage's queue only empties after everything upstream of it has.
+        for topic_name in TOPIC_ORDER:
+            for stage in stages_by_topic[topic_name]:
+                await stage.queue.join()
+    finally:
+        progress.cancel()
+        for stage in stages:
+            await stage.stop()
+        set_publisher_override(None)
+
+    elapsed = time.monotonic() - started
+    log(f"Pipeline drained: {source_count} source messages end to end in {elapsed:.2f}s "
+        f"({source_count / max(elapsed, 1e-9):.0f} msg/s).")
+    if publisher.redelivered:
+        log(f"  {publisher.redelivered} messages were delivered twice (--redeliver-fraction).")
+    log(f"  {'stage':<18} {'workers':>7} {'processed':>10} {'failed':>7} {'max queue':>10}")
+    for stage in stages:
+        log(f"  {stage.name:<18} {stage.workers:>7} {stage.processed:>10} {stage.failed:>7} {stage.max_depth:>10}")
+    return 0 if all(stage.failed == 0 for stage in stages) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the feedback pipeline in one process.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Publish N generated messages instead of running connectors.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated messages.")
+    parser.add_argument("--connectors", default="", help="Comma-separated connectors to run (default: all enabled).")
+    parser.add_argument("--workers", type=parse_worker_counts, default=parse_worker_counts(""),
+                        help="Per-stage worker counts, e.g. ai_processor=8,data_storage=1.")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Bound of every stage queue.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Most messages a worker hands to its thread at once.")
+    parser.add_argument("--redeliver-fraction", type=float, default=0.0,
+                        help="Deliver this fraction of published messages twice, as Pub/Sub may.")
+    parser.add_argument("--skip-stage", action="append", default=[], help="Do not subscribe this stage (repeatable).")
+    parser.add_argument("--sqlite-path", default=os.environ.get("DB_SQLITE_PATH", "local_pipeline.db"),
+                        help="SQLite file used by the storage stage.")
+    parser.add_argument("--ai-backend", default="local", choices=["local", "google"],
+                        help="'google' calls the real NLP and Gemini APIs.")
+    parser.add_argument("--verbose", action="store_true", help="Show the handlers' own log output.")
+    args = parser.parse_args(argv)
+    args.connectors = [name.strip() for name in args.connectors.split(",") if name.strip()] or None
+
+    # Read by the handler modules at import time, so set before build_stages imports them.
+    os.environ["DB_SQLITE_PATH"] = args.sqlite_path
+    os.environ["AI_BACKEND"] = args.ai_backend
+
+    from shared.db import get_db_connection
+    from shared.schema import ensure_schema
+
+    # Held open for the whole run: the storage handlers keep a connection per worker thread
+    # but reopen it after an error or an idle spell, and closing the last connection to a
+    # WAL database forces a checkpoint.
+    conn = get_db_connection(args.sqlite_path)
+    try:
+        ensure_schema(conn)
+        # Handler output is always routed through HandlerOutput so failures are counted.
+        with contextlib.redirect_stdout(HandlerOutput(sys.stdout if args.verbose else None)):
+            return asyncio.run(run_pipeline(args))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
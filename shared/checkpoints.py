@@ -0,0 +1,30 @@
+import functools
+import json
+import time
+
+from shared.db import ConnectionPool, execute, load_json
+
+# --- Checkpoints for Stateful Functions ---
+# Small JSON state that must survive instance restarts (spike detector windows, connector
+# polling state) is kept in the stream_checkpoints table (see shared/schema.py), one row
+# per name, overwritten on every save.
+LOAD_CHECKPOINT_SQL = "SELECT state FROM stream_checkpoints WHERE name = %s"
+SAVE_CHECKPOINT_SQL = """
+INSERT INTO stream_checkpoints (name, state, updated_at) VALUES (%s, %s, %s)
+ON CONFLICT (name) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+"""
+
+@functools.lru_cache(maxsize=None)
+def get_checkpoint_pool():
+    return ConnectionPool(max_size=1)
+
+def load_checkpoint(name):
+    """Returns the last state saved under `name`, or None."""
+    with get_checkpoint_pool().connection() as conn:
+        row = execute(conn, LOAD_CHECKPOINT_SQL, (name,)).fetchone()
+    return load_json(row[0]) if row else None
+
+def save_checkpoint(name, state):
+    with get_checkpoint_pool().connection() as conn:
+        execute(conn, SAVE_CHECKPOINT_SQL, (name, json.dumps(state), time.time()))
+        conn.commit()
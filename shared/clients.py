@@ -0,0 +1,66 @@
+import functools
+import os
+
+# --- Lazy Google Cloud Client Factories ---
+# Importing the Google Cloud SDKs and building their clients at module import time
+# adds seconds to every cold start, even for invocations that exit early.
+# These factories defer both the import and the construction to first use and
+# memoize the result so each function instance builds every client exactly once.
+
+# Pub/Sub batching configuration shared by every publisher in the process.
+PUBSUB_BATCH_MAX_MESSAGES = int(os.environ.get("PUBSUB_BATCH_MAX_MESSAGES", "100"))
+PUBSUB_BATCH_MAX_BYTES = int(os.environ.get("PUBSUB_BATCH_MAX_BYTES", str(1024 * 1024)))
+PUBSUB_BATCH_MAX_LATENCY_SECONDS = float(os.environ.get("PUBSUB_BATCH_MAX_LATENCY_SECONDS", "0.01"))
+
+# Set by the in-process pipeline runner (local_pipeline_runner.py) so that every
+# publish goes to local queues instead of Pub/Sub, without changing the handlers.
+publisher_override = None
+
+def set_publisher_override(publisher):
+    """Routes get_publisher() to `publisher` (anything with a compatible publish()); None restores Pub/Sub."""
+    global publisher_override
+    publisher_override = publisher
+
+def get_publisher():
+    """Returns the publisher override if one is set, otherwise the process-wide Pub/Sub client."""
+    if publisher_override is not None:
+        return publisher_override
+    return get_pubsub_publisher()
+
+@functools.lru_cache(maxsize=None)
+def get_pubsub_publisher():
+    """Returns the process-wide Pub/Sub PublisherClient, creating it on first use."""
+    from google.cloud import pubsub_v1
+
+    batch_settings = pubsub_v1.types.BatchSettings(
+        max_messages=PUBSUB_BATCH_MAX_MESSAGES,
+        max_bytes=PUBSUB_BATCH_MAX_BYTES,
+        max_latency=PUBSUB_BATCH_MAX_LATENCY_SECONDS,
+    )
+    return pubsub_v1.PublisherClient(batch_settings=batch_settings)
+
+@functools.lru_cache(maxsize=None)
+def get_topic_path(project_id, topic_name):
+    """Returns the fully-qualified topic path without building a client."""
+    return f"projects/{project_id}/topics/{topic_name}"
+
+@functools.lru_cache(maxsize=None)
+def get_nlp_client():
+    """Returns the process-wide Natural Language API client, creating it on first use."""
+    from google.cloud import language_v1
+
+    return language_v1.LanguageServiceClient()
+
+@functools.lru_cache(maxsize=None)
+def get_gemini_model(model_name):
+    """Returns a memoized Vertex AI GenerativeModel for the given model name."""
+    from vertexai.preview.generative_models import GenerativeModel
+
+    return GenerativeModel(model_name)
+
+@functools.lru_cache(maxsize=None)
+def get_storage_client():
+    """Returns the process-wide Cloud Storage client, creating it on first use."""
+    from google.cloud import storage
+
+    return storage.Client()
@@ -0,0 +1,177 @@
+import concurrent.futures
+import importlib
+import json
+import os
+import time
+
+from shared.clients import get_publisher
+
+# --- Connector Registry ---
+# A connector is a source of raw feedback: a `fetch` callable that yields raw items and a
+# `normalize` callable that turns one raw item into the normalized feedback schema (or
+# None if it cannot be processed). Connector modules register themselves on import, so
+# the same module works as a standalone Cloud Function and inside the scheduler.
+# To add a source (website, email, app store, ...), write its module and list it here.
+CONNECTOR_MODULES = {
+    "twitter": "twitter_connector.main",
+    "tiktok": "tiktok_connector.main",
+}
+
+# Comma-separated connector names to run; empty means every connector in CONNECTOR_MODULES.
+ENABLED_CONNECTORS = os.environ.get("ENABLED_CONNECTORS", "")
+CONNECTOR_TIMEOUT_SECONDS = float(os.environ.get("CONNECTOR_TIMEOUT_SECONDS", "60"))
+CONNECTOR_MAX_WORKERS = int(os.environ.get("CONNECTOR_MAX_WORKERS", "4"))
+# Extra time given to a connector to notice its deadline before it is reported as timed out.
+CONNECTOR_TIMEOUT_GRACE_SECONDS = 2.0
+
+CONNECTORS = {} # name -> connector dict, filled by register_connector()
+
+def register_connector(name, fetch, normalize, timeout_seconds=None):
+    """
+    Registers a connector. The timeout can be overridden per connector with the
+    CONNECTOR_TIMEOUT_SECONDS_<NAME> environment variable.
+    """
+    env_timeout = os.environ.get(f"CONNECTOR_TIMEOUT_SECONDS_{name.upper()}")
+    CONNECTORS[name] = {
+        "name": name,
+        "fetch": fetch,
+        "normalize": normalize,
+        "timeout_seconds": float(env_timeout or timeout_seconds or CONNECTOR_TIMEOUT_SECONDS),
+    }
+    return CONNECTORS[name]
+
+def enabled_connector_names(requested=None):
+    """Names to run: `requested`, else ENABLED_CONNECTORS, else every known connector."""
+    names = requested or [name.strip() for name in ENABLED_CONNECTORS.split(",") if name.strip()]
+    return names or list(CONNECTOR_MODULES)
+
+def discover_connectors(names):
+    """
+    Imports the module of each named connector (which registers it).
+    Returns (connectors, {name: error message}) so one broken connector does not stop the others.
+    """
+    connectors, errors = [], {}
+    for name in names:
+        if name not in CONNECTORS:
+            module_name = CONNECTOR_MODULES.get(name)
+            if module_name is None:
+                errors[name] = "unknown connector"
+                continue
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                errors[name] = f"failed to import {module_name}: {e}"
+                continue
+        if name in CONNECTORS:
+            connectors.append(CONNECTORS[name])
+        else:
+            errors[name] = f"{CONNECTOR_MODULES[name]} did not register a connector named '{name}'"
+    return connectors, errors
+
+def new_summary(name):
+    return {
+        "connector": name,
+        "status": "ok",
+        "fetched": 0,
+        "normalize_failed": 0,
+        "published": 0,
+        "publish_failed": 0,
+        "duration_seconds": 0.0,
+        "error": None,
+    }
+
+# --- Fetch / Normalize / Publish ---
+def run_connector(connector, topic_path, deadline=None):
+    """
+    Runs one connector's fetch-normalize-publish loop and returns its summary.
+
+    Messages are handed to the shared batching publisher as they are normalized and the
+    publish futures are awaited at the end, instead of blocking on every message. The
+    deadline (a time.monotonic() value) is checked between items and bounds the wait
+    for outstanding publishes.
+    """
+    name = connector["name"]
+    summary = new_summary(name)
+    started = time.monotonic()
+    pending = []
+    try:
+        for raw_item in connector["fetch"]():
+            if deadline is not None and time.monotonic() > deadline:
+                summary["status"] = "timeout"
+                print(f"WARNING: Connector '{name}' reached its deadline; stopping fetch.")
+                break
+            summary["fetched"] += 1
+            normalized_data = connector["normalize"](raw_item)
+            if not normalized_data:
+                summary["normalize_failed"] += 1
+                continue
+            data_bytes = json.dumps(normalized_data).encode('utf-8')
+            pending.append((normalized_data["message_id"], get_publisher().publish(topic_path, data_bytes)))
+    except Exception as e:
+        summary["status"] = "error"
+        summary["error"] = f"fetch failed: {e}"
+        print(f"ERROR: Connector '{name}' failed while fetching: {e}")
+
+    # Messages already handed to the publisher are still awaited, even after a fetch error.
+    for feedback_id, future in pending:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        try:
+            pubsub_message_id = future.result(timeout=timeout)
+            summary["published"] += 1
+            print(f"Published message {pubsub_message_id} from {name} (ID: {feedback_id}).")
+        except Exception as e:
+            summary["publish_failed"] += 1
+            print(f"ERROR: Failed to publish message for {name} ID {feedback_id}: {e}")
+    if summary["publish_failed"] and summary["status"] == "ok":
+        summary["status"] = "partial"
+
+    summary["duration_seconds"] = round(time.monotonic() - started, 3)
+    return summary
+
+def run_connectors(connectors, topic_path, max_workers=CONNECTOR_MAX_WORKERS):
+    """
+    Runs the connectors concurrently in a bounded thread pool, each with its own deadline.
+    Returns one summary per connector, in the order given.
+    """
+    if not connectors:
+        return []
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(connectors)),
+                                                 thread_name_prefix="connector")
+    started = time.monotonic()
+    futures = []
+    for connector in connectors:
+        deadline = started + connector["timeout_seconds"]
+        futures.append((connector, deadline, pool.submit(run_connector, connector, topic_path, deadline)))
+
+    summaries = []
+    try:
+        for connector, deadline, future in futures:
+            wait_seconds = max(deadline - time.monotonic(), 0.0) + CONNECTOR_TIMEOUT_GRACE_SECONDS
+            try:
+                summaries.append(future.result(timeout=wait_seconds))
+            except concurrent.futures.TimeoutError:
+                # A fetch call is blocked past the deadline. The thread cannot be killed;
+                # it is left to finish in the background and reported as timed out.
+                summary = new_summary(connector["name"])
+                summary.update(status="timeout", error=f"no result after {connector['timeout_seconds']}s",
+                               duration_seconds=round(time.monotonic() - started, 3))
+                print(f"ERROR: Connector '{connector['name']}' timed out after {connector['timeout_seconds']}s.")
+                summaries.append(summary)
+            except Exception as e:
+                summary = new_summary(connector["name"])
+                summary.update(status="error", error=str(e))
+                print(f"ERROR: Connector '{connector['name']}' failed: {e}")
+                summaries.append(summary)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return summaries
+
+def run_enabled_connectors(topic_path, requested=None, max_workers=CONNECTOR_MAX_WORKERS):
+    """Discovers the enabled connectors, runs them and returns a summary for each one."""
+    names = enabled_connector_names(requested)
+    connectors, errors = discover_connectors(names)
+    summaries = {summary["connector"]: summary for summary in run_connectors(connectors, topic_path, max_workers)}
+    for name, error in errors.items():
+        print(f"ERROR: Connector '{name}' is not available: {error}")
+        summaries[name] = dict(new_summary(name), status="error", error=error)
+    return [summaries[name] for name in names if name in summaries]
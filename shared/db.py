@@ -0,0 +1,197 @@
+import contextlib
+import datetime
+import json
+import os
+import queue
+import threading
+
+# --- Configuration for Database Connection ---
+# Same environment variables as data_storage_listener. Setting DB_SQLITE_PATH instead
+# points every tool at a local SQLite file, which stands in for Cloud SQL during
+# development (the SQL used by this repository runs on both).
+DB_HOST = os.environ.get("DB_HOST")
+DB_USER = os.environ.get("DB_USER")
+DB_PASSWORD = os.environ.get("DB_PASSWORD")
+DB_NAME = os.environ.get("DB_NAME")
+DB_PORT = os.environ.get("DB_PORT", "5432") # Default PostgreSQL port
+DB_SQLITE_PATH = os.environ.get("DB_SQLITE_PATH")
+
+DEFAULT_FETCH_SIZE = 1000
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+
+WAL_ENABLED_PATHS = set()
+
+def get_db_connection(sqlite_path=None):
+    """
+    Establishes a connection to the PostgreSQL database, or to the local SQLite
+    stand-in when DB_SQLITE_PATH (or `sqlite_path`) is set.
+    """
+    sqlite_path = sqlite_path or DB_SQLITE_PATH
+    if sqlite_path:
+        import sqlite3
+
+        conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+        # WAL lets a streaming reader and a batch writer share the file, as on PostgreSQL.
+        # The mode is stored in the file, so it is only switched once per path.
+        if sqlite_path not in WAL_ENABLED_PATHS:
+            conn.execute("PRAGMA journal_mode=WAL")
+            WAL_ENABLED_PATHS.add(sqlite_path)
+        # In WAL mode this only syncs at checkpoints; fine for a development stand-in.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    if not all([DB_HOST, DB_USER, DB_PASSWORD, DB_NAME]):
+        raise ValueError("Database connection environment variables are not set.")
+
+    import pg8000.dbapi # Deferred so SQLite-only tools don't need the driver
+
+    return pg8000.dbapi.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        port=int(DB_PORT)
+    )
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of database connections for long-lived services.
+
+    Connections are created on demand up to `max_size` and reused (most recently used
+    first). A connection that raised inside `connection()` is closed instead of being
+    returned, so a broken socket is never handed out twice.
+    """
+
+    def __init__(self, max_size=DB_POOL_MAX_SIZE, timeout_seconds=DB_POOL_TIMEOUT_SECONDS, sqlite_path=None):
+        self.max_size = max_size
+        self.timeout_seconds = timeout_seconds
+        self.sqlite_path = sqlite_path
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_create = self.created < self.max_size
+            if can_create:
+                self.created += 1
+        if can_create:
+            try:
+                return get_db_connection(self.sqlite_path)
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+        try:
+            return self.idle.get(timeout=self.timeout_seconds)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available within {self.timeout_seconds}s.")
+
+    def release(self, conn, broken=False):
+        if not broken:
+            try:
+                conn.rollback() # End the read transaction so the next user sees fresh data
+            except Exception:
+                broken = True
+        if broken:
+            with self.lock:
+                self.created -= 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+        self.idle.put(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Context manager that borrows a connection from the pool."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            with self.lock:
+                self.created -= 1
+            conn.close()
+
+def is_sqlite(conn):
+    """True if `conn` is a SQLite connection (the local stand-in)."""
+    return type(conn).__module__.startswith("sqlite3")
+
+def adapt_sql(conn, sql):
+    """Converts the repository's %s placeholders to SQLite's ? style when needed."""
+    return sql.replace("%s", "?") if is_sqlite(conn) else sql
+
+def execute(conn, sql, params=()):
+    """Executes one statement with placeholder adaptation and returns the cursor."""
+    cursor = conn.cursor()
+    cursor.execute(adapt_sql(conn, sql), params)
+    return cursor
+
+def stream_query(conn, sql, params=(), fetch_size=DEFAULT_FETCH_SIZE, cursor_name="stream_cursor"):
+    """
+    Yields (column_names, rows) chunks of at most `fetch_size` rows.
+
+    On PostgreSQL a server-side cursor (DECLARE ... / FETCH FORWARD) is used, so only one
+    chunk is ever held in memory regardless of the table size. SQLite cursors are already
+    incremental, so fetchmany() is enough there.
+    """
+    if is_sqlite(conn):
+        cursor = execute(conn, sql, params)
+        column_names = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield column_names, rows
+        return
+
+    cursor = conn.cursor()
+    cursor.execute(f"DECLARE {cursor_name} NO SCROLL CURSOR FOR {sql}", params)
+    try:
+        while True:
+            cursor.execute(f"FETCH FORWARD {int(fetch_size)} FROM {cursor_name}")
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            yield [column[0] for column in cursor.description], rows
+    finally:
+        cursor.execute(f"CLOSE {cursor_name}")
+        conn.commit() # End the read transaction the cursor lived in
+
+def stream_dicts(conn, sql, params=(), fetch_size=DEFAULT_FETCH_SIZE):
+    """Like stream_query, but yields lists of row dicts."""
+    for column_names, rows in stream_query(conn, sql, params, fetch_size):
+        yield [dict(zip(column_names, row)) for row in rows]
+
+def row_updated_at():
+    """
+    Value for enriched_feedback.updated_at: set by every write to a row (record upserts,
+    reply patches, the backfill), unlike processing_timestamp_utc, so readers that need
+    changed rows (Parquet export, query API cache) key on it. Microseconds, so the ISO
+    text sorts correctly on the SQLite stand-in too.
+    """
+    return datetime.datetime.utcnow().isoformat(timespec='microseconds') + 'Z'
+
+def load_json(value, default=None):
+    """Decodes a JSON/JSONB column: pg8000 returns Python objects, SQLite returns text."""
+    if value is None:
+        return default
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+    return value
@@ -0,0 +1,300 @@
+import argparse
+import collections
+import functools
+import os
+import threading
+import time
+import uuid
+
+from shared.db import ConnectionPool, execute
+
+# --- Idempotency Keys for Integration Side Effects ---
+# Pub/Sub delivers at least once, so the Jira, Basecamp and email functions can see the
+# same message_id several times. Each external side effect is recorded under
+# (integration, message_id) in the integration_side_effects table (see shared/schema.py):
+#   claim    - an atomic upsert takes the key, or takes over a claim whose lease expired
+#              (a worker that crashed mid-call); a live or completed claim is left alone
+#   complete - the claim holder stores the result; completed keys are final
+#   release  - the claim holder gives the key back after a failed call so a retry can run
+# A delivery that finds a live claim held by another worker raises SideEffectInProgress:
+# acking it would lose the action if that worker then fails and releases the key, so the
+# integration lets the exception escape and Pub/Sub redelivers the message later.
+# Completed keys are also kept in an in-process LRU, so a redelivery to a warm instance
+# costs no database round trip, and one to a cold instance costs one primary-key lookup.
+IDEMPOTENCY_ENABLED = os.environ.get("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+# Must exceed the function timeout, or a slow call could be taken over and repeated.
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_LOOKUP_BATCH_SIZE = 500
+
+STATUS_CLAIMED = "claimed"
+STATUS_COMPLETED = "completed"
+
+LOOKUP_SQL = """
+SELECT status, lease_expires_at, result FROM integration_side_effects
+WHERE integration = %s AND message_id = %s
+"""
+
+# The WHERE on DO UPDATE makes this a compare-and-swap: a conflicting row is only
+# overwritten when it is an expired claim, and the row count says whether we won.
+CLAIM_SQL = """
+INSERT INTO integration_side_effects (integration, message_id, status, claim_token, lease_expires_at, updated_at)
+VALUES (%s, %s, 'claimed', %s, %s, %s)
+ON CONFLICT (integration, message_id) DO UPDATE SET
+    status = 'claimed',
+    claim_token = EXCLUDED.claim_token,
+    lease_expires_at = EXCLUDED.lease_expires_at,
+    updated_at = EXCLUDED.updated_at
+WHERE integration_side_effects.status = 'claimed' AND integration_side_effects.lease_expires_at < %s
+"""
+
+COMPLETE_SQL = """
+UPDATE integration_side_effects
+SET status = 'completed', result = %s, lease_expires_at = NULL, updated_at = %s
+WHERE integration = %s AND message_id = %s AND claim_token = %s AND status = 'claimed'
+"""
+
+RELEASE_SQL = """
+DELETE FROM integration_side_effects
+WHERE integration = %s AND message_id = %s AND claim_token = %s AND status = 'claimed'
+"""
+
+PURGE_SQL = "DELETE FROM integration_side_effects WHERE status = 'completed' AND updated_at < %s"
+
+class SideEffectInProgress(Exception):
+    """Another worker holds a live claim on the key; the delivery must be retried, not acked."""
+
+    def __init__(self, integration, message_id):
+        super().__init__(f"{integration}/{message_id} is being handled by another worker")
+        self.integration = integration
+        self.message_id = message_id
+
+class IdempotencyStore:
+    """Claim/complete store for side effects, with an LRU of completed keys in front."""
+
+    def __init__(self, pool, lease_seconds=IDEMPOTENCY_LEASE_SECONDS, cache_size=IDEMPOTENCY_CACHE_SIZE):
+        self.pool = pool
+        self.lease_seconds = lease_seconds
+        self.cache_size = cache_size
+        self.completed = collections.OrderedDict() # (integration, message_id) -> result
+        self.lock = threading.Lock()
+        self.cache_hits = 0
+        self.db_lookups = 0
+
+    def cached_result(self, integration, message_id):
+        """(True, result) if the key is known to be completed in this process."""
+        key = (integration, message_id)
+        with self.lock:
+            if key not in self.completed:
+                return False, None
+            self.completed.move_to_end(key)
+            self.cache_hits += 1
+            return True, self.completed[key]
+
+    def remember(self, integration, message_id, result):
+        with self.lock:
+            self.completed[(integration, message_id)] = result
+            self.completed.move_to_end((integration, message_id))
+            while len(self.completed) > self.cache_size:
+                self.completed.popitem(last=False)
+
+    def lookup(self, integration, message_id):
+        """Returns {"status", "lease_expires_at", "result"} for the key, or None if unseen."""
+        hit, result = self.cached_result(integration, message_id)
+        if hit:
+            return {"status": STATUS_COMPLETED, "lease_expires_at": None, "result": result}
+        with self.pool.connection() as conn:
+            row = execute(conn, LOOKUP_SQL, (integration, message_id)).fetchone()
+        self.db_lookups += 1
+        if row is None:
+            return None
+        record = {"status": row[0], "lease_expires_at": row[1], "result": row[2]}
+        if record["status"] == STATUS_COMPLETED:
+            self.remember(integration, message_id, record["result"])
+        return record
+
+    def lookup_many(self, integration, message_ids):
+        """
+        Batched lookup: returns {message_id: record} for the keys that exist. Keys not in
+        the LRU are fetched with one IN (...) query per IDEMPOTENCY_LOOKUP_BATCH_SIZE ids.
+        """
+        records = {}
+        missing = []
+        for message_id in dict.fromkeys(message_ids):
+            hit, result = self.cached_result(integration, message_id)
+            if hit:
+                records[message_id] = {"status": STATUS_COMPLETED, "lease_expires_at": None, "result": result}
+            else:
+                missing.append(message_id)
+        for start in range(0, len(missing), IDEMPOTENCY_LOOKUP_BATCH_SIZE):
+            chunk = missing[start:start + IDEMPOTENCY_LOOKUP_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            sql = ("SELECT message_id, status, lease_expires_at, result FROM integration_side_effects "
+                   f"WHERE integration = %s AND message_id IN ({placeholders})")
+            with self.pool.connection() as conn:
+                rows = execute(conn, sql, [integration] + chunk).fetchall()
+            self.db_lookups += 1
+            for message_id, status, lease_expires_at, result in rows:
+                records[message_id] = {"status": status, "lease_expires_at": lease_expires_at, "result": result}
+                if status == STATUS_COMPLETED:
+                    self.remember(integration, message_id, result)
+        return records
+
+    def claim(self, integration, message_id):
+        """Takes the key for this worker; returns a claim token, or None if someone else holds or finished it."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self.pool.connection() as conn:
+            cursor = execute(conn, CLAIM_SQL, (integration, message_id, token, now + self.lease_seconds, now, now))
+            conn.commit()
+        return token if cursor.rowcount == 1 else None
+
+    def complete(self, integration, message_id, token, result):
+        """Marks the key done; returns False if the lease had expired and was taken over."""
+        with self.pool.connection() as conn:
+            cursor = execute(conn, COMPLETE_SQL, (result, time.time(), integration, message_id, token))
+            conn.commit()
+        if cursor.rowcount != 1:
+            return False
+        self.remember(integration, message_id, result)
+        return True
+
+    def release(self, integration, message_id, token):
+        """Gives up a claim after a failed side effect so a redelivery can retry it."""
+        with self.pool.connection() as conn:
+            execute(conn, RELEASE_SQL, (integration, message_id, token))
+            conn.commit()
+
+    def release_quietly(self, integration, message_id, token):
+        """`release`, logging instead of raising: the claim then simply expires with its lease."""
+        try:
+            self.release(integration, message_id, token)
+        except Exception as e:
+            print(f"WARNING: Could not release idempotency key {integration}/{message_id} ({e}); "
+                  f"a retry waits for the lease to expire.")
+
+    def purge(self, older_than_seconds):
+        """Deletes completed keys older than the Pub/Sub redelivery window; returns the count."""
+        with self.pool.connection() as conn:
+            cursor = execute(conn, PURGE_SQL, (time.time() - older_than_seconds,))
+            conn.commit()
+        return cursor.rowcount
+
+    def run_once(self, integration, message_id, side_effect):
+        """
+        Runs `side_effect()` unless this (integration, message_id) already ran. Returns
+        (ran, result). A falsy result or an exception counts as a failure and releases the
+        key, so the next delivery tries again. Raises SideEffectInProgress if it is running
+        elsewhere.
+        """
+        return self.run_after_lookup(integration, message_id, side_effect, self.lookup(integration, message_id))
+
+    def run_after_lookup(self, integration, message_id, side_effect, record):
+        """
+        `run_once` for a caller that already holds the key's `lookup` record. Store errors
+        never cost the side effect: if the claim fails it runs anyway (at-least-once), and
+        once it has run, failures to record the outcome are logged, not raised.
+        """
+        if record is not None and record["status"] == STATUS_COMPLETED:
+            return False, record["result"]
+        if record is not None and record["lease_expires_at"] >= time.time():
+            raise SideEffectInProgress(integration, message_id)
+        try:
+            token = self.claim(integration, message_id)
+        except Exception as e:
+            print(f"WARNING: Could not claim idempotency key {integration}/{message_id} ({e}); running the side effect without it.")
+            return True, side_effect()
+        if token is None: # Lost the race to another worker since the lookup
+            raise SideEffectInProgress(integration, message_id)
+        try:
+            result = side_effect()
+        except Exception:
+            self.release_quietly(integration, message_id, token)
+            raise
+        if not result:
+            self.release_quietly(integration, message_id, token)
+            return True, result
+        try:
+            completed = self.complete(integration, message_id, token, str(result))
+        except Exception as e:
+            print(f"WARNING: Could not record {integration}/{message_id} as done ({e}); a redelivery after the lease may repeat it.")
+            return True, result
+        if not completed:
+            print(f"WARNING: Idempotency lease for {integration}/{message_id} expired before completion; it may run again.")
+        return True, result
+
+@functools.lru_cache(maxsize=None)
+def get_idempotency_store():
+    """Store for this function instance (one small connection pool, shared by all invocations)."""
+    return IdempotencyStore(ConnectionPool())
+
+def run_side_effect_once(integration, message_id, side_effect):
+    """
+    Entry point for the integration functions: `run_once` on the shared store. If the store
+    is disabled or unreachable the side effect simply runs, i.e. the pipeline falls back to
+    Pub/Sub's at-least-once behaviour instead of dropping the action.
+    """
+    if not IDEMPOTENCY_ENABLED or not message_id:
+        return True, side_effect()
+    try:
+        store = get_idempotency_store()
+        record = store.lookup(integration, message_id)
+    except Exception as e:
+        print(f"WARNING: Idempotency store unavailable ({e}); running {integration} side effect for {message_id} without it.")
+        return True, side_effect()
+    return store.run_after_lookup(integration, message_id, side_effect, record)
+
+if __name__ == "__main__":
+    # Purge old keys, or measure what a redelivery costs against a scratch SQLite file.
+    from shared.db import get_db_connection
+    from shared.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Maintain or benchmark the integration idempotency store.")
+    parser.add_argument("--purge-older-than-days", type=float, help="Delete completed keys older than this.")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Run N side effects, then redeliver all of them.")
+    parser.add_argument("--sqlite-path", default="/tmp/idempotency_benchmark.db")
+    args = parser.parse_args()
+
+    if args.purge_older_than_days is not None:
+        conn = get_db_connection()
+        try:
+            ensure_schema(conn)
+        finally:
+            conn.close()
+        purged = IdempotencyStore(ConnectionPool(max_size=1)).purge(args.purge_older_than_days * 86400)
+        print(f"Purged {purged} completed idempotency keys.")
+
+    if args.benchmark:
+        if os.path.exists(args.sqlite_path):
+            os.remove(args.sqlite_path)
+        conn = get_db_connection(args.sqlite_path)
+        ensure_schema(conn)
+        conn.close()
+        calls = []
+        message_ids = [f"msg-{index}" for index in range(args.benchmark)]
+
+        def make_side_effect(message_id):
+            return lambda: calls.append(message_id) or f"ISSUE-{len(calls)}"
+
+        store = IdempotencyStore(ConnectionPool(max_size=1, sqlite_path=args.sqlite_path))
+        started = time.perf_counter()
+        for message_id in message_ids:
+            store.run_once("benchmark", message_id, make_side_effect(message_id))
+        first_seconds = time.perf_counter() - started
+
+        for label, redelivery_store in (("warm (LRU)", store),
+                                        ("cold (database)", IdempotencyStore(ConnectionPool(max_size=1, sqlite_path=args.sqlite_path)))):
+            redelivery_store.cache_hits = redelivery_store.db_lookups = 0
+            started = time.perf_counter()
+            for message_id in message_ids:
+                redelivery_store.run_once("benchmark", message_id, make_side_effect(message_id))
+            seconds = time.perf_counter() - started
+            print(f"Redelivery {label}: {seconds / args.benchmark * 1e6:.1f} us/message, "
+                  f"{redelivery_store.db_lookups} database lookups, {redelivery_store.cache_hits} cache hits")
+
+        started = time.perf_counter()
+        found = IdempotencyStore(ConnectionPool(max_size=1, sqlite_path=args.sqlite_path)).lookup_many("benchmark", message_ids)
+        batch_seconds = time.perf_counter() - started
+        print(f"First delivery: {first_seconds / args.benchmark * 1e6:.1f} us/message")
+        print(f"Batched lookup of {args.benchmark} keys: {batch_seconds * 1000:.1f} ms, {len(found)} found")
+        print(f"Side effects executed: {len(calls)} for {args.benchmark} messages delivered 3 times")
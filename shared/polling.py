@@ -0,0 +1,273 @@
+import functools
+import os
+import time
+
+from shared.checkpoints import load_checkpoint, save_checkpoint
+
+# --- Adaptive Polling for Connectors ---
+# Cloud Scheduler triggers the connectors on a fixed tick (e.g. every minute). A
+# PollingController per source decides whether the source is actually worth calling on
+# this tick and how often to call it within the invocation:
+#   - conditional requests: since_id so only new items are returned, and If-None-Match
+#     with the last ETag so an unchanged source answers 304 (free on most APIs)
+#   - pagination: the APIs answer newest first, so later pages hold older items. A round
+#     keeps the same since_id for every page, follows the page token, and only advances
+#     since_id to the first page's newest id after the last page. A round cut short (page
+#     or budget limit, 429, error) saves its token and resumes there on the next round
+#   - budget: x-rate-limit-* headers give the calls left in the current window; calls are
+#     spread evenly over the window, keeping (1 - POLL_BUDGET_FRACTION) of it in reserve
+#   - adaptation: the interval targets POLL_TARGET_ITEMS_PER_POLL new items per poll from
+#     a smoothed arrival rate, so a busy source is polled faster (down to
+#     POLL_MIN_INTERVAL_SECONDS, several times per invocation) and a quiet one backs off
+#     (up to POLL_MAX_INTERVAL_SECONDS). If the source's 304s turn out not to be charged
+#     (x-rate-limit-remaining unchanged after one), a quiet source costs nothing to check
+#     and is polled at the budget-limited rate instead
+# The state (cursor, ETag, rate estimate, budget, next poll time) is saved to
+# stream_checkpoints after every invocation, so cold starts don't reset it.
+POLL_MIN_INTERVAL_SECONDS = float(os.environ.get("POLL_MIN_INTERVAL_SECONDS", "15"))
+POLL_MAX_INTERVAL_SECONDS = float(os.environ.get("POLL_MAX_INTERVAL_SECONDS", "900"))
+POLL_DEFAULT_INTERVAL_SECONDS = float(os.environ.get("POLL_DEFAULT_INTERVAL_SECONDS", "60"))
+POLL_TARGET_ITEMS_PER_POLL = float(os.environ.get("POLL_TARGET_ITEMS_PER_POLL", "1"))
+POLL_BUDGET_FRACTION = float(os.environ.get("POLL_BUDGET_FRACTION", "0.9"))
+# How long one invocation keeps polling a busy source; keep below the connector timeout.
+POLL_WINDOW_SECONDS = float(os.environ.get("POLL_WINDOW_SECONDS", "45"))
+POLL_MAX_PAGES = int(os.environ.get("POLL_MAX_PAGES", "20"))
+POLL_HTTP_TIMEOUT_SECONDS = float(os.environ.get("POLL_HTTP_TIMEOUT_SECONDS", "10"))
+# Weight of the newest observation in the smoothed arrival rate.
+POLL_RATE_SMOOTHING = 0.3
+
+class SystemClock:
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class CheckpointStateStore:
+    """Keeps polling state in the stream_checkpoints table."""
+
+    def load(self, name):
+        return load_checkpoint(name)
+
+    def save(self, name, state):
+        save_checkpoint(name, state)
+
+def new_poll_state():
+    return {
+        "since_id": None,
+        "etag": None,
+        "page_token": None, # Next page of an unfinished round (older items still to fetch)
+        "round_newest_id": None, # Newest id of that round; becomes since_id when it finishes
+        "arrival_rate": None, # Items per second, smoothed
+        "interval_seconds": POLL_DEFAULT_INTERVAL_SECONDS,
+        "next_poll_at": 0.0,
+        "last_round_at": None,
+        "rate_limit": None, # {"limit", "remaining", "reset_at"} from the last response headers
+        "not_modified_free": None, # Whether a 304 leaves the rate limit untouched; None until seen
+        "stats": {"rounds": 0, "requests": 0, "not_modified": 0, "throttled": 0, "items": 0},
+    }
+
+def parse_rate_limit(headers, now):
+    """Reads x-rate-limit-* (or x-ratelimit-*) headers; returns None if the API sent none."""
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    limit = headers.get("x-rate-limit-limit") or headers.get("x-ratelimit-limit")
+    remaining = headers.get("x-rate-limit-remaining") or headers.get("x-ratelimit-remaining")
+    reset = headers.get("x-rate-limit-reset") or headers.get("x-ratelimit-reset")
+    if remaining is None or reset is None:
+        return None
+    reset = float(reset)
+    # Epoch seconds (Twitter/X) or seconds until reset (some other APIs).
+    reset_at = reset if reset > 1e9 else now + reset
+    return {"limit": int(limit) if limit is not None else None, "remaining": int(remaining), "reset_at": reset_at}
+
+class PollingController:
+    """
+    Poll scheduling, conditional-request state and rate-limit budget for one source.
+
+    `fetch_page(since_id, etag, page_token)` (supplied by the connector) makes one API call
+    and returns {"status", "headers", "items", "newest_id", "next_token", "etag"}; see
+    page_from_response(). Pages are expected newest first, as the real APIs return them.
+    With adaptive=False the controller polls on every invocation without ETags or budget
+    pacing, which is what a fixed Cloud Scheduler cadence does.
+    """
+
+    def __init__(self, source, clock=None, store=None, adaptive=True):
+        self.source = source
+        self.clock = clock or SystemClock()
+        self.store = store or CheckpointStateStore()
+        self.adaptive = adaptive
+        self.state = None
+
+    @property
+    def checkpoint_name(self):
+        return f"poller:{self.source}"
+
+    def load(self):
+        """Loads the saved state once per instance; later invocations reuse it from memory."""
+        if self.state is not None:
+            return
+        self.state = new_poll_state()
+        try:
+            saved = self.store.load(self.checkpoint_name)
+            if saved:
+                self.state.update(saved)
+        except Exception as e:
+            print(f"WARNING: Could not load polling state for '{self.source}': {e}")
+
+    def save(self):
+        try:
+            self.store.save(self.checkpoint_name, self.state)
+        except Exception as e:
+            print(f"WARNING: Could not save polling state for '{self.source}': {e}")
+
+    def budget_interval(self, now):
+        """Shortest interval that keeps this source inside its share of the rate-limit window."""
+        rate_limit = self.state["rate_limit"]
+        if not rate_limit or now >= rate_limit["reset_at"]:
+            return 0.0
+        reserve = (rate_limit["limit"] or rate_limit["remaining"]) * (1.0 - POLL_BUDGET_FRACTION)
+        usable = rate_limit["remaining"] - reserve
+        window_left = rate_limit["reset_at"] - now
+        return window_left if usable < 1 else window_left / usable
+
+    def schedule_next(self, now):
+        """Chooses the next poll time from the arrival rate and the remaining budget."""
+        if not self.adaptive:
+            self.state["next_poll_at"] = now
+            return
+        rate = self.state["arrival_rate"]
+        if self.state["not_modified_free"]:
+            interval = POLL_MIN_INTERVAL_SECONDS # Empty polls are free; only new items cost a call
+        elif rate is None:
+            interval = POLL_DEFAULT_INTERVAL_SECONDS # Not measured yet (needs two rounds)
+        else:
+            interval = POLL_TARGET_ITEMS_PER_POLL / rate if rate > 0 else POLL_MAX_INTERVAL_SECONDS
+        interval = min(max(interval, POLL_MIN_INTERVAL_SECONDS), POLL_MAX_INTERVAL_SECONDS)
+        interval = max(interval, self.budget_interval(now))
+        self.state["interval_seconds"] = round(interval, 3)
+        self.state["next_poll_at"] = now + interval
+
+    def observe_arrivals(self, item_count, now):
+        """Updates the smoothed arrival rate with the items found since the previous round."""
+        last_round_at = self.state["last_round_at"]
+        self.state["last_round_at"] = now
+        if last_round_at is None:
+            return
+        observed = item_count / max(now - last_round_at, 1.0)
+        rate = self.state["arrival_rate"]
+        self.state["arrival_rate"] = observed if rate is None else rate + POLL_RATE_SMOOTHING * (observed - rate)
+
+    def observe_not_modified_cost(self, before, after):
+        """Learns whether 304s are charged by comparing the budget around one (same window only)."""
+        if before and after and abs(before["reset_at"] - after["reset_at"]) < 2:
+            self.state["not_modified_free"] = after["remaining"] >= before["remaining"]
+
+    def poll_round(self, fetch_page):
+        """
+        One poll: follows pages (newest first) until everything newer than since_id has been
+        seen, then moves since_id up to the newest item of the round. Yields raw items.
+        """
+        state = self.state
+        stats = state["stats"]
+        stats["rounds"] += 1
+        round_started = self.clock.time()
+        items_found = 0
+        for _ in range(POLL_MAX_PAGES):
+            page_token = state["page_token"]
+            # Only the first page can be answered by a 304: the ETag describes the newest items.
+            etag = state["etag"] if self.adaptive and page_token is None else None
+            page = fetch_page(state["since_id"], etag, page_token)
+            now = self.clock.time()
+            stats["requests"] += 1
+            previous_limit = state["rate_limit"]
+            state["rate_limit"] = parse_rate_limit(page["headers"], now) or previous_limit
+            if page["status"] == 304:
+                stats["not_modified"] += 1
+                self.observe_not_modified_cost(previous_limit, state["rate_limit"])
+                break
+            if page["status"] == 429:
+                stats["throttled"] += 1
+                retry_after = (page["headers"] or {}).get("Retry-After") or (page["headers"] or {}).get("retry-after")
+                reset_at = state["rate_limit"]["reset_at"] if state["rate_limit"] else now + POLL_DEFAULT_INTERVAL_SECONDS
+                state["next_poll_at"] = now + float(retry_after) if retry_after else reset_at
+                print(f"WARNING: Source '{self.source}' is rate limited; next poll in {state['next_poll_at'] - now:.0f}s.")
+                return
+            if page["status"] != 200:
+                raise RuntimeError(f"Source '{self.source}' returned HTTP {page['status']}")
+            items_found += len(page["items"])
+            stats["items"] += len(page["items"])
+            yield from page["items"]
+            # The first page of a round holds its newest item.
+            round_newest_id = state["round_newest_id"] if page_token is not None else page["newest_id"]
+            if page["next_token"] is None:
+                if round_newest_id is not None:
+                    state["since_id"] = round_newest_id
+                state["page_token"] = state["round_newest_id"] = None
+                # Only a complete answer's ETag describes "nothing newer than since_id".
+                state["etag"] = page["etag"]
+                break
+            state["page_token"], state["round_newest_id"] = page["next_token"], round_newest_id
+            if self.adaptive and self.budget_interval(now) > POLL_MAX_INTERVAL_SECONDS:
+                break # Keep the rest of the budget; the older pages are fetched next round
+        self.observe_arrivals(items_found, round_started)
+        self.schedule_next(self.clock.time())
+
+    def poll(self, fetch_page, window_seconds=POLL_WINDOW_SECONDS):
+        """
+        Runs the poll rounds due within this invocation (at most `window_seconds` of
+        waiting for the next one) and yields raw items. Saves the state at the end.
+        """
+        self.load()
+        window_end = self.clock.time() + window_seconds
+        try:
+            while True:
+                now = self.clock.time()
+                next_poll_at = self.state["next_poll_at"]
+                if now < next_poll_at:
+                    if next_poll_at > window_end:
+                        break
+                    self.clock.sleep(next_poll_at - now)
+                yield from self.poll_round(fetch_page)
+                if not self.adaptive:
+                    break # Fixed cadence: one round per scheduler tick
+        finally:
+            self.save()
+
+# --- HTTP ---
+@functools.lru_cache(maxsize=None)
+def get_http_session():
+    """One keep-alive session per instance for all connector API calls."""
+    import requests # Deferred: only connectors with a configured API need it
+
+    return requests.Session()
+
+def fetch_page_json(url, params=None, headers=None, etag=None):
+    """GET with an optional If-None-Match; returns the requests.Response."""
+    request_headers = dict(headers or {})
+    if etag:
+        request_headers["If-None-Match"] = etag
+    params = {name: value for name, value in (params or {}).items() if value is not None}
+    return get_http_session().get(url, params=params, headers=request_headers, timeout=POLL_HTTP_TIMEOUT_SECONDS)
+
+def page_from_response(response, items=(), newest_id=None, next_token=None):
+    """
+    Builds the page dict PollingController expects from an HTTP response. `newest_id` is
+    the newest item on the page; `next_token` requests the next (older) page, None on the last.
+    """
+    return {
+        "status": response.status_code,
+        "headers": dict(response.headers),
+        "items": list(items),
+        "newest_id": newest_id,
+        "next_token": next_token or None,
+        "etag": response.headers.get("ETag"),
+    }
+
+def poll_interval_summary(controller):
+    """One log line describing a controller's current schedule and budget."""
+    state = controller.state
+    rate = state["arrival_rate"]
+    rate_limit = state["rate_limit"] or {}
+    return (f"Source '{controller.source}': next poll in {max(state['next_poll_at'] - controller.clock.time(), 0):.0f}s, "
+            f"arrival rate {'unknown' if rate is None else f'{rate * 3600:.1f}/h'}, "
+            f"rate limit remaining {rate_limit.get('remaining', 'unknown')}")
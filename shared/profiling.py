@@ -0,0 +1,146 @@
+import collections
+import cProfile
+import datetime
+import functools
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+# --- Opt-In Entrypoint Profiling ---
+# Every Cloud Function entrypoint is wrapped with @profiled. With PROFILE_SAMPLE_RATE unset
+# (or 0) the decorator returns the function itself, so there is no per-call cost at all.
+# Setting it on a deployed function (an environment variable change, no code change)
+# profiles that fraction of real invocations. Each sampled call writes:
+#   <name>-<time>-<id>.pstats   cProfile data (pstats, snakeviz, gprof2dot, flameprof)
+#   <name>-<time>-<id>.folded   sampled call stacks in collapsed format (flamegraph.pl, speedscope)
+#   <name>-<time>-<id>.txt      top functions and top allocations (also printed to the logs)
+# PROFILE_OUTPUT_DIR defaults to the instance's /tmp; point it at a Cloud Storage volume
+# mount to keep the files after the instance goes away.
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Comma-separated entrypoint names to profile; empty means all of them.
+PROFILE_ENTRYPOINTS = {name.strip() for name in os.environ.get("PROFILE_ENTRYPOINTS", "").split(",") if name.strip()}
+PROFILE_OUTPUT_DIR = os.environ.get("PROFILE_OUTPUT_DIR", "/tmp/profiles")
+PROFILE_TRACEMALLOC = os.environ.get("PROFILE_TRACEMALLOC", "true").lower() == "true"
+PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_STACK_INTERVAL_SECONDS = float(os.environ.get("PROFILE_STACK_INTERVAL_MS", "5")) / 1000.0
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "15"))
+
+# cProfile (sys.monitoring on Python 3.12+) and tracemalloc are process-wide, so only one
+# invocation is profiled at a time; concurrent sampled calls simply run unprofiled.
+profiling_lock = threading.Lock()
+
+class StackSampler(threading.Thread):
+    """Samples one thread's call stack below `root_code` at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, root_code, interval_seconds):
+        super().__init__(name="profile-stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval_seconds = interval_seconds
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                if code is self.root_code:
+                    break
+                frame = frame.f_back
+            if frame is not None: # Only stacks inside the entrypoint, not the profiler around it
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def summarize_profile(profile, allocations, peak_bytes, elapsed_seconds, name):
+    """Human-readable summary: top functions by cumulative time and top allocation sites."""
+    output = io.StringIO()
+    output.write(f"Profile of {name}: {elapsed_seconds * 1000:.1f} ms")
+    if peak_bytes is not None:
+        output.write(f", peak traced memory {peak_bytes / 1024:.1f} KiB")
+    output.write("\n\nTop functions by cumulative time:\n")
+    pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+    if allocations:
+        output.write("Top allocations made during the call and still held at its end (all threads):\n")
+        for statistic in allocations[:PROFILE_TOP_N]:
+            frame = statistic.traceback[0]
+            output.write(f"  {statistic.size / 1024:10.1f} KiB {statistic.count:8d} blocks  {frame.filename}:{frame.lineno}\n")
+    return output.getvalue()
+
+def write_profile_files(name, profile, sampler, summary):
+    """Writes the .pstats, .folded and .txt files; returns their common path prefix."""
+    os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    prefix = os.path.join(PROFILE_OUTPUT_DIR, f"{name}-{stamp}-{uuid.uuid4().hex[:8]}")
+    profile.dump_stats(f"{prefix}.pstats")
+    with open(f"{prefix}.folded", "w") as folded_file:
+        folded_file.write(sampler.collapsed())
+    with open(f"{prefix}.txt", "w") as summary_file:
+        summary_file.write(summary)
+    return prefix
+
+def run_profiled(func, name, args, kwargs):
+    """Runs one invocation under cProfile, tracemalloc and the stack sampler."""
+    started_tracemalloc = PROFILE_TRACEMALLOC and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+    sampler = StackSampler(threading.get_ident(), func.__code__, PROFILE_STACK_INTERVAL_SECONDS)
+    sampler.start()
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    profile.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.disable()
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        allocations, peak_bytes = [], None
+        if started_tracemalloc:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            tracemalloc.stop()
+            allocations = snapshot.statistics("lineno")
+        try:
+            summary = summarize_profile(profile, allocations, peak_bytes, elapsed, name)
+            prefix = write_profile_files(name, profile, sampler, summary)
+            print(f"PROFILE: {name} took {elapsed * 1000:.1f} ms; wrote {prefix}.pstats/.folded/.txt")
+            print(summary)
+        except Exception as e:
+            print(f"ERROR: Could not write profile for {name}: {e}")
+
+def profiled(func):
+    """
+    Decorator for Cloud Function entrypoints: profiles a PROFILE_SAMPLE_RATE fraction of
+    invocations. Returns `func` unchanged when profiling is disabled for it.
+    """
+    name = func.__name__
+    if PROFILE_SAMPLE_RATE <= 0 or (PROFILE_ENTRYPOINTS and name not in PROFILE_ENTRYPOINTS):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if random.random() >= PROFILE_SAMPLE_RATE or not profiling_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            return run_profiled(func, name, args, kwargs)
+        finally:
+            profiling_lock.release()
+    return wrapper
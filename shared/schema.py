@@ -0,0 +1,122 @@
+from shared.db import is_sqlite
+
+# --- Database Schema ---
+# DDL for the tables this repository reads and writes. Written once with type
+# placeholders so the same definitions create the Cloud SQL (PostgreSQL) tables
+# and the local SQLite stand-in.
+POSTGRES_TYPES = {"json": "JSONB", "timestamp": "TIMESTAMPTZ", "float": "DOUBLE PRECISION"}
+SQLITE_TYPES = {"json": "TEXT", "timestamp": "TEXT", "float": "REAL"}
+
+ENRICHED_FEEDBACK_DDL = """
+CREATE TABLE IF NOT EXISTS enriched_feedback (
+    message_id TEXT PRIMARY KEY,
+    source_platform TEXT,
+    timestamp_utc {timestamp},
+    text_content TEXT,
+    author_info {json},
+    original_url TEXT,
+    raw_metadata {json},
+    sentiment TEXT,
+    category TEXT,
+    detected_competitors {json},
+    auto_reply_text TEXT,
+    processing_timestamp_utc {timestamp},
+    processor_version TEXT,
+    updated_at {timestamp},
+    auto_reply_template TEXT
+)
+"""
+
+# Human-reviewed category labels; these override enriched_feedback.category for training.
+CATEGORY_CORRECTIONS_DDL = """
+CREATE TABLE IF NOT EXISTS feedback_category_corrections (
+    message_id TEXT PRIMARY KEY,
+    corrected_category TEXT NOT NULL,
+    corrected_at {timestamp}
+)
+"""
+
+# One row per external side effect (Jira issue, Basecamp to-do, email) so Pub/Sub
+# redeliveries don't repeat it; see shared/idempotency.py. Times are epoch seconds.
+INTEGRATION_SIDE_EFFECTS_DDL = """
+CREATE TABLE IF NOT EXISTS integration_side_effects (
+    integration TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    claim_token TEXT,
+    lease_expires_at {float},
+    result TEXT,
+    updated_at {float},
+    PRIMARY KEY (integration, message_id)
+)
+"""
+
+# Latest serialized state of each streaming consumer (e.g. spike_detector), so a restarted
+# instance resumes with its windows and baselines instead of starting cold.
+STREAM_CHECKPOINTS_DDL = """
+CREATE TABLE IF NOT EXISTS stream_checkpoints (
+    name TEXT PRIMARY KEY,
+    state {json},
+    updated_at {float}
+)
+"""
+
+ALL_DDL = [ENRICHED_FEEDBACK_DDL, CATEGORY_CORRECTIONS_DDL, INTEGRATION_SIDE_EFFECTS_DDL, STREAM_CHECKPOINTS_DDL]
+
+# Columns added after a table was first deployed: (table, column, type).
+ADDED_COLUMNS = [
+    ("enriched_feedback", "processor_version", "TEXT"),
+    ("enriched_feedback", "updated_at", "{timestamp}"), # See shared.db.row_updated_at
+    ("enriched_feedback", "auto_reply_template", "TEXT"), # "template id@version" of a template reply
+]
+
+# Run once, right after the column is added, so existing rows get a value.
+ADDED_COLUMN_BACKFILLS = {
+    ("enriched_feedback", "updated_at"): "UPDATE enriched_feedback SET updated_at = processing_timestamp_utc",
+}
+
+# (name, table, columns)
+INDEXES = [
+    # Lets the backfill find rows processed by older logic without a full scan.
+    ("enriched_feedback_processor_version_idx", "enriched_feedback", "processor_version"),
+    # Keyset pagination of the query API (newest feedback first).
+    ("enriched_feedback_timestamp_idx", "enriched_feedback", "timestamp_utc, message_id"),
+    # Change detection of the query API cache and incremental Parquet exports.
+    ("enriched_feedback_updated_idx", "enriched_feedback", "updated_at, message_id"),
+    # Purging old idempotency keys.
+    ("integration_side_effects_updated_idx", "integration_side_effects", "updated_at"),
+]
+
+def existing_columns(conn, table):
+    """Returns the column names of `table`."""
+    cursor = conn.cursor()
+    if is_sqlite(conn):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+    cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = %s", (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+def ensure_schema(conn):
+    """Creates any missing tables and columns (idempotent)."""
+    types = SQLITE_TYPES if is_sqlite(conn) else POSTGRES_TYPES
+    cursor = conn.cursor()
+    for ddl in ALL_DDL:
+        cursor.execute(ddl.format(**types))
+    for table, column, column_type in ADDED_COLUMNS:
+        if column not in existing_columns(conn, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type.format(**types)}")
+            if (table, column) in ADDED_COLUMN_BACKFILLS:
+                cursor.execute(ADDED_COLUMN_BACKFILLS[(table, column)])
+    for name, table, columns in INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    conn.commit()
+
+if __name__ == "__main__":
+    from shared.db import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        ensure_schema(conn)
+        print("Database schema is up to date.")
+    finally:
+        conn.close()
@@ -0,0 +1,255 @@
+"""
+Streaming spike detector over classified feedback.
+
+Consumes the 'classified-feedback-topics' Pub/Sub topic and counts every message per
+(category, source_platform, competitor) over several sliding windows (5, 15 and 60 minutes
+by default; see sliding_windows.py). When a window's count jumps well above the key's
+decayed baseline, e.g. a wave of "app crashes on upload" bug reports from TikTok, an alert
+event is published to SPIKE_ALERTS_TOPIC_NAME within seconds instead of surfacing on a
+dashboard hours later.
+
+The windows live in memory, so deploy with --max-instances=1. State is bounded by
+SPIKE_MAX_KEYS and checkpointed to the stream_checkpoints table every
+SPIKE_CHECKPOINT_SECONDS; a new instance restores it and keeps its baselines.
+
+Replay benchmark (from the repository root; no Pub/Sub or database needed):
+    python -m spike_detector.main --synthetic 500000
+    DB_SQLITE_PATH=local_pipeline.db python -m spike_detector.main --from-db
+"""
+import argparse
+import base64
+import datetime
+import functools
+import json
+import os
+import random
+import threading
+import time
+from shared.checkpoints import load_checkpoint, save_checkpoint
+from shared.clients import get_publisher, get_topic_path
+from shared.db import load_json
+from shared.profiling import profiled
+
+try:
+    from .sliding_windows import SpikeDetector
+except ImportError: # Deployed as a standalone Cloud Function source directory
+    from sliding_windows import SpikeDetector
+
+# --- Configuration ---
+# !!! IMPORTANT: REPLACE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID !!!
+PROJECT_ID = "zenithflow-feedback-automation"
+CLASSIFIED_FEEDBACK_TOPIC_NAME = "classified-feedback-topics" # Topic this function consumes from
+SPIKE_ALERTS_TOPIC_NAME = os.environ.get("SPIKE_ALERTS_TOPIC_NAME", "feedback-spike-alerts")
+SPIKE_ALERT_RECORD_TYPE = "feedback_spike_alert"
+
+SPIKE_BUCKET_SECONDS = int(os.environ.get("SPIKE_BUCKET_SECONDS", "60"))
+SPIKE_WINDOWS_SECONDS = [int(window) for window in os.environ.get("SPIKE_WINDOWS_SECONDS", "300,900,3600").split(",")]
+SPIKE_BASELINE_HALF_LIFE_SECONDS = float(os.environ.get("SPIKE_BASELINE_HALF_LIFE_SECONDS", "21600"))
+SPIKE_Z_THRESHOLD = float(os.environ.get("SPIKE_Z_THRESHOLD", "4.0"))
+SPIKE_MIN_RATIO = float(os.environ.get("SPIKE_MIN_RATIO", "3.0"))
+SPIKE_MIN_COUNT = int(os.environ.get("SPIKE_MIN_COUNT", "5"))
+SPIKE_MAX_KEYS = int(os.environ.get("SPIKE_MAX_KEYS", "5000"))
+SPIKE_CHECKPOINT_SECONDS = float(os.environ.get("SPIKE_CHECKPOINT_SECONDS", "60"))
+SPIKE_CHECKPOINT_NAME = os.environ.get("SPIKE_CHECKPOINT_NAME", "spike_detector")
+
+NO_COMPETITOR = "none"
+IGNORED_CATEGORIES = {"filtered"} # Spam dropped by the AI processor's pre-filter
+
+spike_alerts_topic_path = get_topic_path(PROJECT_ID, SPIKE_ALERTS_TOPIC_NAME)
+
+def new_detector():
+    return SpikeDetector(
+        bucket_seconds=SPIKE_BUCKET_SECONDS, windows_seconds=SPIKE_WINDOWS_SECONDS,
+        half_life_seconds=SPIKE_BASELINE_HALF_LIFE_SECONDS, z_threshold=SPIKE_Z_THRESHOLD,
+        min_ratio=SPIKE_MIN_RATIO, min_count=SPIKE_MIN_COUNT, max_keys=SPIKE_MAX_KEYS,
+    )
+
+# --- Checkpoints ---
+class DetectorState:
+    """The instance's detector plus checkpoint bookkeeping, guarded by one lock."""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.lock = threading.Lock()
+        self.last_checkpoint = time.monotonic()
+
+    def maybe_checkpoint(self):
+        """Saves the detector if SPIKE_CHECKPOINT_SECONDS have passed. Call with the lock held."""
+        if time.monotonic() - self.last_checkpoint < SPIKE_CHECKPOINT_SECONDS:
+            return
+        self.last_checkpoint = time.monotonic()
+        try:
+            save_checkpoint(SPIKE_CHECKPOINT_NAME, self.detector.to_checkpoint())
+        except Exception as e:
+            print(f"WARNING: Could not checkpoint spike detector state: {e}")
+
+@functools.lru_cache(maxsize=None)
+def get_detector_state():
+    """Detector for this instance, restored from the last checkpoint when there is one."""
+    detector = new_detector()
+    try:
+        checkpoint = load_checkpoint(SPIKE_CHECKPOINT_NAME)
+        if checkpoint is None:
+            print("No spike detector checkpoint found; starting with empty baselines.")
+        elif detector.restore_checkpoint(checkpoint):
+            print(f"Restored spike detector checkpoint with {len(detector.keys)} keys.")
+        else:
+            print("WARNING: Spike detector checkpoint was written with different windows; starting fresh.")
+    except Exception as e:
+        print(f"WARNING: Could not load spike detector checkpoint: {e}")
+    return DetectorState(detector)
+
+# --- Detection ---
+def event_timestamp(record):
+    """Event time of the feedback (epoch seconds); processing time if it has none."""
+    value = record.get("timestamp_utc")
+    if value:
+        try:
+            parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+            return parsed.timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+def event_keys(record):
+    """One (category, source_platform, competitor) key per detected competitor, or one with 'none'."""
+    category = record.get("category") or "unknown"
+    platform = record.get("source_platform") or "unknown"
+    competitors = record.get("detected_competitors") or [NO_COMPETITOR]
+    return [(category, platform, competitor) for competitor in dict.fromkeys(competitors)]
+
+def detect_spikes(detector, record):
+    """Counts one classified record; returns the alert events it triggered."""
+    if record.get("record_type") or record.get("category") in IGNORED_CATEGORIES:
+        return []
+    timestamp = event_timestamp(record)
+    alerts = []
+    for key in event_keys(record):
+        alerts.extend(detector.observe(key, timestamp, record.get("message_id")))
+    for alert in alerts:
+        alert["record_type"] = SPIKE_ALERT_RECORD_TYPE
+        alert["window_end_utc"] = datetime.datetime.fromtimestamp(
+            alert.pop("window_end_epoch"), datetime.timezone.utc).isoformat(timespec='seconds')
+        alert["detected_at_utc"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    return alerts
+
+@profiled
+def spike_detector_entrypoint(event, context):
+    """
+    Cloud Function entry point for the Spike Detector.
+    Triggered by new messages in the 'classified-feedback-topics' Pub/Sub topic.
+    """
+    if not event or not 'data' in event:
+        print("No data in Pub/Sub message. Exiting.")
+        return
+
+    try:
+        record = json.loads(base64.b64decode(event['data']).decode('utf-8'))
+        state = get_detector_state()
+        with state.lock:
+            alerts = detect_spikes(state.detector, record)
+            state.maybe_checkpoint()
+
+        for alert in alerts:
+            print(f"SPIKE ALERT: {alert['observed']} '{alert['category']}' messages from {alert['source_platform']} "
+                  f"(competitor: {alert['competitor']}) in {alert['window_seconds']}s, expected {alert['expected']} "
+                  f"(z={alert['z_score']}).")
+            get_publisher().publish(spike_alerts_topic_path, json.dumps(alert).encode('utf-8')).result()
+
+    except json.JSONDecodeError as e:
+        print(f"ERROR: Could not decode JSON from Pub/Sub message: {e}.")
+    except Exception as e:
+        print(f"ERROR: An unexpected error occurred in spike_detector: {e}")
+
+# --- Replay Benchmark ---
+SYNTHETIC_KEYS = [
+    # (category, source_platform, competitors, share of traffic)
+    ("general_feedback", "twitter", [], 0.30), ("general_feedback", "tiktok", [], 0.20),
+    ("feature_request", "twitter", [], 0.15), ("feature_request", "tiktok", [], 0.10),
+    ("bug_report", "twitter", [], 0.10), ("bug_report", "tiktok", [], 0.08),
+    ("negative_competitor_review", "twitter", ["asana"], 0.04),
+    ("negative_competitor_review", "tiktok", ["clickup", "trello"], 0.03),
+]
+CRASH_WAVE_KEY = ("bug_report", "tiktok", NO_COMPETITOR)
+
+def synthetic_classified_stream(count, hours, wave_start_hour, wave_minutes, wave_multiplier, seed=0):
+    """
+    Yields `count` encoded classified messages spread over `hours` of event time, plus a
+    crash wave: bug reports from TikTok at `wave_multiplier` times their usual rate.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc).timestamp()
+    step = hours * 3600 / count
+    wave_start = start + wave_start_hour * 3600
+    wave_end = wave_start + wave_minutes * 60
+    weights = [share for _, _, _, share in SYNTHETIC_KEYS]
+    for index in range(count):
+        timestamp = start + index * step
+        category, platform, competitors, _ = rng.choices(SYNTHETIC_KEYS, weights)[0]
+        if wave_start <= timestamp < wave_end and rng.random() < weights[5] * (wave_multiplier - 1):
+            category, platform, competitors = CRASH_WAVE_KEY[0], CRASH_WAVE_KEY[1], []
+        yield json.dumps({
+            "message_id": f"replay-{index}", "category": category, "source_platform": platform,
+            "detected_competitors": competitors, "sentiment": "negative",
+            "timestamp_utc": datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(timespec='seconds'),
+        }).encode('utf-8')
+
+def stored_classified_stream():
+    """Yields enriched_feedback rows from DB_SQLITE_PATH / Cloud SQL in event-time order."""
+    from shared.db import get_db_connection, stream_dicts
+
+    conn = get_db_connection()
+    try:
+        sql = ("SELECT message_id, source_platform, timestamp_utc, category, detected_competitors "
+               "FROM enriched_feedback ORDER BY timestamp_utc, message_id")
+        for rows in stream_dicts(conn, sql):
+            for row in rows:
+                row["detected_competitors"] = load_json(row["detected_competitors"], [])
+                yield json.dumps(row, default=str).encode('utf-8')
+    finally:
+        conn.close()
+
+def replay(messages):
+    """Feeds encoded messages through JSON decoding and detection; returns (detector, alerts, count, seconds)."""
+    detector = new_detector()
+    alerts = []
+    count = 0
+    started = time.perf_counter()
+    for data in messages:
+        alerts.extend(detect_spikes(detector, json.loads(data)))
+        count += 1
+    return detector, alerts, count, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay classified feedback through the spike detector.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Replay N generated messages with an injected crash wave.")
+    parser.add_argument("--hours", type=float, default=24.0, help="Event-time span of the generated messages.")
+    parser.add_argument("--wave-start-hour", type=float, default=20.0)
+    parser.add_argument("--wave-minutes", type=float, default=20.0)
+    parser.add_argument("--wave-multiplier", type=float, default=6.0)
+    parser.add_argument("--from-db", action="store_true", help="Replay enriched_feedback from the database instead.")
+    args = parser.parse_args()
+
+    if args.from_db:
+        messages = list(stored_classified_stream())
+    else:
+        messages = list(synthetic_classified_stream(args.synthetic or 200000, args.hours, args.wave_start_hour,
+                                                    args.wave_minutes, args.wave_multiplier))
+    # Messages are encoded up front so the timing covers decoding and detection only.
+    detector, alerts, count, seconds = replay(messages)
+    print(f"Replayed {count} messages in {seconds:.2f}s: {count / max(seconds, 1e-9):,.0f} msg/s on one thread.")
+    print(f"Keys: {len(detector.keys)}, late events dropped: {detector.late_dropped}, evicted keys: {detector.evicted}")
+    for alert in alerts:
+        print(f"  ALERT {alert['window_end_utc']} {alert['category']}/{alert['source_platform']}/{alert['competitor']} "
+              f"window {alert['window_seconds']}s: {alert['observed']} vs {alert['expected']} expected (z={alert['z_score']})")
+
+    started = time.perf_counter()
+    checkpoint = json.dumps(detector.to_checkpoint())
+    restored = new_detector()
+    restored.restore_checkpoint(json.loads(checkpoint))
+    round_trip_ok = all(restored.keys[key].sums == state.sums and restored.keys[key].baseline == state.baseline
+                        for key, state in detector.keys.items())
+    print(f"Checkpoint: {len(checkpoint) / 1024:.1f} KiB, save+restore {(time.perf_counter() - started) * 1000:.1f} ms, "
+          f"round trip {'ok' if round_trip_ok else 'MISMATCH'}")
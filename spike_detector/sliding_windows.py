@@ -0,0 +1,168 @@
+import collections
+import math
+
+# --- Sliding-Window Counters ---
+# Each key (category, source_platform, competitor) owns one ring of fixed-width time
+# buckets, long enough for the largest window. Every window keeps a running sum, so an
+# event is one bucket increment plus one addition per window, and moving the ring forward
+# subtracts only the buckets that fall out of each window. Closed buckets feed a decayed
+# (exponentially weighted) baseline of the key's normal per-bucket rate.
+CHECKPOINT_VERSION = 1
+
+class KeyWindows:
+    """Ring-buffer counts, window sums and baseline for one key."""
+    __slots__ = ("head", "buckets", "sums", "baseline", "closed_buckets", "last_alert", "recent_ids")
+
+    def __init__(self, bucket_count, window_count, head):
+        self.head = head # Absolute index of the newest bucket (event time // bucket width)
+        self.buckets = [0] * bucket_count
+        self.sums = [0] * window_count
+        self.baseline = 0.0 # Expected events per bucket
+        self.closed_buckets = 0
+        self.last_alert = [None] * window_count # Bucket index of each window's last alert
+        self.recent_ids = collections.deque(maxlen=5)
+
+class SpikeDetector:
+    """
+    Counts events per key over several sliding windows and reports spikes.
+
+    A window is spiking when its count is at least `min_count`, at least `min_ratio` times
+    the baseline expectation, and `z_threshold` standard deviations above it (Poisson:
+    z = (observed - expected) / sqrt(expected + 1)). The key also has to have been seen
+    for `warmup_buckets` closed buckets. After an alert a window stays quiet for its own
+    length. At most `max_keys` keys are kept; the least recently updated one is evicted.
+    """
+
+    def __init__(self, bucket_seconds=60, windows_seconds=(300, 900, 3600), half_life_seconds=21600,
+                 z_threshold=4.0, min_ratio=3.0, min_count=5, max_keys=5000, warmup_buckets=None):
+        if any(window % bucket_seconds for window in windows_seconds):
+            raise ValueError("Every window must be a whole number of buckets.")
+        self.bucket_seconds = bucket_seconds
+        self.windows_seconds = sorted(windows_seconds)
+        self.window_buckets = [window // bucket_seconds for window in self.windows_seconds]
+        self.bucket_count = max(self.window_buckets)
+        self.half_life_seconds = half_life_seconds
+        # Per-bucket EWMA weight; until 1/alpha buckets have closed a plain mean is used,
+        # so a new key's baseline isn't dragged toward zero by the empty start value.
+        self.alpha = 1.0 - math.exp(-math.log(2) * bucket_seconds / half_life_seconds)
+        self.z_threshold = z_threshold
+        self.min_ratio = min_ratio
+        self.min_count = min_count
+        self.max_keys = max_keys
+        self.warmup_buckets = self.bucket_count if warmup_buckets is None else warmup_buckets
+        self.keys = collections.OrderedDict() # key -> KeyWindows, least recently updated first
+        self.events = 0
+        self.late_dropped = 0
+        self.evicted = 0
+
+    def config(self):
+        return {"bucket_seconds": self.bucket_seconds, "windows_seconds": self.windows_seconds,
+                "half_life_seconds": self.half_life_seconds}
+
+    def close_buckets(self, state, new_head):
+        """Moves `state` forward to bucket `new_head`: updates window sums and the baseline."""
+        steps = new_head - state.head
+        buckets = state.buckets
+        size = self.bucket_count
+        head_count = buckets[state.head % size]
+        # Buckets past a full ring are all empty: only the last `size` steps touch memory.
+        for absolute in range(max(state.head + 1, new_head - size + 1), new_head + 1):
+            for index, length in enumerate(self.window_buckets):
+                state.sums[index] -= buckets[(absolute - length) % size]
+            buckets[absolute % size] = 0
+        if steps > size:
+            state.sums = [0] * len(state.sums)
+
+        # The old head bucket closed with its count; the other steps - 1 closed empty.
+        self.update_baseline(state, head_count)
+        empty = steps - 1
+        if empty > 0:
+            mean_steps = min(empty, max(0, math.ceil(1 / self.alpha) - state.closed_buckets))
+            if mean_steps:
+                state.baseline *= state.closed_buckets / (state.closed_buckets + mean_steps)
+                state.closed_buckets += mean_steps
+            remaining = empty - mean_steps
+            if remaining:
+                state.baseline *= (1.0 - self.alpha) ** remaining
+                state.closed_buckets += remaining
+        state.head = new_head
+
+    def update_baseline(self, state, count):
+        state.closed_buckets += 1
+        weight = max(self.alpha, 1.0 / state.closed_buckets)
+        state.baseline += weight * (count - state.baseline)
+
+    def observe(self, key, timestamp, message_id=None):
+        """Counts one event for `key` at `timestamp` (epoch seconds). Returns a list of alert dicts."""
+        self.events += 1
+        bucket = int(timestamp // self.bucket_seconds)
+        state = self.keys.get(key)
+        if state is None:
+            state = KeyWindows(self.bucket_count, len(self.window_buckets), bucket)
+            self.keys[key] = state
+            if len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.keys.move_to_end(key)
+        if bucket > state.head:
+            self.close_buckets(state, bucket)
+        age = state.head - bucket
+        if age >= self.bucket_count:
+            self.late_dropped += 1
+            return []
+        state.buckets[bucket % self.bucket_count] += 1
+        if message_id is not None:
+            state.recent_ids.append(message_id)
+
+        alerts = []
+        for index, length in enumerate(self.window_buckets):
+            if age >= length:
+                continue # Late event that is already outside this window
+            state.sums[index] += 1
+            observed = state.sums[index]
+            if observed < self.min_count or state.closed_buckets < self.warmup_buckets:
+                continue
+            last_alert = state.last_alert[index]
+            if last_alert is not None and state.head - last_alert < length:
+                continue
+            expected = state.baseline * length
+            z_score = (observed - expected) / math.sqrt(expected + 1.0)
+            if z_score >= self.z_threshold and observed >= self.min_ratio * expected:
+                state.last_alert[index] = state.head
+                alerts.append({
+                    "category": key[0], "source_platform": key[1], "competitor": key[2],
+                    "window_seconds": self.windows_seconds[index],
+                    "window_end_epoch": (state.head + 1) * self.bucket_seconds,
+                    "observed": observed, "expected": round(expected, 2),
+                    "z_score": round(z_score, 2),
+                    "sample_message_ids": list(state.recent_ids),
+                })
+        return alerts
+
+    # --- Checkpointing ---
+    def to_checkpoint(self):
+        """JSON-serializable snapshot of every key's ring, sums and baseline."""
+        return {
+            "version": CHECKPOINT_VERSION,
+            "config": self.config(),
+            "keys": [[list(key), state.head, state.buckets, state.sums, state.baseline,
+                      state.closed_buckets, state.last_alert, list(state.recent_ids)]
+                     for key, state in self.keys.items()],
+        }
+
+    def restore_checkpoint(self, checkpoint):
+        """Loads a snapshot from to_checkpoint(). Returns False (and keeps nothing) if the windows changed."""
+        if not checkpoint or checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("config") != self.config():
+            return False
+        self.keys.clear()
+        for key, head, buckets, sums, baseline, closed_buckets, last_alert, recent_ids in checkpoint["keys"][-self.max_keys:]:
+            state = KeyWindows(self.bucket_count, len(self.window_buckets), head)
+            state.buckets = buckets
+            state.sums = sums
+            state.baseline = baseline
+            state.closed_buckets = closed_buckets
+            state.last_alert = last_alert
+            state.recent_ids.extend(recent_ids)
+            self.keys[tuple(key)] = state
+        return True
@@ -0,0 +1,65 @@
+import base64
+import concurrent.futures
+import json
+
+import pytest
+
+from shared.clients import set_publisher_override
+
+class RecordingPublisher:
+    """Captures publish() calls by topic name, like local_pipeline_runner.InProcessPublisher."""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, data, **attributes):
+        self.messages.append((topic.rsplit("/", 1)[-1], json.loads(data)))
+        future = concurrent.futures.Future()
+        future.set_result(str(len(self.messages)))
+        return future
+
+    def on(self, topic_name):
+        return [message for topic, message in self.messages if topic == topic_name]
+
+@pytest.fixture
+def recording_publisher():
+    publisher = RecordingPublisher()
+    set_publisher_override(publisher)
+    yield publisher
+    set_publisher_override(None)
+
+def pubsub_event(payload):
+    """A background-function Pub/Sub event carrying `payload` as JSON."""
+    return {"data": base64.b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")}
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """Points shared.db and data_storage_listener at a fresh SQLite stand-in with the schema."""
+    import shared.db
+    from data_storage_listener import main as data_storage_listener
+    from shared.schema import ensure_schema
+
+    path = str(tmp_path / "feedback.sqlite")
+    monkeypatch.setattr(shared.db, "DB_SQLITE_PATH", path)
+    monkeypatch.setattr(data_storage_listener, "DB_SQLITE_PATH", path)
+    conn = shared.db.get_db_connection()
+    ensure_schema(conn)
+    conn.close()
+    yield path
+    data_storage_listener.discard_reusable_db_connection()
+
+def store(record):
+    """Delivers one classified record or reply patch to data_storage_listener."""
+    from data_storage_listener.main import data_storage_listener_entrypoint
+
+    data_storage_listener_entrypoint(pubsub_event(record), None)
+
+def enriched_record(message_id, processing_timestamp_utc="2026-10-01T12:00:00Z", **fields):
+    record = {
+        "message_id": message_id, "source_platform": "twitter", "timestamp_utc": "2026-10-01T11:59:00Z",
+        "text_content": f"feedback {message_id}", "author_info": {"username": "dana"}, "original_url": None,
+        "raw_metadata": {}, "sentiment": "positive", "category": "general_feedback", "detected_competitors": [],
+        "auto_reply_text": None, "processing_timestamp_utc": processing_timestamp_utc, "processor_version": "2.0.0",
+    }
+    record.update(fields)
+    return record
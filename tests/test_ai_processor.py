@@ -0,0 +1,66 @@
+import pytest
+
+from central_ai_processor import main as ai_processor
+from central_ai_processor import near_duplicate_index
+from central_ai_processor.near_duplicate_index import NearDuplicateIndex
+from central_ai_processor.text_preprocessing import preprocess_feedback_text
+
+from conftest import pubsub_event
+
+CLASSIFIED = ai_processor.CLASSIFIED_FEEDBACK_TOPIC_NAME
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(ai_processor, "AI_BACKEND", "local")
+    index = NearDuplicateIndex()
+    monkeypatch.setattr(near_duplicate_index, "_index", index)
+    return index
+
+def feedback(message_id, text, username="dana"):
+    return {"message_id": message_id, "source_platform": "twitter", "timestamp_utc": "2026-10-01T12:00:00Z",
+            "text_content": text, "author_info": {"username": username}, "original_url": None, "raw_metadata": {}}
+
+def test_near_duplicate_index_holds_enrichment_without_reply(index, recording_publisher):
+    text = "The calendar sync keeps failing for our whole design team since Monday"
+    ai_processor.ai_processor_entrypoint(pubsub_event(feedback("m1", text)), None)
+
+    enrichment, _ = index.find(preprocess_feedback_text(text)["normalized_text"])
+    assert enrichment["message_id"] == "m1"
+    assert "auto_reply_text" not in enrichment
+
+def test_near_duplicate_from_older_snapshot_is_reused(index, recording_publisher):
+    text = "FlowHub is wonderful, our remote design team loves the new boards"
+    # Snapshot entries written before category_confidence existed, with the old reply field.
+    index.add(preprocess_feedback_text(text)["normalized_text"], {
+        "message_id": "old", "sentiment": "positive", "category": "general_feedback",
+        "detected_competitors": [], "auto_reply_text": None,
+    })
+    ai_processor.ai_processor_entrypoint(pubsub_event(feedback("m2", text + "!")), None)
+
+    [enriched] = recording_publisher.on(CLASSIFIED)
+    assert enriched["enrichment_reused_from"] == "old"
+    assert enriched["category_confidence"] is None
+    assert enriched["sentiment"] == "positive"
+    # The reply is still produced for this message: a template or a reply-lane request.
+    assert enriched["auto_reply_text"] or enriched["auto_reply_pending"]
+
+def test_negated_repost_does_not_reuse_enrichment(index, recording_publisher):
+    crashing = "FlowHub mobile app is crashing on iOS 17.5 when I try to upload files"
+    fixed = "FlowHub mobile app is not crashing on iOS 17.5 anymore when I try to upload files"
+    ai_processor.ai_processor_entrypoint(pubsub_event(feedback("m1", crashing)), None)
+    ai_processor.ai_processor_entrypoint(pubsub_event(feedback("m2", fixed)), None)
+
+    assert index.find(preprocess_feedback_text(fixed)["normalized_text"])[0]["message_id"] == "m2"
+    first, second = recording_publisher.on(CLASSIFIED)
+    assert first.get("enrichment_reused_from") is None
+    assert second.get("enrichment_reused_from") is None
+
+def test_near_duplicate_threshold_is_tight():
+    crashing = preprocess_feedback_text("FlowHub mobile app is crashing on iOS 17.5 when I try to upload files")
+    fixed = preprocess_feedback_text("FlowHub mobile app is not crashing on iOS 17.5 anymore when I try to upload files")
+    assert near_duplicate_index.NEAR_DUP_MAX_HAMMING <= 3
+    # Even at a looser threshold, the differing negation tokens refuse the match.
+    loose = NearDuplicateIndex(max_hamming=7)
+    loose.add(crashing["normalized_text"], {"message_id": "m1"})
+    assert loose.find(fixed["normalized_text"]) == (None, None)
+    assert loose.find(crashing["normalized_text"])[0]["message_id"] == "m1"
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from central_ai_processor import backfill
+from central_ai_processor import main as ai_processor
+from shared.db import get_db_connection, stream_dicts
+
+from conftest import enriched_record, store
+
+ROWS = {
+    "m1": "The app crashes every time I upload a file to the board",
+    "m2": "Loving the new timeline view, it saved our sprint planning",
+    "m3": "Please add a feature to export boards as PDF files",
+    "m4": "lol ok",
+    "m5": "Our team switched from Trello and the calendar sync is great",
+}
+
+@pytest.fixture
+def stale_rows(sqlite_db, monkeypatch):
+    monkeypatch.setattr(ai_processor, "AI_BACKEND", "local")
+    for message_id, text in ROWS.items():
+        store(enriched_record(message_id, text_content=text, processor_version="1.0.0",
+                              auto_reply_text="Thanks from the template!", auto_reply_template="praise_general"))
+    return sqlite_db
+
+def run(tmp_path, *extra_args):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    assert backfill.main(["--workers", "2", "--chunk-size", "2", "--checkpoint", checkpoint, *extra_args]) == 0
+    with open(checkpoint) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+def stored_rows():
+    conn = get_db_connection()
+    try:
+        sql = "SELECT * FROM enriched_feedback ORDER BY message_id"
+        return {row["message_id"]: row for rows in stream_dicts(conn, sql) for row in rows}
+    finally:
+        conn.close()
+
+def test_backfill_re_enriches_stale_rows_through_the_process_pool(stale_rows, tmp_path):
+    checkpoint = run(tmp_path)
+
+    rows = stored_rows()
+    assert {row["processor_version"] for row in rows.values()} == {ai_processor.PROCESSOR_VERSION}
+    assert rows["m1"]["category"] == "bug_report"
+    assert rows["m3"]["category"] == "feature_request"
+    assert json.loads(rows["m5"]["detected_competitors"]) == ["trello"]
+    assert rows["m4"]["category"] == ai_processor.FILTERED_CATEGORY
+    assert rows["m4"]["auto_reply_text"] is None and rows["m4"]["auto_reply_template"] is None
+    # Without --refresh-replies the stored reply and its template are kept together.
+    assert rows["m2"]["auto_reply_text"] == "Thanks from the template!"
+    assert rows["m2"]["auto_reply_template"] == "praise_general"
+    assert checkpoint["last_message_id"] == "m5" and checkpoint["rows_done"] == len(ROWS)
+
+def test_refresh_replies_clears_the_template_with_the_text(stale_rows, tmp_path):
+    run(tmp_path, "--refresh-replies")
+
+    rows = stored_rows()
+    assert rows["m2"]["auto_reply_text"] == ai_processor.FALLBACK_REPLY_TEXT
+    assert rows["m2"]["auto_reply_template"] is None
+    assert rows["m1"]["auto_reply_text"] is None and rows["m1"]["auto_reply_template"] is None
+
+def test_backfill_skips_rows_already_at_the_current_version(stale_rows, tmp_path):
+    run(tmp_path)
+    store(enriched_record("m6", text_content="The editor freezes when I paste a table", category="general_feedback"))
+    second_checkpoint = tmp_path / "second.json"
+    assert backfill.main(["--workers", "1", "--checkpoint", str(second_checkpoint)]) == 0
+
+    assert not second_checkpoint.exists() # No stale rows, so no chunk was committed
+    assert stored_rows()["m6"]["category"] == "general_feedback"
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from tools.function_registry import FUNCTION_ENTRYPOINTS
+from tools.generate_requirements import build_requirements, main as generate_requirements_main, read_lock_file
+from tools.profile_imports import profile_function_imports
+
+# Cold-import budget per function (see README "Build Tooling"); override on slow CI machines.
+COLD_IMPORT_BUDGET_MS = float(os.environ.get("COLD_IMPORT_BUDGET_MS", "1500"))
+
+@pytest.mark.parametrize("function_dir", sorted(FUNCTION_ENTRYPOINTS))
+def test_cold_import_within_budget(function_dir):
+    total_ms, breakdown, error_text = profile_function_imports(function_dir)
+    assert error_text is None, f"{function_dir}/main.py failed to import:\n{error_text}"
+    slowest = ", ".join(f"{name} {cumulative:.0f} ms" for cumulative, _, name in breakdown[:5])
+    assert total_ms <= COLD_IMPORT_BUDGET_MS, f"{function_dir} cold import took {total_ms:.0f} ms ({slowest})"
+
+def test_generated_requirements_are_up_to_date():
+    assert generate_requirements_main(["--check"]) == 0
+
+def test_generated_requirements_list_only_direct_dependencies():
+    # pg8000 pulls in scramp/asn1crypto/python-dateutil when installed; they must not leak in.
+    content = build_requirements("jira_integration", read_lock_file())
+    assert content.splitlines()[1:] == ["pg8000==1.31.2", "requests==2.32.4"]
+
+def test_connector_scheduler_requirements_include_the_connectors_it_loads():
+    # shared/connectors.py imports the connectors with importlib; their dependencies must be listed.
+    content = build_requirements("connector_scheduler", read_lock_file())
+    for connector_dir in ("twitter_connector", "tiktok_connector"):
+        for line in build_requirements(connector_dir, read_lock_file()).splitlines()[1:]:
+            assert line in content.splitlines()
+    assert "pg8000==1.31.2" in content.splitlines() and "requests==2.32.4" in content.splitlines()
@@ -0,0 +1,92 @@
+import numpy as np
+
+from central_ai_processor import main as ai_processor
+from central_ai_processor import train_category_classifier
+from central_ai_processor.category_classifier import CategoryClassifier, hash_features
+from shared.db import get_db_connection
+
+from conftest import enriched_record, store
+
+TRAINING_SET = [
+    ("the app crashes when I upload a file", "bug_report"),
+    ("sync keeps failing with an error on login", "bug_report"),
+    ("boards freeze and crash after the update", "bug_report"),
+    ("please add a dark mode for the boards", "feature_request"),
+    ("it would be great to have gantt charts", "feature_request"),
+    ("can you add export to csv for reports", "feature_request"),
+    ("thanks for the quick onboarding call", "general_feedback"),
+    ("our team moved to flowhub last month", "general_feedback"),
+    ("the new pricing page looks clean", "general_feedback"),
+]
+
+def trained_classifier(hash_bits=12):
+    model = CategoryClassifier.empty(hash_bits=hash_bits)
+    texts, labels = zip(*TRAINING_SET)
+    for _ in range(30):
+        model.partial_fit(list(texts), list(labels), learning_rate=0.5)
+    return model
+
+def test_hash_features_are_stable_and_normalized():
+    indices, values = hash_features("The app crashes on upload", hash_bits=12)
+    again_indices, again_values = hash_features("the APP crashes on upload", hash_bits=12)
+    assert indices.tolist() == again_indices.tolist()
+    assert np.allclose(values, again_values)
+    assert indices.max() < 1 << 12
+    assert np.isclose(np.linalg.norm(values), 1.0)
+
+def test_saved_model_predicts_the_same_after_load(tmp_path):
+    model = trained_classifier()
+    path = str(tmp_path / "category_model.npz")
+    model.save(path)
+    loaded = CategoryClassifier.load(path)
+
+    texts = ["the editor crashes on save", "please add gantt charts", "thanks to the support team"]
+    assert [category for category, _ in loaded.predict_batch(texts)] == \
+        ["bug_report", "feature_request", "general_feedback"]
+    # Weights are stored as float16, so probabilities match to that precision.
+    assert np.allclose(loaded.predict_proba_batch(texts), model.predict_proba_batch(texts), atol=1e-2)
+    assert loaded.labels == model.labels and loaded.hash_bits == model.hash_bits
+
+def test_keyword_rules_are_used_when_no_model_is_deployed(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_processor, "CATEGORY_MODEL_PATH", str(tmp_path / "missing.npz"))
+    ai_processor.get_category_classifier.cache_clear()
+    try:
+        assert ai_processor.get_category_classifier() is None
+        assert ai_processor.classify_category("The app keeps crashing") == ("bug_report", None)
+        assert ai_processor.classify_category("Feature idea: recurring tasks") == ("feature_request", None)
+        assert ai_processor.classify_category("Nice work") == ("general_feedback", None)
+    finally:
+        ai_processor.get_category_classifier.cache_clear()
+
+def test_deployed_model_replaces_keyword_rules(tmp_path, monkeypatch):
+    path = str(tmp_path / "category_model.npz")
+    trained_classifier().save(path)
+    monkeypatch.setattr(ai_processor, "CATEGORY_MODEL_PATH", path)
+    ai_processor.get_category_classifier.cache_clear()
+    try:
+        category, confidence = ai_processor.classify_category("please add a gantt chart view")
+        assert category == "feature_request" and 0 < confidence <= 1
+    finally:
+        ai_processor.get_category_classifier.cache_clear()
+
+def test_training_uses_human_corrections_unless_machine_labels_are_requested(sqlite_db):
+    store(enriched_record("machine", text_content="The app crashes on upload", category="bug_report"))
+    store(enriched_record("corrected", text_content="Add a wish list", category="feature_request"))
+    conn = get_db_connection()
+    try:
+        conn.cursor().execute(
+            "INSERT INTO feedback_category_corrections (message_id, corrected_category) VALUES (?, ?)",
+            ("corrected", "general_feedback"))
+        conn.commit()
+
+        default_rows = list(train_category_classifier.stream_labeled_rows(conn, fetch_size=10))
+        all_rows = list(train_category_classifier.stream_labeled_rows(conn, fetch_size=10,
+                                                                      include_machine_labels=True))
+    finally:
+        conn.close()
+
+    correction_weight = train_category_classifier.CORRECTION_SAMPLE_WEIGHT
+    assert [(message_id, label, weight) for message_id, _, label, weight in default_rows] == \
+        [("corrected", "general_feedback", correction_weight)]
+    assert sorted((message_id, label, weight) for message_id, _, label, weight in all_rows) == \
+        [("corrected", "general_feedback", correction_weight), ("machine", "bug_report", 1.0)]
@@ -0,0 +1,59 @@
+import json
+import threading
+import types
+
+import pytest
+
+from connector_scheduler.main import RAW_FEEDBACK_TOPIC_NAME, connector_scheduler_entrypoint
+from shared import connectors
+
+def normalize(raw_item):
+    return {"message_id": raw_item, "source_platform": "test", "text_content": f"feedback {raw_item}"}
+
+@pytest.fixture
+def release_stuck_fetch(monkeypatch):
+    # The stuck connector's thread cannot be killed; releasing it at teardown lets it finish.
+    monkeypatch.setattr(connectors, "CONNECTOR_TIMEOUT_GRACE_SECONDS", 0.1)
+    release = threading.Event()
+    yield release
+    release.set()
+
+@pytest.fixture
+def test_connectors(monkeypatch, release_stuck_fetch):
+    def healthy():
+        yield from ["h1", "h2", "h3"]
+
+    def failing():
+        yield "f1"
+        raise ConnectionError("API returned 503")
+
+    def stuck():
+        release_stuck_fetch.wait(10)
+        yield "s1"
+
+    registered = {
+        "healthy": dict(name="healthy", fetch=healthy, normalize=normalize, timeout_seconds=5),
+        "failing": dict(name="failing", fetch=failing, normalize=normalize, timeout_seconds=5),
+        "stuck": dict(name="stuck", fetch=stuck, normalize=normalize, timeout_seconds=0.2),
+    }
+    for name, connector in registered.items():
+        monkeypatch.setitem(connectors.CONNECTORS, name, connector)
+    return registered
+
+def test_slow_and_failing_connectors_do_not_block_the_others(test_connectors, recording_publisher):
+    request = types.SimpleNamespace(args={"connectors": "stuck,failing,healthy"})
+    body, status = connector_scheduler_entrypoint(request)
+
+    summaries = {summary["connector"]: summary for summary in json.loads(body)["connectors"]}
+    assert status == 200
+    assert summaries["healthy"]["status"] == "ok" and summaries["healthy"]["published"] == 3
+    # Items fetched before the failure are still published.
+    assert summaries["failing"]["status"] == "error" and summaries["failing"]["published"] == 1
+    assert "503" in summaries["failing"]["error"]
+    assert summaries["stuck"]["status"] == "timeout" and summaries["stuck"]["published"] == 0
+    assert sorted(message["message_id"] for message in recording_publisher.on(RAW_FEEDBACK_TOPIC_NAME)) == \
+        ["f1", "h1", "h2", "h3"]
+
+def test_scheduler_reports_failure_only_when_every_connector_failed(test_connectors, recording_publisher):
+    _, status = connector_scheduler_entrypoint(types.SimpleNamespace(args={"connectors": "failing,missing"}))
+    assert status == 500
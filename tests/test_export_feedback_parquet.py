@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from shared.db import get_db_connection
+from tools.export_feedback_parquet import WATERMARK_FILE, export
+
+from conftest import enriched_record, store
+
+def run_export(output_dir, settle_seconds=0):
+    conn = get_db_connection()
+    try:
+        export(conn, output_dir, False, False, 100, 1000, 10000, 8, settle_seconds=settle_seconds)
+    finally:
+        conn.close()
+    return pq.read_table(output_dir).to_pylist()
+
+def latest_rows(rows):
+    latest = {}
+    for row in sorted(rows, key=lambda row: row["updated_at"]):
+        latest[row["message_id"]] = row
+    return latest
+
+def test_late_rows_and_reply_patches_are_exported(sqlite_db, tmp_path):
+    output_dir = str(tmp_path / "export")
+    store(enriched_record("m1", "2026-10-01T12:05:00Z"))
+    assert [row["message_id"] for row in run_export(output_dir)] == ["m1"]
+
+    # Committed after the first export, but processed (timestamped) before m1.
+    store(enriched_record("m0-late", "2026-10-01T12:00:00Z"))
+    # The reply lane's patch does not change processing_timestamp_utc.
+    store({"record_type": "auto_reply_patch", "message_id": "m1", "auto_reply_text": "Thanks, dana!"})
+
+    latest = latest_rows(run_export(output_dir))
+    assert set(latest) == {"m0-late", "m1"}
+    assert latest["m1"]["auto_reply_text"] == "Thanks, dana!"
+
+def test_unsettled_rows_wait_for_the_next_run(sqlite_db, tmp_path):
+    output_dir = str(tmp_path / "export")
+    store(enriched_record("m1"))
+    conn = get_db_connection()
+    try:
+        assert export(conn, output_dir, False, False, 100, 1000, 10000, 8, settle_seconds=60) == 0
+    finally:
+        conn.close()
+    assert not os.path.exists(os.path.join(output_dir, WATERMARK_FILE))
+    assert [row["message_id"] for row in run_export(output_dir)] == ["m1"]
+
+def test_watermark_from_before_updated_at_carries_over(sqlite_db, tmp_path):
+    output_dir = str(tmp_path / "export")
+    os.makedirs(output_dir)
+    with open(os.path.join(output_dir, WATERMARK_FILE), "w") as watermark_file:
+        json.dump({"processing_timestamp_utc": "2000-01-01T00:00:00Z", "message_id": "", "rows_in_last_export": 0},
+                  watermark_file)
+    store(enriched_record("m1"))
+    assert [row["message_id"] for row in run_export(output_dir)] == ["m1"]
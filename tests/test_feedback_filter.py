@@ -0,0 +1,54 @@
+import pytest
+
+from central_ai_processor.feedback_filter import DEFAULT_FILTER_POLICY, score_feedback, should_filter_feedback
+
+POLICY = dict(DEFAULT_FILTER_POLICY, mode="enforce", bot_authors=set())
+
+def signals_for(text):
+    return score_feedback({"source_platform": "email", "author_info": {}}, text, POLICY)[1]
+
+@pytest.mark.parametrize("text", [
+    "Приложение отлично работает, спасибо команде",
+    "这个应用太好用了",
+    "アプリがとても使いやすいです",
+    "Très réussi, génial pour l'équipe",
+    "Η εφαρμογή είναι εξαιρετική",
+])
+def test_non_english_feedback_has_informative_tokens(text):
+    assert "too_few_informative_tokens" not in signals_for(text)
+
+@pytest.mark.parametrize("text", ["lol ok", "wow", "好", "!!!"])
+def test_low_content_feedback_is_still_flagged(text):
+    assert "too_few_informative_tokens" in signals_for(text)
+
+def test_english_feedback_passes():
+    assert signals_for("The calendar sync keeps failing for our team") == []
+
+def twitter_feedback(text, **author_info):
+    return {"source_platform": "twitter", "text_content": text, "author_info": author_info}
+
+def test_rate_limited_author_alone_is_not_filtered():
+    policy = dict(POLICY, author_rate_limit=1)
+    text = "Board export fails again after the update, still broken"
+    should_filter_feedback(twitter_feedback(text, username="busy_reporter"), text, policy)
+    filtered, signals = should_filter_feedback(twitter_feedback(text, username="busy_reporter"), text, policy)
+    assert signals == ["author_rate_limited"]
+    assert not filtered
+
+def test_rate_limited_author_with_a_second_signal_is_filtered():
+    policy = dict(POLICY, author_rate_limit=1)
+    text = "Great tool, check out my channel for tutorials"
+    should_filter_feedback(twitter_feedback(text, username="promo_poster"), text, policy)
+    filtered, signals = should_filter_feedback(twitter_feedback(text, username="promo_poster"), text, policy)
+    assert set(signals) == {"spam_phrase", "author_rate_limited"}
+    assert filtered
+
+def test_numeric_author_id_is_not_a_bot_like_name():
+    text = "The calendar sync keeps failing for our team"
+    _, signals = score_feedback(twitter_feedback(text, id="1780000000123456789"), text, POLICY)
+    assert "bot_like_author_name" not in signals
+
+def test_bot_like_username_is_flagged():
+    text = "The calendar sync keeps failing for our team"
+    _, signals = score_feedback(twitter_feedback(text, username="deals_bot"), text, POLICY)
+    assert "bot_like_author_name" in signals
@@ -0,0 +1,43 @@
+import pytest
+
+from feedback_query_api import main as query_api
+
+from conftest import enriched_record, store
+
+@pytest.fixture
+def api(sqlite_db, monkeypatch):
+    monkeypatch.setattr(query_api, "QUERY_CHANGE_POLL_SECONDS", 0)
+    for factory in (query_api.get_connection_pool, query_api.get_response_cache, query_api.get_change_feed):
+        factory.cache_clear()
+    yield lambda path, **args: query_api.handle_request("GET", path, args)
+    query_api.get_connection_pool().close()
+
+def test_reclassified_row_leaves_cached_listing_and_aggregate(api):
+    store(enriched_record("m1", category="bug_report", sentiment="negative"))
+    status, body, _ = api("/feedback", category="bug_report")
+    assert [item["message_id"] for item in body["items"]] == ["m1"]
+    assert api("/aggregates", group_by="sentiment", category="bug_report")[1]["total"] == 1
+    assert api("/feedback", category="bug_report")[2] == {"X-Cache": "HIT"}
+
+    # Re-enriched into another category: its new values match neither cached response.
+    store(enriched_record("m1", "2026-10-02T08:00:00Z", category="general_feedback", sentiment="positive"))
+
+    status, body, headers = api("/feedback", category="bug_report")
+    assert headers == {"X-Cache": "MISS"}
+    assert body["items"] == []
+    assert api("/aggregates", group_by="sentiment", category="bug_report")[1]["total"] == 0
+
+def test_reply_patch_invalidates_cached_item(api):
+    store(enriched_record("m1"))
+    assert api("/feedback/m1")[1]["auto_reply_text"] is None
+    store({"record_type": "auto_reply_patch", "message_id": "m1", "auto_reply_text": "Thanks, dana!"})
+
+    status, body, headers = api("/feedback/m1")
+    assert headers == {"X-Cache": "MISS"}
+    assert body["auto_reply_text"] == "Thanks, dana!"
+
+def test_unrelated_change_keeps_cached_listing(api):
+    store(enriched_record("m1", category="bug_report"))
+    api("/feedback", category="bug_report")
+    store(enriched_record("m2", category="feature_request"))
+    assert api("/feedback", category="bug_report")[2] == {"X-Cache": "HIT"}
@@ -0,0 +1,107 @@
+import pytest
+
+from conftest import enriched_record, pubsub_event
+
+from shared.db import ConnectionPool, get_db_connection
+from shared import idempotency
+from shared.idempotency import IdempotencyStore, SideEffectInProgress
+from shared.schema import ensure_schema
+
+class FailingStore(IdempotencyStore):
+    """A real store whose chosen operations fail, as when Cloud SQL drops the connection."""
+
+    def __init__(self, pool, failing):
+        super().__init__(pool)
+        self.failing = set(failing)
+
+    def fail_if(self, operation):
+        if operation in self.failing:
+            raise ConnectionError(f"{operation}: connection reset")
+
+    def claim(self, integration, message_id):
+        self.fail_if("claim")
+        return super().claim(integration, message_id)
+
+    def complete(self, integration, message_id, token, result):
+        self.fail_if("complete")
+        return super().complete(integration, message_id, token, result)
+
+    def release(self, integration, message_id, token):
+        self.fail_if("release")
+        return super().release(integration, message_id, token)
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "idempotency.sqlite")
+    conn = get_db_connection(path)
+    ensure_schema(conn)
+    conn.close()
+    pool = ConnectionPool(max_size=1, sqlite_path=path)
+    yield pool
+    pool.close()
+
+def counting_side_effect(calls, result="JIRA-1"):
+    def side_effect():
+        calls.append(1)
+        return result
+    return side_effect
+
+def test_redelivery_does_not_repeat_the_side_effect(pool):
+    store, calls = IdempotencyStore(pool), []
+    assert store.run_once("jira", "m1", counting_side_effect(calls)) == (True, "JIRA-1")
+    assert IdempotencyStore(pool).run_once("jira", "m1", counting_side_effect(calls)) == (False, "JIRA-1")
+    assert len(calls) == 1
+
+def test_claim_failure_still_runs_the_side_effect(pool):
+    calls = []
+    assert FailingStore(pool, {"claim"}).run_once("jira", "m1", counting_side_effect(calls)) == (True, "JIRA-1")
+    assert len(calls) == 1
+
+def test_complete_failure_is_logged_not_raised(pool, capsys):
+    calls = []
+    assert FailingStore(pool, {"complete"}).run_once("jira", "m1", counting_side_effect(calls)) == (True, "JIRA-1")
+    assert len(calls) == 1
+    assert "Could not record jira/m1 as done" in capsys.readouterr().out
+
+def test_release_failure_keeps_the_side_effect_error(pool):
+    def side_effect():
+        raise RuntimeError("Jira is down")
+
+    with pytest.raises(RuntimeError, match="Jira is down"):
+        FailingStore(pool, {"release"}).run_once("jira", "m1", side_effect)
+    assert FailingStore(pool, {"release"}).run_once("jira", "m2", lambda: None) == (True, None)
+
+def test_live_foreign_claim_raises_so_the_delivery_is_retried(pool):
+    calls = []
+    assert IdempotencyStore(pool).claim("jira", "m1") is not None # Another worker is mid-call
+
+    with pytest.raises(SideEffectInProgress):
+        IdempotencyStore(pool).run_once("jira", "m1", counting_side_effect(calls))
+    # Lost race: the key was claimed between this worker's lookup and its claim.
+    with pytest.raises(SideEffectInProgress):
+        IdempotencyStore(pool).run_after_lookup("jira", "m1", counting_side_effect(calls), None)
+    assert calls == []
+
+def test_expired_foreign_claim_is_taken_over(pool):
+    calls = []
+    assert IdempotencyStore(pool, lease_seconds=-1).claim("jira", "m1") is not None # Crashed worker
+    assert IdempotencyStore(pool).run_once("jira", "m1", counting_side_effect(calls)) == (True, "JIRA-1")
+    assert len(calls) == 1
+
+def test_integration_fails_the_delivery_while_another_worker_holds_the_key(sqlite_db, monkeypatch):
+    from jira_integration import main as jira_integration
+
+    idempotency.get_idempotency_store.cache_clear()
+    store = idempotency.get_idempotency_store()
+    try:
+        store.claim("jira", "m1")
+        created = []
+        monkeypatch.setattr(jira_integration, "create_jira_issue", lambda *args: created.append(args) or "JIRA-1")
+        event = pubsub_event(enriched_record("m1", category="bug_report", sentiment="negative"))
+
+        with pytest.raises(SideEffectInProgress):
+            jira_integration.jira_integration_entrypoint(event, None)
+        assert created == []
+    finally:
+        store.pool.close()
+        idempotency.get_idempotency_store.cache_clear()
@@ -0,0 +1,43 @@
+import base64
+import contextlib
+import json
+
+from local_pipeline_runner import HandlerOutput, PipelineStage
+
+def run_stage(handler, messages):
+    stage = PipelineStage("test", handler, workers=1, queue_size=10, batch_size=10)
+    with contextlib.redirect_stdout(HandlerOutput()):
+        return stage.run_batch([json.dumps(message).encode("utf-8") for message in messages]), stage
+
+def test_handler_error_lines_count_as_failures():
+    def handler(event, context):
+        print("Processing...")
+        if json.loads(base64.b64decode(event["data"]))["id"] == "bad":
+            print("ERROR: could not store message")
+
+    failed, stage = run_stage(handler, [{"id": 1}, {"id": "bad"}])
+    assert failed == 1
+    assert stage.first_error.startswith("ERROR: could not store message")
+
+def test_raised_exceptions_count_once():
+    def handler(event, context):
+        print("ERROR: about to raise")
+        raise RuntimeError("boom")
+
+    assert run_stage(handler, [{"id": 1}, {"id": 2}])[0] == 2
+
+def test_storage_failure_is_counted(tmp_path, monkeypatch):
+    import shared.db
+    from data_storage_listener import main as data_storage_listener
+
+    from conftest import enriched_record
+
+    # No schema: the insert fails inside the handler, which only prints the error.
+    path = str(tmp_path / "empty.sqlite")
+    monkeypatch.setattr(shared.db, "DB_SQLITE_PATH", path)
+    monkeypatch.setattr(data_storage_listener, "DB_SQLITE_PATH", path)
+    try:
+        failed, _ = run_stage(data_storage_listener.data_storage_listener_entrypoint, [enriched_record("m1")])
+    finally:
+        data_storage_listener.discard_reusable_db_connection()
+    assert failed == 1
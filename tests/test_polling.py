@@ -0,0 +1,110 @@
+import pytest
+
+from shared import polling
+from shared.polling import PollingController
+from tools.fake_social_api import FakeSocialApi, FakeSource, SimulatedClock
+from tools.simulate_polling import MemoryStateStore
+
+START = 1_800_000_000.0
+
+class NewestFirstApi:
+    """In-memory source that pages like the real APIs: newest first, with a next-page token."""
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.ids = []
+        self.calls = [] # (since_id, etag, page_token) per request
+
+    def add(self, count):
+        start = self.ids[-1] + 1 if self.ids else 100
+        self.ids += list(range(start, start + count))
+
+    def fetch_page(self, since_id, etag, page_token):
+        self.calls.append((since_id, etag, page_token))
+        newer = [item_id for item_id in reversed(self.ids) if item_id > (since_id or 0)
+                 and (page_token is None or item_id < page_token)]
+        page = newer[:self.page_size]
+        return {"status": 200, "headers": {}, "items": [{"id": item_id} for item_id in page],
+                "newest_id": page[0] if page else None,
+                "next_token": page[-1] if len(newer) > self.page_size else None, "etag": f'"{self.ids[-1]}"'}
+
+def controller():
+    poller = PollingController("test", clock=SimulatedClock(START), store=MemoryStateStore())
+    poller.load()
+    return poller
+
+def ids(items):
+    return sorted(item["id"] for item in items)
+
+def test_round_follows_every_page_and_advances_since_id_after_the_last():
+    api, poller = NewestFirstApi(page_size=3), controller()
+    api.add(8)
+
+    assert ids(poller.poll_round(api.fetch_page)) == list(range(100, 108))
+    # since_id stays put for the whole round; the page token walks back through older items.
+    assert api.calls == [(None, None, None), (None, None, 105), (None, None, 102)]
+    assert poller.state["since_id"] == 107 and poller.state["page_token"] is None
+
+    api.add(4)
+    assert ids(poller.poll_round(api.fetch_page)) == list(range(108, 112))
+    assert api.calls[-2:] == [(107, '"107"', None), (107, None, 109)]
+    assert poller.state["since_id"] == 111
+
+def test_round_cut_short_resumes_from_its_page_token(monkeypatch):
+    monkeypatch.setattr(polling, "POLL_MAX_PAGES", 2)
+    api, poller = NewestFirstApi(page_size=3), controller()
+    api.add(8)
+
+    first = ids(poller.poll_round(api.fetch_page))
+    assert first == list(range(102, 108))
+    assert poller.state["since_id"] is None # The oldest items have not been seen yet
+    assert (poller.state["page_token"], poller.state["round_newest_id"]) == (102, 107)
+
+    api.add(2) # Arrive while the backlog is still being read
+    second = ids(poller.poll_round(api.fetch_page))
+    assert second == [100, 101]
+    assert poller.state["since_id"] == 107
+
+    third = ids(poller.poll_round(api.fetch_page))
+    assert third == [108, 109]
+    assert sorted(first + second + third) == list(range(100, 110)) # Nothing lost, nothing repeated
+
+def test_resume_state_survives_a_cold_start(monkeypatch):
+    monkeypatch.setattr(polling, "POLL_MAX_PAGES", 1)
+    api, store = NewestFirstApi(page_size=2), MemoryStateStore()
+    api.add(5)
+    clock = SimulatedClock(START)
+    seen = []
+    for _ in range(3):
+        poller = PollingController("test", clock=clock, store=store) # New instance every invocation
+        seen += list(poller.poll(api.fetch_page, window_seconds=0))
+        clock.sleep(poller.state["interval_seconds"])
+    assert ids(seen) == list(range(100, 105))
+
+@pytest.mark.parametrize("style, connector_module, fetch_name, id_key", [
+    ("twitter", "twitter_connector.main", "fetch_tweet_page", "id"),
+    ("tiktok", "tiktok_connector.main", "fetch_tiktok_comment_page", "comment_id"),
+])
+def test_connector_pages_through_the_fake_api(monkeypatch, style, connector_module, fetch_name, id_key):
+    import importlib
+
+    module = importlib.import_module(connector_module)
+    clock = SimulatedClock(START)
+    source = FakeSource(style, clock, [(0, 1.0)], limit=100, window_seconds=900, max_page_size=4, style=style)
+    api = FakeSocialApi({style: source})
+    base_url = api.serve_in_background(0)
+    monkeypatch.setattr(module, "TWITTER_API_BASE_URL" if style == "twitter" else "TIKTOK_API_BASE_URL",
+                        f"{base_url}/{style}")
+    try:
+        clock.advance_to(START + 30)
+        poller = PollingController(style, clock=clock, store=MemoryStateStore())
+        poller.load()
+        first = [item[id_key] for item in poller.poll_round(getattr(module, fetch_name))]
+        clock.advance_to(START + 60)
+        second = [item[id_key] for item in poller.poll_round(getattr(module, fetch_name))]
+    finally:
+        api.shutdown()
+
+    expected = [str(item_id) for item_id, created, _ in source.items if created <= START + 60]
+    assert len(first) > 4 # More than one page
+    assert sorted(first + second, key=int) == expected
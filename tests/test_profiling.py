@@ -0,0 +1,38 @@
+import os
+import time
+
+from shared import profiling
+
+def busy_entrypoint(event, context):
+    deadline = time.perf_counter() + 0.05
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return event
+
+def test_profiled_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    assert profiling.profiled(busy_entrypoint) is busy_entrypoint
+
+def test_profiled_skips_entrypoints_not_listed(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(profiling, "PROFILE_ENTRYPOINTS", {"ai_processor_entrypoint"})
+    assert profiling.profiled(busy_entrypoint) is busy_entrypoint
+
+def test_sampled_call_writes_profile_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(profiling, "PROFILE_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_STACK_INTERVAL_SECONDS", 0.001)
+
+    wrapped = profiling.profiled(busy_entrypoint)
+    assert wrapped is not busy_entrypoint
+    assert wrapped({"data": "x"}, None) == {"data": "x"}
+
+    files = sorted(os.listdir(tmp_path))
+    assert [os.path.splitext(name)[1] for name in files] == [".folded", ".pstats", ".txt"]
+    assert all(name.startswith("busy_entrypoint-") for name in files)
+    with open(tmp_path / files[0]) as folded_file:
+        stacks = folded_file.read().splitlines()
+    # Collapsed format: "root;child;... count", rooted at the entrypoint itself.
+    assert stacks and all(line.startswith("busy_entrypoint (") for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
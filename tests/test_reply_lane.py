@@ -0,0 +1,84 @@
+import pytest
+
+from central_ai_processor import main as ai_processor
+from central_ai_processor import near_duplicate_index
+from central_ai_processor.near_duplicate_index import NearDuplicateIndex
+from shared.db import get_db_connection, stream_dicts
+
+from conftest import enriched_record, pubsub_event, store
+
+CLASSIFIED = ai_processor.CLASSIFIED_FEEDBACK_TOPIC_NAME
+REQUESTS = ai_processor.AUTO_REPLY_REQUESTS_TOPIC_NAME
+PATCHES = ai_processor.AUTO_REPLY_PATCHES_TOPIC_NAME
+
+@pytest.fixture
+def local_backend(monkeypatch):
+    monkeypatch.setattr(ai_processor, "AI_BACKEND", "local")
+    monkeypatch.setattr(near_duplicate_index, "_index", NearDuplicateIndex())
+    ai_processor.get_reply_index.cache_clear()
+    yield
+    ai_processor.get_reply_index.cache_clear()
+
+def stored_row(message_id):
+    conn = get_db_connection()
+    try:
+        sql = "SELECT * FROM enriched_feedback WHERE message_id = ?"
+        [row] = [row for rows in stream_dicts(conn, sql, (message_id,)) for row in rows]
+        return row
+    finally:
+        conn.close()
+
+def reply_patch(message_id, auto_reply_text):
+    return {"record_type": ai_processor.AUTO_REPLY_PATCH_RECORD_TYPE, "message_id": message_id,
+            "auto_reply_text": auto_reply_text}
+
+def test_positive_feedback_is_answered_by_the_reply_lane(local_backend, recording_publisher):
+    feedback = {"message_id": "m1", "source_platform": "twitter", "timestamp_utc": "2026-10-01T12:00:00Z",
+                "text_content": "Our accountant finally understands the quarterly roadmap, the timeline view is excellent",
+                "author_info": {"username": "dana"}, "original_url": None, "raw_metadata": {}}
+    ai_processor.ai_processor_entrypoint(pubsub_event(feedback), None)
+
+    [enriched] = recording_publisher.on(CLASSIFIED)
+    assert enriched["auto_reply_pending"] and enriched["auto_reply_text"] is None
+    [reply_request] = recording_publisher.on(REQUESTS)
+    assert reply_request["message_id"] == "m1" and reply_request["sentiment"] == "positive"
+
+    ai_processor.reply_generation_entrypoint(pubsub_event(reply_request), None)
+
+    [patch] = recording_publisher.on(PATCHES)
+    assert patch["record_type"] == ai_processor.AUTO_REPLY_PATCH_RECORD_TYPE
+    assert patch["auto_reply_text"] == ai_processor.FALLBACK_REPLY_TEXT
+    assert patch["author_info"] == {"username": "dana"} # Context for the email integration
+
+def test_reply_lane_skips_feedback_that_needs_no_reply(local_backend, recording_publisher):
+    request = {"message_id": "m2", "prompt_text": "The export is broken", "normalized_text": "the export is broken",
+               "sentiment": "negative", "category": "bug_report"}
+    ai_processor.reply_generation_entrypoint(pubsub_event(request), None)
+    assert recording_publisher.on(PATCHES) == []
+
+def test_patch_arriving_before_its_record_is_kept(sqlite_db):
+    store(reply_patch("m1", "Thanks, Dana!"))
+    assert stored_row("m1")["auto_reply_text"] == "Thanks, Dana!"
+
+    # The record itself carries no reply (it was still pending); COALESCE keeps the patch.
+    store(enriched_record("m1", sentiment="positive", auto_reply_text=None))
+
+    row = stored_row("m1")
+    assert row["auto_reply_text"] == "Thanks, Dana!"
+    assert row["sentiment"] == "positive" and row["source_platform"] == "twitter"
+
+def test_patch_after_its_record_fills_in_the_reply(sqlite_db):
+    store(enriched_record("m1", sentiment="positive", auto_reply_text=None))
+    first_update = stored_row("m1")["updated_at"]
+    store(reply_patch("m1", "Thanks, Dana!"))
+
+    row = stored_row("m1")
+    assert row["auto_reply_text"] == "Thanks, Dana!"
+    assert row["updated_at"] > first_update # Incremental readers pick up the reply
+
+def test_record_with_its_own_reply_replaces_an_earlier_one(sqlite_db):
+    store(reply_patch("m1", "Old reply"))
+    store(enriched_record("m1", auto_reply_text="Template reply", auto_reply_template="praise_general"))
+
+    row = stored_row("m1")
+    assert row["auto_reply_text"] == "Template reply" and row["auto_reply_template"] == "praise_general"
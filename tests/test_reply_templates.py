@@ -0,0 +1,131 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from central_ai_processor import main as ai_processor
+from central_ai_processor import near_duplicate_index
+from central_ai_processor.near_duplicate_index import NearDuplicateIndex
+from central_ai_processor.promote_reply_templates import stream_generated_replies
+from central_ai_processor.reply_templates import (REPLY_TEMPLATES_PATH, ReplyTemplateLibrary, reply_from_template,
+                                                  template_guard_reason)
+from central_ai_processor.text_preprocessing import preprocess_feedback_text
+from shared.db import get_db_connection
+
+from conftest import enriched_record, pubsub_event, store
+
+# Calibration set for REPLY_TEMPLATE_MIN_SIMILARITY: praise written independently of the
+# library (none of it copies an example), and feedback that is not praise. Re-run after
+# editing reply_templates.json.
+PRAISE_PARAPHRASES = [
+    ("FlowHub has saved our design team hours of busywork", "saved-our-team"),
+    ("Since we switched to FlowHub our team is far more organized", "saved-our-team"),
+    ("FlowHub made collaboration across our remote team easy", "saved-our-team"),
+    ("Really love FlowHub, best app our team uses", "love-flowhub"),
+    ("FlowHub is amazing, thank you so much", "love-flowhub"),
+    ("FlowHub is great for planning our team syncs", "love-flowhub"),
+    ("The new board view release is great, nice job", "release-praise"),
+    ("Loving the latest update, the calendar sync feature is fantastic", "release-praise"),
+    ("Great job on the offline mode release", "release-praise"),
+    ("FlowHub saves our team hours every single week", "productivity-win"),
+    ("We finish twice as many tasks per sprint with FlowHub", "productivity-win"),
+    ("Our team ships faster since we started with FlowHub", "productivity-win"),
+    ("Huge thanks to the support team for the quick help today", "support-thanks"),
+    ("FlowHub support was super friendly and helpful", "support-thanks"),
+    ("We switched from Monday.com to FlowHub and never looked back", "switched-to-flowhub"),
+    ("Moving our team from ClickUp to FlowHub was the best decision", "switched-to-flowhub"),
+    ("FlowHub is so much better than the tool we used before", "switched-to-flowhub"),
+]
+# Share of PRAISE_PARAPHRASES that must get a template; the rest fall back to a generated reply.
+MIN_PARAPHRASE_RECALL = 0.8
+NOT_PRAISE = [
+    "Does FlowHub integrate with Slack? We have 20 people asking",
+    "How do I export a report to PDF",
+    "Can I change the billing email on our account",
+    "Our team needs SSO before we can roll FlowHub out",
+    "Is there a way to archive old boards",
+    "The mobile app logs me out every day",
+    "We are evaluating FlowHub against Asana for our team",
+    "Please call me back about our contract renewal",
+    "My manager asked me to try FlowHub for our team",
+    "The team calendar shows the wrong time zone",
+]
+# Positive-sounding feedback that carries a complaint: always a written reply.
+PRAISE_WITH_COMPLAINT = [
+    "great job on the release but my data is gone",
+    "Since we switched to FlowHub our team is far more organized, but billing charged us twice",
+    "Love the new release, however the sync is slow",
+    "FlowHub is awesome, the only problem is the mobile app",
+]
+
+@pytest.fixture(scope="module")
+def library():
+    return ReplyTemplateLibrary.load(REPLY_TEMPLATES_PATH)
+
+def normalized(text):
+    return preprocess_feedback_text(text)["normalized_text"]
+
+@pytest.mark.parametrize("text, template_id", PRAISE_PARAPHRASES)
+def test_matched_paraphrase_gets_its_own_template(library, text, template_id):
+    template, _ = library.match(normalized(text), "general_feedback")
+    assert template is None or template["id"] == template_id
+
+def test_most_paraphrases_get_a_template(library):
+    misses = []
+    for text, _ in PRAISE_PARAPHRASES:
+        template, similarity = library.match(normalized(text), "general_feedback")
+        if template is None:
+            misses.append(f"{similarity:.3f} {text}")
+    recall = 1 - len(misses) / len(PRAISE_PARAPHRASES)
+    assert recall >= MIN_PARAPHRASE_RECALL, misses
+
+def test_library_examples_pass_the_guard(library):
+    for template in library.templates:
+        for example in template["examples"]:
+            for category in template["categories"]:
+                assert template_guard_reason(example, category) is None, (template["id"], example)
+
+@pytest.mark.parametrize("text", NOT_PRAISE)
+def test_feedback_that_is_not_praise_gets_no_template(library, text):
+    assert library.match(normalized(text), "general_feedback")[0] is None
+
+@pytest.mark.parametrize("text", PRAISE_WITH_COMPLAINT)
+def test_praise_with_a_complaint_gets_no_template(library, text):
+    assert library.match(normalized(text), "general_feedback") == (None, 0.0)
+    assert reply_from_template(normalized(text), "general_feedback", {"username": "dana"})[:2] == (None, None)
+
+def test_feature_request_may_use_a_contrast_word(library):
+    template, _ = library.match(normalized("Loving FlowHub, but really need a built-in gantt chart for our projects"), "feature_request")
+    assert template["id"] == "feature-idea-thanks"
+    assert library.match(normalized("Love FlowHub but the sync is broken, please add backups"), "feature_request")[0] is None
+
+def test_template_reply_is_stored_and_not_offered_for_promotion(sqlite_db, recording_publisher, monkeypatch):
+    monkeypatch.setattr(ai_processor, "AI_BACKEND", "local")
+    monkeypatch.setattr(near_duplicate_index, "_index", NearDuplicateIndex())
+    feedback = {"message_id": "m1", "source_platform": "twitter", "timestamp_utc": "2026-10-01T12:00:00Z",
+                "text_content": "FlowHub made collaboration across our remote team easy",
+                "author_info": {"username": "dana"}, "original_url": None, "raw_metadata": {}}
+    ai_processor.ai_processor_entrypoint(pubsub_event(feedback), None)
+    [enriched] = recording_publisher.on(ai_processor.CLASSIFIED_FEEDBACK_TOPIC_NAME)
+    assert enriched["auto_reply_template"].startswith("saved-our-team@")
+    assert recording_publisher.on(ai_processor.AUTO_REPLY_REQUESTS_TOPIC_NAME) == []
+
+    store(enriched)
+    store(enriched_record("m2", auto_reply_text="Thank you so much for the kind words!"))
+    conn = get_db_connection()
+    try:
+        stored = conn.execute("SELECT auto_reply_template FROM enriched_feedback WHERE message_id = 'm1'").fetchone()
+        assert stored == (enriched["auto_reply_template"],)
+        assert [row["message_id"] for row in stream_generated_replies(conn, 100)] == ["m2"]
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("function_target, loaded", [("ai_processor_entrypoint", 1), ("", 0)])
+def test_library_is_loaded_when_the_processor_instance_starts(function_target, loaded):
+    code = ("import central_ai_processor.main as main; "
+            "print(main.get_reply_template_library.cache_info().currsize)")
+    environment = dict(os.environ, FUNCTION_TARGET=function_target)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=environment,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+    assert result.stdout.strip().splitlines()[-1] == str(loaded)
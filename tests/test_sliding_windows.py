@@ -0,0 +1,155 @@
+import json
+import random
+
+import pytest
+
+from spike_detector.sliding_windows import SpikeDetector
+
+BUCKET = 60
+KEY = ("bug_report", "tiktok", None)
+
+def detector(**overrides):
+    # 5- and 15-bucket windows; with a 10-minute half-life the EWMA takes over after 15 buckets.
+    settings = dict(bucket_seconds=BUCKET, windows_seconds=(300, 900), half_life_seconds=600)
+    settings.update(overrides)
+    return SpikeDetector(**settings)
+
+def at(bucket, offset=0.0):
+    return bucket * BUCKET + offset
+
+def observe_many(spikes, bucket, count, key=KEY):
+    alerts = []
+    for i in range(count):
+        alerts += spikes.observe(key, at(bucket, i * BUCKET / (count + 1)), message_id=f"{bucket}-{i}")
+    return alerts
+
+def state_snapshot(spikes):
+    return {key: (state.head, list(state.buckets), list(state.sums), state.baseline, state.closed_buckets,
+                  list(state.last_alert), list(state.recent_ids))
+            for key, state in spikes.keys.items()}
+
+def test_window_sums_drop_buckets_that_slide_out():
+    spikes = detector()
+    observe_many(spikes, 0, 3)
+    observe_many(spikes, 2, 2)
+    state = spikes.keys[KEY]
+    assert state.sums == [5, 5]
+
+    spikes.close_buckets(state, 5) # Window of 5 now covers buckets 1..5
+    assert state.sums == [2, 5]
+    spikes.close_buckets(state, 7) # ... and 3..7
+    assert state.sums == [0, 5]
+    spikes.close_buckets(state, 15) # Window of 15 now covers buckets 1..15
+    assert state.sums == [0, 2]
+
+def test_window_sums_match_a_recount_of_the_buckets():
+    spikes, rng = detector(), random.Random(7)
+    events, timestamp = [], 0.0
+    for _ in range(3000):
+        timestamp += rng.expovariate(1 / 20)
+        late = rng.random() < 0.1
+        event_time = max(timestamp - rng.uniform(0, 20 * BUCKET), 0.0) if late else timestamp
+        spikes.observe(KEY, event_time)
+        events.append(int(event_time // BUCKET))
+
+        head = spikes.keys[KEY].head
+        expected = [sum(1 for bucket in events if head - length < bucket <= head) for length in (5, 15)]
+        assert spikes.keys[KEY].sums == expected
+
+def test_gap_longer_than_the_ring_resets_every_window():
+    spikes = detector()
+    observe_many(spikes, 0, 4)
+    state = spikes.keys[KEY]
+
+    spikes.close_buckets(state, 100)
+
+    assert state.sums == [0, 0]
+    assert state.buckets == [0] * spikes.bucket_count
+    assert state.head == 100 and state.closed_buckets == 100
+    assert 0 < state.baseline < 4 / 100 # Decayed below the plain mean once the EWMA took over
+
+def test_late_events_count_only_in_windows_that_still_cover_them():
+    spikes = detector()
+    observe_many(spikes, 20, 1)
+    spikes.observe(KEY, at(18)) # Inside both windows
+    spikes.observe(KEY, at(13)) # Outside the 5-bucket window
+    spikes.observe(KEY, at(5))  # Older than the ring: dropped
+    state = spikes.keys[KEY]
+    assert state.sums == [2, 3]
+    assert spikes.late_dropped == 1
+    assert state.head == 20 # Late events never move the ring backwards
+
+def test_baseline_is_a_plain_mean_until_the_ewma_takes_over():
+    spikes = detector()
+    for bucket, count in enumerate([4, 0, 2, 6]):
+        observe_many(spikes, bucket, count) # The empty bucket is closed by the next event
+    state = spikes.keys[KEY]
+    spikes.close_buckets(state, 4)
+    assert state.closed_buckets == 4
+    assert state.baseline == pytest.approx((4 + 0 + 2 + 6) / 4)
+
+    # Empty buckets closed in one step are still averaged in while the mean applies ...
+    spikes.close_buckets(state, 8)
+    assert state.baseline == pytest.approx(12 / 8)
+    # ... and decay by (1 - alpha) each once the EWMA has taken over.
+    spikes.close_buckets(state, 20)
+    before = state.baseline
+    spikes.close_buckets(state, 22)
+    assert state.baseline == pytest.approx(before * (1 - spikes.alpha) ** 2)
+
+def test_steady_rate_does_not_alert():
+    spikes = detector()
+    alerts = []
+    for bucket in range(300):
+        alerts += observe_many(spikes, bucket, 3)
+    assert alerts == []
+
+def test_burst_alerts_once_per_window_until_its_cooldown_ends():
+    spikes = detector()
+    for bucket in range(60):
+        assert observe_many(spikes, bucket, 1) == []
+
+    burst = []
+    for bucket in range(60, 63):
+        burst += observe_many(spikes, bucket, 40)
+    assert sorted(alert["window_seconds"] for alert in burst) == [300, 900]
+    assert all(alert["category"] == "bug_report" and alert["source_platform"] == "tiktok" for alert in burst)
+    assert len(burst[0]["sample_message_ids"]) == 5
+
+    # Six buckets later the 5-bucket window's cooldown is over, the 15-bucket window's is not.
+    for bucket in range(63, 66):
+        assert observe_many(spikes, bucket, 1) == []
+    second = observe_many(spikes, 66, 120)
+    assert [alert["window_seconds"] for alert in second] == [300]
+
+def test_new_key_does_not_alert_during_warmup():
+    spikes = detector()
+    assert observe_many(spikes, 0, 200) == []
+
+def test_checkpoint_round_trip_restores_identical_state():
+    spikes, rng = detector(), random.Random(3)
+    keys = [("bug_report", "tiktok", None), ("general_feedback", "twitter", "Asana")]
+    for bucket in range(40):
+        for key in keys:
+            observe_many(spikes, bucket, rng.randint(0, 4), key)
+    assert observe_many(spikes, 40, 60, keys[0]) # Puts a window in cooldown
+
+    checkpoint = json.loads(json.dumps(spikes.to_checkpoint())) # As stored in stream_checkpoints
+    restored = detector()
+    assert restored.restore_checkpoint(checkpoint)
+    assert state_snapshot(restored) == state_snapshot(spikes)
+    assert list(restored.keys) == list(spikes.keys)
+
+    # Both continue identically, including the cooldown carried in the checkpoint.
+    for bucket in range(41, 60):
+        for key in keys:
+            count = rng.randint(0, 30)
+            assert observe_many(restored, bucket, count, key) == observe_many(spikes, bucket, count, key)
+    assert state_snapshot(restored) == state_snapshot(spikes)
+
+def test_checkpoint_for_other_windows_is_ignored():
+    spikes = detector()
+    observe_many(spikes, 0, 3)
+    other = detector(windows_seconds=(300, 1800))
+    assert not other.restore_checkpoint(spikes.to_checkpoint())
+    assert other.keys == {}
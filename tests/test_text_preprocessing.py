@@ -0,0 +1,37 @@
+import pytest
+
+from central_ai_processor.text_preprocessing import canonicalize_text, preprocess_feedback_text
+
+EMAIL_WITH_HISTORY = """The export button does nothing since the update.
+
+On Tue, Oct 1, 2026 at 9:00 AM Support <support@flowhub.example> wrote:
+> Thanks for reaching out, can you describe the problem?
+"""
+
+def test_email_history_is_stripped_for_email_sources():
+    clean_text = preprocess_feedback_text(EMAIL_WITH_HISTORY, "email")["clean_text"]
+    assert clean_text == "The export button does nothing since the update."
+
+def test_email_markers_do_not_cut_social_posts():
+    tweet = "Quick thread on FlowHub\nFrom: @dana our ops team\nthe calendar sync drops events every Monday"
+    clean_text = preprocess_feedback_text(tweet, "twitter")["clean_text"]
+    assert clean_text.endswith("the calendar sync drops events every Monday")
+
+@pytest.mark.parametrize("text, expected", [
+    ("This is *really* **great**", "This is really great"),
+    ("_Please_ add dark mode", "Please add dark mode"),
+    ("upload_file_to_board fails for user dana_smith_99", "upload_file_to_board fails for user dana_smith_99"),
+    ("set retry_count and max_retry_delay in sync_config", "set retry_count and max_retry_delay in sync_config"),
+])
+def test_markdown_emphasis(text, expected):
+    assert canonicalize_text(text) == expected
+
+def test_noise_is_removed_but_hashtag_words_kept():
+    result = preprocess_feedback_text("@flowhub the app crashes https://t.co/abc #bug_report", "twitter")
+    assert result["clean_text"] == "the app crashes bug report"
+    assert result["normalized_text"] == "the app crashes bug report"
+
+def test_long_text_is_truncated_on_a_word_boundary():
+    result = preprocess_feedback_text("word " * 1000, "twitter")
+    assert result["was_truncated"]
+    assert len(result["prompt_text"]) <= 800 and result["prompt_text"].endswith("word")
@@ -1,15 +1,29 @@
 import json
 import datetime
+import os
 import uuid
-from google.cloud import pubsub_v1
+from shared.clients import get_topic_path
+from shared.connectors import register_connector, run_connector
+from shared.polling import PollingController, fetch_page_json, page_from_response, poll_interval_summary
+from shared.profiling import profiled
 
 # --- Configuration ---
 # !!! IMPORTANT: REPLACE THESE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID AND TOPIC NAME !!!
 PROJECT_ID = "zenithflow-feedback-automation"
 RAW_FEEDBACK_TOPIC_NAME = "raw-feedback-toc" # This is the Pub/Sub topic for all raw, normalized data
 
-publisher = pubsub_v1.PublisherClient()
-raw_feedback_topic_path = publisher.topic_path(PROJECT_ID, RAW_FEEDBACK_TOPIC_NAME)
+# The publisher is created lazily on first publish (see shared/clients.py)
+raw_feedback_topic_path = get_topic_path(PROJECT_ID, RAW_FEEDBACK_TOPIC_NAME)
+
+# --- TikTok API Configuration ---
+# Leave TIKTOK_API_BASE_URL empty to emit the dummy data below. When set (to the API, or to
+# the local fake in tools/fake_social_api.py), the comments endpoint is polled adaptively
+# (see shared/polling.py).
+TIKTOK_API_BASE_URL = os.environ.get("TIKTOK_API_BASE_URL", "")
+TIKTOK_ACCESS_TOKEN = os.environ.get("TIKTOK_ACCESS_TOKEN", "your_fictitious_tiktok_access_token")
+TIKTOK_PAGE_SIZE = 50
+
+TIKTOK_POLLER = PollingController("tiktok")
 
 # --- Fictitious Dummy TikTok Data for ZenithFlow Solutions ---
 # This list simulates comments/mentions that our connector would fetch from TikTok.
@@ -95,6 +109,40 @@ def process_raw_tiktok_comment_to_normalized_schema(raw_comment):
 
     return normalized_feedback
 
+def fetch_tiktok_comment_page(since_id, etag, page_token=None):
+    """
+    One call for brand-mention comments newer than `since_id`, newest first. With `has_more`
+    the response's `cursor` is sent back to get the next (older) page.
+    Returns the page dict used by PollingController.
+    """
+    response = fetch_page_json(
+        f"{TIKTOK_API_BASE_URL}/comments",
+        params={"since_id": since_id, "count": TIKTOK_PAGE_SIZE, "cursor": page_token},
+        headers={"Authorization": f"Bearer {TIKTOK_ACCESS_TOKEN}"},
+        etag=etag,
+    )
+    if response.status_code != 200:
+        return page_from_response(response)
+    body = response.json()
+    comments = body.get("comments", [])
+    newest_id = comments[0].get("comment_id") if comments else None
+    return page_from_response(response, comments, newest_id, body.get("cursor") if body.get("has_more") else None)
+
+def fetch_raw_tiktok_comments():
+    """
+    Yields raw TikTok items: from the TikTok API when TIKTOK_API_BASE_URL is set,
+    otherwise from our predefined dummy list.
+    """
+    if not TIKTOK_API_BASE_URL:
+        yield from dummy_tiktok_data
+        return
+    yield from TIKTOK_POLLER.poll(fetch_tiktok_comment_page)
+    print(poll_interval_summary(TIKTOK_POLLER))
+
+# Registered so the connector scheduler (connector_scheduler/main.py) can run this source too.
+TIKTOK_CONNECTOR = register_connector("tiktok", fetch_raw_tiktok_comments, process_raw_tiktok_comment_to_normalized_schema)
+
+@profiled
 def tiktok_connector_entrypoint(request):
     """
     Cloud Function entry point for the TikTok Connector.
@@ -102,19 +150,7 @@ def tiktok_connector_entrypoint(request):
     """
     print(f"TikTok Connector triggered. Project: {PROJECT_ID}, Topic: {RAW_FEEDBACK_TOPIC_NAME}")
 
-    processed_count = 0
-    # In a real function, you'd call the TikTok API here.
-    for comment in dummy_tiktok_data:
-        normalized_data = process_raw_tiktok_comment_to_normalized_schema(comment)
-        if normalized_data:
-            try:
-                data_bytes = json.dumps(normalized_data).encode('utf-8')
-                future = publisher.publish(raw_feedback_topic_path, data_bytes)
-                message_id = future.result()
-                print(f"Published message {message_id} from TikTok (ID: {normalized_data['message_id']}) to raw-feedback-toc.")
-                processed_count += 1
-            except Exception as e:
-                print(f"ERROR: Failed to publish message for TikTok ID {normalized_data.get('message_id', 'N/A')}: {e}")
-
-    print(f"Finished processing {processed_count} dummy TikTok messages.")
+    summary = run_connector(TIKTOK_CONNECTOR, raw_feedback_topic_path)
+
+    print(f"Finished processing {summary['published']} TikTok messages.")
     return 'OK', 200
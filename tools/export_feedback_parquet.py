@@ -0,0 +1,280 @@
+"""
+Streaming export of enriched_feedback to date- and platform-partitioned Parquet files.
+
+Rows are read in chunks through a server-side cursor and buffered per partition, so memory
+is bounded by --max-buffered-rows no matter how large the table is. Nested columns are
+flattened (author_info -> author_* columns, detected_competitors -> a list column plus one
+boolean column per known competitor) and low-cardinality columns are dictionary-encoded.
+
+Exports are incremental: the last exported (updated_at, message_id) is kept in
+<output>/_watermark.json and the next run only reads rows after it. updated_at is set on
+every write (record upserts, reply patches, the backfill), so re-enriched rows and rows
+that got their reply later are exported again; readers keep the latest updated_at per
+message_id. Rows written in the last --settle-seconds are left for the next run: a
+write's updated_at is taken just before it commits, so a row stamped before the
+watermark could otherwise become visible after the run that passed it.
+
+Layout:
+    <output>/date=2025-06-19/source_platform=twitter/part-<run id>-00000.parquet
+
+Usage (from the repository root, with DB_* or DB_SQLITE_PATH set; requires pyarrow):
+    python -m tools.export_feedback_parquet --output exports/enriched_feedback
+    python -m tools.export_feedback_parquet --output exports/enriched_feedback --full
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import uuid
+
+from shared.db import get_db_connection, load_json, stream_dicts
+
+from central_ai_processor.main import COMPETITOR_KEYWORDS
+
+WATERMARK_FILE = "_watermark.json"
+DEFAULT_FETCH_SIZE = 5000
+DEFAULT_ROW_GROUP_SIZE = 50000
+DEFAULT_MAX_BUFFERED_ROWS = 200000
+DEFAULT_MAX_OPEN_WRITERS = 64
+DEFAULT_SETTLE_SECONDS = 120 # Far longer than any single-row write transaction
+
+EXPORT_SQL = """
+SELECT message_id, source_platform, timestamp_utc, text_content, author_info, original_url,
+       {raw_metadata_column} sentiment, category, detected_competitors, auto_reply_text,
+       processing_timestamp_utc, processor_version, updated_at
+FROM enriched_feedback
+WHERE updated_at <= %s {watermark_filter}
+ORDER BY updated_at, message_id
+"""
+# Row-value comparison works on both PostgreSQL and the SQLite stand-in.
+WATERMARK_FILTER = "AND (updated_at, message_id) > (%s, %s)"
+
+AUTHOR_FIELDS = ["id", "username", "nickname", "email"]
+DICTIONARY_COLUMNS = ["sentiment", "category", "processor_version"]
+
+def competitor_column(competitor):
+    """'monday.com' -> 'mentions_monday_com'"""
+    return "mentions_" + re.sub(r"\W+", "_", competitor).strip("_")
+
+def parse_timestamp(value):
+    """Timestamps come back as datetimes from PostgreSQL and ISO strings from SQLite."""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+def build_schema(include_raw_metadata):
+    """
+    Arrow schema of the files; low-cardinality columns are dictionary-encoded. The partition
+    columns (date, source_platform) live in the directory names, as Hive-style readers expect.
+    """
+    import pyarrow as pa
+
+    dictionary_string = pa.dictionary(pa.int32(), pa.string())
+    fields = [
+        pa.field("message_id", pa.string()),
+        pa.field("timestamp_utc", pa.timestamp("s", tz="UTC")),
+        pa.field("text_content", pa.string()),
+        *[pa.field(f"author_{name}", pa.string()) for name in AUTHOR_FIELDS],
+        pa.field("original_url", pa.string()),
+        pa.field("sentiment", dictionary_string),
+        pa.field("category", dictionary_string),
+        pa.field("detected_competitors", pa.list_(pa.string())),
+        *[pa.field(competitor_column(competitor), pa.bool_()) for competitor in COMPETITOR_KEYWORDS],
+        pa.field("auto_reply_text", pa.string()),
+        pa.field("processing_timestamp_utc", pa.timestamp("s", tz="UTC")),
+        pa.field("processor_version", dictionary_string),
+        pa.field("updated_at", pa.timestamp("us", tz="UTC")),
+    ]
+    if include_raw_metadata:
+        fields.append(pa.field("raw_metadata", pa.string()))
+    return pa.schema(fields)
+
+def flatten_row(row, include_raw_metadata):
+    """Flattens one database row into the export's flat column layout."""
+    author_info = load_json(row["author_info"], {}) or {}
+    competitors = load_json(row["detected_competitors"], []) or []
+    flat = {
+        "message_id": row["message_id"],
+        "source_platform": row["source_platform"],
+        "timestamp_utc": parse_timestamp(row["timestamp_utc"]),
+        "text_content": row["text_content"],
+        **{f"author_{name}": None if author_info.get(name) is None else str(author_info.get(name))
+           for name in AUTHOR_FIELDS},
+        "original_url": row["original_url"],
+        "sentiment": row["sentiment"],
+        "category": row["category"],
+        "detected_competitors": competitors,
+        **{competitor_column(competitor): competitor in competitors for competitor in COMPETITOR_KEYWORDS},
+        "auto_reply_text": row["auto_reply_text"],
+        "processing_timestamp_utc": parse_timestamp(row["processing_timestamp_utc"]),
+        "processor_version": row["processor_version"],
+        "updated_at": parse_timestamp(row["updated_at"]),
+    }
+    if include_raw_metadata:
+        flat["raw_metadata"] = json.dumps(load_json(row["raw_metadata"], {}))
+    return flat
+
+def partition_key(flat_row):
+    """(date, platform) partition of a row; the date is when the feedback was created."""
+    timestamp = flat_row["timestamp_utc"] or flat_row["processing_timestamp_utc"]
+    date = timestamp.date().isoformat() if timestamp else "unknown"
+    return date, flat_row["source_platform"] or "unknown"
+
+class PartitionedParquetWriter:
+    """
+    Buffers rows per partition and writes them as Parquet row groups. Buffers are flushed
+    when a partition reaches row_group_size or when all buffers together exceed
+    max_buffered_rows; at most max_open_writers files are open at once (least recently
+    used writers are closed and later partitions continue in a new part file).
+    """
+
+    def __init__(self, output_dir, schema, row_group_size, max_buffered_rows, max_open_writers):
+        self.output_dir = output_dir
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.max_open_writers = max_open_writers
+        self.run_id = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self.buffers = {} # partition -> list of row dicts
+        self.buffered_rows = 0
+        self.writers = {} # partition -> ParquetWriter, in least-recently-used order
+        self.part_numbers = {}
+        self.files_written = []
+
+    def write_row(self, flat_row):
+        partition = partition_key(flat_row)
+        buffer = self.buffers.setdefault(partition, [])
+        buffer.append(flat_row)
+        self.buffered_rows += 1
+        if len(buffer) >= self.row_group_size:
+            self.flush(partition)
+        while self.buffered_rows > self.max_buffered_rows:
+            self.flush(max(self.buffers, key=lambda key: len(self.buffers[key])))
+
+    def flush(self, partition):
+        import pyarrow as pa
+
+        rows = self.buffers.pop(partition, [])
+        if not rows:
+            return
+        self.buffered_rows -= len(rows)
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        self.writer_for(partition).write_table(table, row_group_size=self.row_group_size)
+
+    def writer_for(self, partition):
+        import pyarrow.parquet as pq
+
+        writer = self.writers.pop(partition, None)
+        if writer is None:
+            while len(self.writers) >= self.max_open_writers:
+                self.writers.pop(next(iter(self.writers))).close()
+            date, platform = partition
+            directory = os.path.join(self.output_dir, f"date={date}", f"source_platform={platform}")
+            os.makedirs(directory, exist_ok=True)
+            part_number = self.part_numbers.get(partition, 0)
+            self.part_numbers[partition] = part_number + 1
+            path = os.path.join(directory, f"part-{self.run_id}-{part_number:05d}.parquet")
+            writer = pq.ParquetWriter(path, self.schema, compression="zstd",
+                                      use_dictionary=DICTIONARY_COLUMNS)
+            self.files_written.append(path)
+        self.writers[partition] = writer # (Re-)insert as most recently used
+        return writer
+
+    def close(self):
+        for partition in list(self.buffers):
+            self.flush(partition)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+def read_watermark(output_dir):
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as watermark_file:
+        watermark = json.load(watermark_file)
+    # Watermarks written before updated_at existed; the schema migration copies
+    # processing_timestamp_utc into updated_at, so the old position carries over.
+    if "updated_at" not in watermark:
+        watermark["updated_at"] = watermark.pop("processing_timestamp_utc")
+    return watermark
+
+def write_watermark(output_dir, updated_at, message_id, rows):
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w") as watermark_file:
+        json.dump({
+            "updated_at": updated_at,
+            "message_id": message_id,
+            "rows_in_last_export": rows,
+        }, watermark_file)
+    os.replace(f"{path}.tmp", path)
+
+def export(conn, output_dir, full, include_raw_metadata, fetch_size, row_group_size, max_buffered_rows, max_open_writers,
+           settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """Runs one (incremental unless `full`) export. Returns the number of rows written."""
+    os.makedirs(output_dir, exist_ok=True)
+    watermark = None if full else read_watermark(output_dir)
+    sql = EXPORT_SQL.format(
+        raw_metadata_column="raw_metadata," if include_raw_metadata else "",
+        watermark_filter=WATERMARK_FILTER if watermark else "",
+    )
+    # Same format as shared.db.row_updated_at, so the comparison also works on SQLite text.
+    settled_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=settle_seconds)
+    params = (settled_before.isoformat(timespec='microseconds') + 'Z',)
+    if watermark:
+        params += (watermark["updated_at"], watermark["message_id"])
+        print(f"Incremental export after {watermark['updated_at']} / {watermark['message_id']}")
+
+    writer = PartitionedParquetWriter(output_dir, build_schema(include_raw_metadata),
+                                      row_group_size, max_buffered_rows, max_open_writers)
+    rows_written, last_row = 0, None
+    try:
+        for rows in stream_dicts(conn, sql, params, fetch_size):
+            for row in rows:
+                writer.write_row(flatten_row(row, include_raw_metadata))
+            rows_written += len(rows)
+            last_row = rows[-1]
+    finally:
+        writer.close()
+
+    # The watermark only moves once every file is closed, so a failed run is simply re-run.
+    if last_row is not None:
+        last_timestamp = last_row["updated_at"]
+        if isinstance(last_timestamp, datetime.datetime):
+            last_timestamp = last_timestamp.isoformat()
+        write_watermark(output_dir, last_timestamp, last_row["message_id"], rows_written)
+    print(f"Exported {rows_written} rows into {len(writer.files_written)} files under {output_dir}")
+    return rows_written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export enriched_feedback to partitioned Parquet.")
+    parser.add_argument("--output", required=True, help="Output directory.")
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and export everything.")
+    parser.add_argument("--include-raw-metadata", action="store_true", help="Add raw_metadata as a JSON column.")
+    parser.add_argument("--fetch-size", type=int, default=DEFAULT_FETCH_SIZE)
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    parser.add_argument("--max-buffered-rows", type=int, default=DEFAULT_MAX_BUFFERED_ROWS)
+    parser.add_argument("--max-open-writers", type=int, default=DEFAULT_MAX_OPEN_WRITERS)
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="Leave rows written in the last N seconds for the next run.")
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow # noqa: F401
+    except ImportError:
+        print("ERROR: The Parquet export requires pyarrow (pip install pyarrow).")
+        return 1
+
+    conn = get_db_connection()
+    try:
+        export(conn, args.output, args.full, args.include_raw_metadata, args.fetch_size,
+               args.row_group_size, args.max_buffered_rows, args.max_open_writers, args.settle_seconds)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
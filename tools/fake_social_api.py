@@ -0,0 +1,272 @@
+"""
+Local fake of the Twitter (X) search and TikTok comments APIs, for exercising the
+connectors' adaptive polling (shared/polling.py) without credentials or real rate limits.
+
+It behaves like the real APIs where polling is concerned:
+  - new items keep arriving (a Poisson process whose rate follows a per-source schedule)
+  - `since_id` returns only newer items, newest first, one page at a time; the next (older)
+    page is requested with the token from the previous one (Twitter: meta.next_token sent
+    back as next_token; TikTok: cursor, with has_more)
+  - a fixed-window rate limit per source, reported in x-rate-limit-* headers (Twitter:
+    reset as epoch seconds) or x-ratelimit-* headers (TikTok: seconds until reset), with
+    429 + Retry-After once the window is used up
+  - an ETag naming the newest item; If-None-Match on an unchanged source gets a 304,
+    which is not charged against the limit (unless charge_not_modified is set)
+
+Run it and point the connectors at it (from the repository root):
+    python -m tools.fake_social_api --port 8090
+    TWITTER_API_BASE_URL=http://localhost:8090/twitter TIKTOK_API_BASE_URL=http://localhost:8090/tiktok \\
+        python local_pipeline_runner.py
+
+tools/simulate_polling.py drives it with a simulated clock to compare polling strategies.
+"""
+import argparse
+import datetime
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+TWITTER_TEXTS = [
+    "FlowHub mobile app is crashing on iOS 17.5 when I try to upload files. #bugreport",
+    "Loving FlowHub, but really need a built-in time tracker for tasks! #feature_request",
+    "FlowHub saved our remote team! Tasks are clearer, communication is smoother.",
+    "This FlowHub update is a mess. Thinking of switching back to Asana.",
+]
+TIKTOK_TEXTS = [
+    "The FlowHub mobile app is super laggy on my Android device after the last update. #buggy",
+    "Wish FlowHub had better integration with Canva for design teams. #featureidea",
+    "FlowHub is great for team syncs! Love the new video call integration. #FlowHub",
+]
+
+class SimulatedClock:
+    """A clock that only moves when told to; sleep() advances it instantly."""
+
+    def __init__(self, start):
+        self.now = start
+        self.lock = threading.Lock()
+
+    def time(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += max(seconds, 0.0)
+
+    def advance_to(self, timestamp):
+        with self.lock:
+            self.now = max(self.now, timestamp)
+
+def iso_utc(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(timespec='seconds').replace("+00:00", "Z")
+
+def make_tweet(item_id, created, rng):
+    return {
+        "id": str(item_id), "created_at": iso_utc(created), "text": rng.choice(TWITTER_TEXTS),
+        "author": {"id": str(rng.randint(1, 999)), "username": f"fake_user_{rng.randint(1, 999)}"},
+        "source_url": f"https://twitter.com/i/status/{item_id}",
+    }
+
+def make_tiktok_comment(item_id, created, rng):
+    return {
+        "comment_id": str(item_id), "video_id": f"v{rng.randint(100, 199)}", "timestamp": iso_utc(created),
+        "text": rng.choice(TIKTOK_TEXTS), "user_info": {"id": f"tk{rng.randint(1, 999)}", "nickname": "FakeCreator"},
+        "comment_url": f"https://tiktok.com/comment/{item_id}",
+    }
+
+class FakeSource:
+    """One fake API: its item stream, rate-limit window and response format."""
+
+    def __init__(self, name, clock, rate_schedule, limit, window_seconds, max_page_size, style, seed=0,
+                 charge_not_modified=False):
+        self.name = name
+        self.clock = clock
+        self.rate_schedule = sorted(rate_schedule) # [(seconds after start, items per second)]
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_page_size = max_page_size
+        self.style = style # "twitter" or "tiktok"
+        self.charge_not_modified = charge_not_modified # Some APIs count 304s against the limit
+        self.rng = random.Random(seed)
+        self.start = clock.time()
+        self.items = [] # (id, created_at epoch, payload), ascending
+        self.cursor = self.start # Items are generated up to here...
+        self.pending_arrival = None # ...and this one is drawn but not due yet
+        self.next_id = 1000
+        self.window_index = None
+        self.window_used = 0
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "charged": 0, "not_modified": 0, "throttled": 0}
+
+    def rate_at(self, timestamp):
+        rate = 0.0
+        for offset, scheduled_rate in self.rate_schedule:
+            if timestamp - self.start >= offset:
+                rate = scheduled_rate
+        return rate
+
+    def next_rate_change(self, timestamp):
+        for offset, _ in self.rate_schedule:
+            if self.start + offset > timestamp:
+                return self.start + offset
+        return None
+
+    def generate_until(self, timestamp):
+        """Adds the items that arrived up to `timestamp`."""
+        while True:
+            if self.pending_arrival is None:
+                rate = self.rate_at(self.cursor)
+                change = self.next_rate_change(self.cursor)
+                if rate <= 0:
+                    if change is None or change > timestamp:
+                        return
+                    self.cursor = change
+                    continue
+                arrival = self.cursor + self.rng.expovariate(rate)
+                if change is not None and arrival >= change:
+                    self.cursor = change # Redraw with the new rate (arrivals are memoryless)
+                    continue
+                self.pending_arrival = arrival
+            if self.pending_arrival > timestamp:
+                return
+            make_item = make_tweet if self.style == "twitter" else make_tiktok_comment
+            self.items.append((self.next_id, self.pending_arrival, make_item(self.next_id, self.pending_arrival, self.rng)))
+            self.next_id += self.rng.randint(1, 50) # Ids grow, with gaps, like snowflake ids
+            self.cursor, self.pending_arrival = self.pending_arrival, None
+
+    def rate_limit_headers(self, now):
+        reset_at = (self.window_index + 1) * self.window_seconds
+        remaining = max(self.limit - self.window_used, 0)
+        if self.style == "twitter":
+            return {"x-rate-limit-limit": str(self.limit), "x-rate-limit-remaining": str(remaining),
+                    "x-rate-limit-reset": str(int(reset_at))}
+        return {"X-RateLimit-Limit": str(self.limit), "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": str(int(reset_at - now))}
+
+    def handle(self, params, if_none_match):
+        """Returns (status, headers, body dict or None) for one GET."""
+        with self.lock:
+            now = self.clock.time()
+            self.generate_until(now)
+            self.stats["requests"] += 1
+            window_index = int(now // self.window_seconds)
+            if window_index != self.window_index:
+                self.window_index, self.window_used = window_index, 0
+
+            newest_id = self.items[-1][0] if self.items else 0
+            etag = f'"{self.name}-{newest_id}"'
+            since_id = int(params.get("since_id") or 0)
+            not_modified = if_none_match == etag and since_id >= newest_id
+            if not_modified and not self.charge_not_modified:
+                self.stats["not_modified"] += 1
+                return 304, dict(self.rate_limit_headers(now), ETag=etag), None
+
+            if self.window_used >= self.limit:
+                self.stats["throttled"] += 1
+                headers = self.rate_limit_headers(now)
+                headers["Retry-After"] = str(int((self.window_index + 1) * self.window_seconds - now) + 1)
+                return 429, headers, {"error": "Too Many Requests"}
+            self.window_used += 1
+            self.stats["charged"] += 1
+            if not_modified:
+                self.stats["not_modified"] += 1
+                return 304, dict(self.rate_limit_headers(now), ETag=etag), None
+
+            size_param = "max_results" if self.style == "twitter" else "count"
+            token_param = "next_token" if self.style == "twitter" else "cursor"
+            page_size = min(int(params.get(size_param) or self.max_page_size), self.max_page_size)
+            # The token names the oldest item already returned; the next page starts below it.
+            older_than = int(params[token_param]) if params.get(token_param) else None
+            newer = [item for item in reversed(self.items) if item[0] > since_id
+                     and (older_than is None or item[0] < older_than)]
+            page, has_more = newer[:page_size], len(newer) > page_size
+            headers = dict(self.rate_limit_headers(now), ETag=etag)
+            payloads = [payload for _, _, payload in page]
+            token = str(page[-1][0]) if has_more else None
+            if self.style == "twitter":
+                meta = {"result_count": len(page)}
+                if page:
+                    meta.update(newest_id=str(page[0][0]), oldest_id=str(page[-1][0]))
+                if token:
+                    meta["next_token"] = token
+                return 200, headers, {"data": payloads, "meta": meta}
+            return 200, headers, {"comments": payloads, "cursor": token, "has_more": has_more}
+
+class FakeSocialApi:
+    """The fake sources behind one HTTP server: /twitter/tweets/search/recent and /tiktok/comments."""
+
+    ROUTES = {"/twitter/tweets/search/recent": "twitter", "/tiktok/comments": "tiktok"}
+
+    def __init__(self, sources):
+        self.sources = sources # name -> FakeSource
+        self.server = None
+
+    def serve_in_background(self, port=0):
+        api = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real APIs
+            disable_nagle_algorithm = True # Headers and body are written separately
+
+            def do_GET(self):
+                parsed = urllib.parse.urlsplit(self.path)
+                source = api.sources.get(api.ROUTES.get(parsed.path))
+                if source is None:
+                    status, headers, body = 404, {}, {"error": "not found"}
+                else:
+                    params = dict(urllib.parse.parse_qsl(parsed.query))
+                    status, headers, body = source.handle(params, self.headers.get("If-None-Match"))
+                payload = b"" if body is None else json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+def default_sources(clock, seed=0, twitter_schedule=None, tiktok_schedule=None, charge_not_modified=False):
+    """Twitter: 60 calls per 15 minutes, 100 per page. TikTok: 30 calls per 15 minutes, 50 per page."""
+    return {
+        "twitter": FakeSource("twitter", clock, twitter_schedule or [(0, 0.05)], limit=60, window_seconds=900,
+                              max_page_size=100, style="twitter", seed=seed, charge_not_modified=charge_not_modified),
+        "tiktok": FakeSource("tiktok", clock, tiktok_schedule or [(0, 0.01)], limit=30, window_seconds=900,
+                             max_page_size=50, style="tiktok", seed=seed + 1, charge_not_modified=charge_not_modified),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake, rate-limited Twitter and TikTok APIs.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--twitter-rate", type=float, default=0.05, help="New tweets per second.")
+    parser.add_argument("--tiktok-rate", type=float, default=0.01, help="New TikTok comments per second.")
+    parser.add_argument("--charge-304s", action="store_true", help="Count 304 Not Modified against the rate limit.")
+    args = parser.parse_args()
+
+    class WallClock:
+        time = staticmethod(time.time)
+
+    api = FakeSocialApi(default_sources(WallClock(), twitter_schedule=[(0, args.twitter_rate)],
+                                        tiktok_schedule=[(0, args.tiktok_rate)], charge_not_modified=args.charge_304s))
+    base_url = api.serve_in_background(args.port)
+    print(f"Fake social APIs on {base_url}/twitter and {base_url}/tiktok (Ctrl+C to stop).")
+    try:
+        while True:
+            time.sleep(60)
+            print(" | ".join(f"{name}: {source.stats}" for name, source in api.sources.items()))
+    except KeyboardInterrupt:
+        api.shutdown()
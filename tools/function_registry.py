@@ -0,0 +1,15 @@
+# --- Deployed Cloud Functions ---
+# Maps each function source directory to the entry point(s) deployed from it.
+# Used by the build tooling in this directory (import profiling, requirements generation).
+FUNCTION_ENTRYPOINTS = {
+    "twitter_connector": ["twitter_connector_entrypoint"],
+    "tiktok_connector": ["tiktok_connector_entrypoint"],
+    "connector_scheduler": ["connector_scheduler_entrypoint"],
+    "central_ai_processor": ["ai_processor_entrypoint", "reply_generation_entrypoint"],
+    "data_storage_listener": ["data_storage_listener_entrypoint"],
+    "feedback_query_api": ["feedback_query_api_entrypoint"],
+    "spike_detector": ["spike_detector_entrypoint"],
+    "jira_integration": ["jira_integration_entrypoint"],
+    "basecamp_integration": ["basecamp_integration_entrypoint"],
+    "email_reply_integration": ["email_reply_integration_entrypoint"],
+}
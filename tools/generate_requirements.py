@@ -0,0 +1,208 @@
+"""
+Generates a minimal requirements.txt for each Cloud Function from what it actually imports.
+
+The function's main.py is parsed (not executed) and every import it reaches is collected,
+including deferred imports inside functions and imports made by local modules it uses
+(sibling modules in the function directory and the repository's `shared` package).
+Modules loaded by name at runtime (the connectors that shared/connectors.py imports with
+importlib) are followed too, for any function that reaches the module loading them.
+Third-party imports are mapped to their distributions and pinned to the versions in the
+repository-wide lock file (requirements.txt at the root). Only direct dependencies are
+listed: the output must not depend on what happens to be installed locally, and pip
+resolves the transitive dependencies at deploy time.
+
+Usage (from the repository root):
+    python -m tools.generate_requirements           # rewrite every function's requirements.txt
+    python -m tools.generate_requirements --check   # exit non-zero if any file is out of date
+"""
+import argparse
+import ast
+import os
+import re
+import sys
+
+from shared.connectors import CONNECTOR_MODULES
+from tools.function_registry import FUNCTION_ENTRYPOINTS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCK_FILE = os.path.join(REPO_ROOT, "requirements.txt")
+LOCAL_PACKAGES = {"shared"}
+# Local module path -> modules it imports dynamically (importlib), which static parsing misses.
+DYNAMIC_IMPORTS = {
+    os.path.join(REPO_ROOT, "shared", "connectors.py"): list(CONNECTOR_MODULES.values()),
+}
+GENERATED_HEADER = "# Generated by tools/generate_requirements.py from the root requirements.txt. Do not edit by hand.\n"
+
+# Import names that do not match their distribution names.
+IMPORT_TO_DISTRIBUTION = {
+    "google.cloud.pubsub_v1": "google-cloud-pubsub",
+    "google.cloud.language_v1": "google-cloud-language",
+    "google.cloud.storage": "google-cloud-storage",
+    "vertexai": "google-cloud-aiplatform",
+    "pg8000": "pg8000",
+    "requests": "requests",
+    "numpy": "numpy",
+}
+
+def read_lock_file():
+    """Returns {normalized distribution name: pinned requirement line} from the root lock file."""
+    pins = {}
+    with open(LOCK_FILE) as lock:
+        for line in lock:
+            line = line.strip()
+            if not line or line.startswith("#") or "==" not in line:
+                continue
+            name = line.split("==", 1)[0]
+            pins[normalize_distribution_name(name)] = line
+    return pins
+
+def normalize_distribution_name(name):
+    """PEP 503 normalization so 'typing_extensions' and 'typing-extensions' compare equal."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def collect_imports(path, function_dir, only_names=None, seen=None):
+    """
+    Returns the set of absolute module names imported in `path`, following imports of
+    local modules (function siblings and LOCAL_PACKAGES). When `only_names` is given,
+    only module-level imports and the named top-level definitions are considered, so
+    `from shared.clients import get_publisher` does not pull in every SDK that other
+    factories in shared/clients.py import lazily.
+    """
+    seen = seen if seen is not None else set()
+    keys = {(path, name) for name in only_names} if only_names else {(path, None)}
+    if keys <= seen or not os.path.exists(path):
+        return set()
+    seen |= keys
+
+    with open(path) as source:
+        tree = ast.parse(source.read(), filename=path)
+
+    if only_names:
+        scopes = select_scopes(tree, only_names)
+    else:
+        scopes = [tree]
+
+    imported = set()
+    for node in (child for scope in scopes for child in ast.walk(scope)):
+        if isinstance(node, ast.Import):
+            targets = [(alias.name, None) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            imported_names = {alias.name for alias in node.names}
+            if node.level and not node.module: # from . import sibling
+                targets = [(name, None) for name in imported_names]
+            else:
+                targets = [(node.module, imported_names)]
+        else:
+            continue
+
+        for name, names in targets:
+            local_path = resolve_local_module(name, function_dir)
+            if local_path:
+                imported |= collect_imports(local_path, function_dir, names, seen)
+            elif not is_local_name(name, function_dir):
+                imported.add(name)
+                imported |= {f"{name}.{attribute}" for attribute in names or ()}
+    return imported
+
+def select_scopes(tree, only_names):
+    """
+    Returns the module-level statements of `tree` plus the named top-level definitions and,
+    transitively, any other top-level definitions they reference by name.
+    """
+    definitions = {node.name: node for node in tree.body
+                   if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+    selected, pending = set(), [name for name in only_names if name in definitions]
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        selected.add(name)
+        pending += [node.id for node in ast.walk(definitions[name])
+                    if isinstance(node, ast.Name) and node.id in definitions]
+    module_level = [node for node in tree.body if getattr(node, "name", None) not in definitions]
+    return module_level + [definitions[name] for name in selected]
+
+def is_local_name(module_name, function_dir):
+    """True for attributes of local modules, e.g. 'shared.clients.get_publisher'."""
+    top_level = module_name.split(".")[0]
+    return (top_level in LOCAL_PACKAGES or top_level == function_dir
+            or resolve_local_module(top_level, function_dir) is not None)
+
+def resolve_local_module(module_name, function_dir):
+    """Returns the source path for a module that lives in this repository, or None."""
+    parts = module_name.split(".")
+    if parts[0] in LOCAL_PACKAGES:
+        base = REPO_ROOT
+    elif parts[0] == function_dir:
+        base, parts = os.path.join(REPO_ROOT, function_dir), parts[1:]
+    else:
+        base = os.path.join(REPO_ROOT, function_dir)
+    candidate = os.path.join(base, *parts)
+    for path in (candidate + ".py", os.path.join(candidate, "__init__.py")):
+        if parts and os.path.isfile(path):
+            return path
+    return None
+
+def map_imports_to_distributions(imported):
+    """Maps imported module names to distribution names, ignoring the standard library."""
+    distributions = set()
+    for name in imported:
+        for prefix, distribution in IMPORT_TO_DISTRIBUTION.items():
+            if name == prefix or name.startswith(prefix + "."):
+                distributions.add(distribution)
+                break
+        else:
+            top_level = name.split(".")[0]
+            if top_level in sys.stdlib_module_names or top_level == "google":
+                continue
+            distributions.add(top_level)
+    return distributions
+
+def build_requirements(function_dir, pins):
+    """Returns the generated requirements.txt content for one function."""
+    seen = set()
+    imported = collect_imports(os.path.join(REPO_ROOT, function_dir, "main.py"), function_dir, seen=seen)
+    reached = {path for path, _ in seen}
+    for loader_path, module_names in DYNAMIC_IMPORTS.items():
+        if loader_path not in reached:
+            continue
+        for module_name in module_names:
+            module_dir = module_name.split(".")[0]
+            imported |= collect_imports(resolve_local_module(module_name, module_dir), module_dir, seen=seen)
+    distributions = map_imports_to_distributions(imported)
+
+    lines = []
+    for name in sorted(distributions):
+        if name not in pins:
+            print(f"WARNING: {function_dir} imports '{name}', which is not pinned in requirements.txt.")
+            continue
+        lines.append(pins[name] + "\n")
+    return GENERATED_HEADER + "".join(sorted(lines, key=str.lower))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate per-function requirements.txt files.")
+    parser.add_argument("functions", nargs="*", help="Function directories (default: all).")
+    parser.add_argument("--check", action="store_true", help="Only report out-of-date files.")
+    args = parser.parse_args(argv)
+
+    pins = read_lock_file()
+    stale = []
+    for function_dir in args.functions or list(FUNCTION_ENTRYPOINTS):
+        content = build_requirements(function_dir, pins)
+        path = os.path.join(REPO_ROOT, function_dir, "requirements.txt")
+        current = open(path).read() if os.path.exists(path) else None
+        if current == content:
+            continue
+        stale.append(function_dir)
+        if not args.check:
+            with open(path, "w") as requirements_file:
+                requirements_file.write(content)
+            print(f"Wrote {path} ({content.count(chr(10)) - 1} packages)")
+
+    if args.check and stale:
+        print(f"Out-of-date requirements.txt: {', '.join(stale)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
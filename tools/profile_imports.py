@@ -0,0 +1,94 @@
+"""
+Import-time profiling report for every Cloud Function entry point.
+
+Each function's main.py is imported in a fresh interpreter with `-X importtime`,
+which is exactly the work a cold start pays before the first request is served.
+
+Usage (from the repository root):
+    python -m tools.profile_imports                      # report for every function
+    python -m tools.profile_imports central_ai_processor # report for one function
+    python -m tools.profile_imports --budget-ms 500      # exit non-zero if any function exceeds the budget
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from tools.function_registry import FUNCTION_ENTRYPOINTS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TOP_N = 10
+
+def profile_function_imports(function_dir):
+    """
+    Imports <function_dir>/main.py in a clean subprocess with -X importtime.
+    Returns (total_ms, [(cumulative_ms, self_ms, module_name), ...], error_text).
+    """
+    main_path = os.path.join(REPO_ROOT, function_dir, "main.py")
+    # Mirror the Cloud Functions runtime: the function directory is the import root,
+    # with the repository root available for the shared package.
+    code = (
+        "import importlib.util, sys; "
+        f"sys.path[:0] = [{os.path.join(REPO_ROOT, function_dir)!r}, {REPO_ROOT!r}]; "
+        f"spec = importlib.util.spec_from_file_location('main', {main_path!r}); "
+        "module = importlib.util.module_from_spec(spec); "
+        "spec.loader.exec_module(module)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=REPO_ROOT
+    )
+
+    modules = []
+    error_lines = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            error_lines.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue # Header line
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2]
+        # Only top-level imports (no leading indentation) contribute directly to the total.
+        modules.append((cumulative_us / 1000.0, self_us / 1000.0, name.rstrip(), not name.startswith("  ")))
+
+    total_ms = sum(cumulative for cumulative, _, _, top_level in modules if top_level)
+    breakdown = sorted(((c, s, n.strip()) for c, s, n, _ in modules), reverse=True)
+    error_text = "\n".join(error_lines) if result.returncode != 0 else None
+    return total_ms, breakdown, error_text
+
+def print_report(function_dir, total_ms, breakdown, error_text, top_n):
+    """Prints a human-readable import profile for one function."""
+    entrypoints = ", ".join(FUNCTION_ENTRYPOINTS.get(function_dir, []))
+    print(f"== {function_dir} ({entrypoints}) ==")
+    if error_text:
+        print(f"  ERROR: main.py failed to import:\n{error_text}")
+        return
+    print(f"  Total import time: {total_ms:.1f} ms")
+    print(f"  {'cumulative ms':>14} {'self ms':>10}  module")
+    for cumulative_ms, self_ms, name in breakdown[:top_n]:
+        print(f"  {cumulative_ms:>14.1f} {self_ms:>10.1f}  {name}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report cold-import time for each Cloud Function.")
+    parser.add_argument("functions", nargs="*", help="Function directories to profile (default: all).")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Number of slowest modules to list.")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail if any function's cold import exceeds this many milliseconds.")
+    args = parser.parse_args(argv)
+
+    function_dirs = args.functions or list(FUNCTION_ENTRYPOINTS)
+    over_budget = []
+    for function_dir in function_dirs:
+        total_ms, breakdown, error_text = profile_function_imports(function_dir)
+        print_report(function_dir, total_ms, breakdown, error_text, args.top)
+        if error_text or (args.budget_ms is not None and total_ms > args.budget_ms):
+            over_budget.append(function_dir)
+
+    if over_budget:
+        print(f"FAILED: cold import over budget or broken for: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Replays a day-part of Twitter and TikTok traffic against the fake APIs in
+tools/fake_social_api.py and compares polling strategies for the connectors.
+
+A simulated clock drives both the fake APIs and the connectors' PollingControllers, so
+hours of traffic replay in seconds. Cloud Scheduler is modelled as a tick every
+--tick-seconds; every tick calls the connector's real fetch function (HTTP included,
+against the local server) and the instance is occasionally recycled (a cold start that
+reloads the polling state from the checkpoint store).
+
+Strategies:
+    fixed-<N>s  one unconditional poll per scheduler tick of N seconds (the old cadence)
+    adaptive    shared/polling.py: ETag/since_id, rate-limit budget, arrival-rate pacing
+
+Usage (from the repository root):
+    python -m tools.simulate_polling
+    python -m tools.simulate_polling --hours 12 --cold-start-probability 0.2 --seed 3
+    python -m tools.simulate_polling --charge-304s   # conditional requests still cost a call
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+
+from shared.polling import PollingController
+from tools.fake_social_api import FakeSocialApi, SimulatedClock, default_sources
+
+import tiktok_connector.main as tiktok_connector
+import twitter_connector.main as twitter_connector
+
+SIMULATION_START = 1750000000.0 # Any fixed epoch; windows are aligned to it like real ones
+HOUR = 3600
+
+# (seconds after start, items per second): quiet, an incident burst, then a quiet night.
+TWITTER_SCHEDULE = [(0, 0.01), (2 * HOUR, 0.3), (2.5 * HOUR, 0.03), (4 * HOUR, 0.0), (5 * HOUR, 0.01)]
+TIKTOK_SCHEDULE = [(0, 0.002), (3 * HOUR, 0.1), (3.3 * HOUR, 0.002)]
+
+class MemoryStateStore:
+    """Stands in for stream_checkpoints; JSON round-trips like the real table."""
+
+    def __init__(self):
+        self.saved = {}
+
+    def load(self, name):
+        return json.loads(self.saved[name]) if name in self.saved else None
+
+    def save(self, name, state):
+        self.saved[name] = json.dumps(state)
+
+# source name -> (connector module, poller global, base URL global, fetch function, raw item id key)
+CONNECTORS = {
+    "twitter": (twitter_connector, "TWITTER_POLLER", "TWITTER_API_BASE_URL", "fetch_raw_tweets", "id"),
+    "tiktok": (tiktok_connector, "TIKTOK_POLLER", "TIKTOK_API_BASE_URL", "fetch_raw_tiktok_comments", "comment_id"),
+}
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def simulate(source_name, adaptive, tick_seconds, hours, cold_start_probability, seed, charge_304s=False, verbose=False):
+    """Runs one source under one strategy; returns a result row."""
+    clock = SimulatedClock(SIMULATION_START)
+    api = FakeSocialApi(default_sources(clock, seed=seed, twitter_schedule=TWITTER_SCHEDULE,
+                                        tiktok_schedule=TIKTOK_SCHEDULE, charge_not_modified=charge_304s))
+    base_url = api.serve_in_background(0)
+    module, poller_name, url_name, fetch_name, id_key = CONNECTORS[source_name]
+    store = MemoryStateStore()
+    rng = random.Random(seed)
+    setattr(module, url_name, f"{base_url}/{source_name}")
+
+    seen, duplicates, lags, cold_starts = set(), 0, [], 0
+    try:
+        fake_source = api.sources[source_name]
+        end = SIMULATION_START + hours * HOUR
+        tick = SIMULATION_START
+        while tick < end:
+            clock.advance_to(tick)
+            if getattr(module, poller_name).clock is not clock or rng.random() < cold_start_probability:
+                cold_starts += 1
+                setattr(module, poller_name, PollingController(source_name, clock=clock, store=store, adaptive=adaptive))
+            created_at = None
+            with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+                # Lag is measured as each item is yielded; the invocation may sleep between rounds.
+                for raw in getattr(module, fetch_name)():
+                    if created_at is None or raw[id_key] not in created_at:
+                        created_at = {str(item_id): created for item_id, created, _ in fake_source.items}
+                    item_id = raw[id_key]
+                    if item_id in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(item_id)
+                    lags.append(clock.time() - created_at[item_id])
+            tick += tick_seconds
+        fake_source.generate_until(end)
+        generated = sum(1 for _, created, _ in fake_source.items if created <= end)
+    finally:
+        api.shutdown()
+        # Stop the connector printing and polling against a server that is gone.
+        setattr(module, url_name, "")
+
+    stats = fake_source.stats
+    return {
+        "source": source_name,
+        "strategy": "adaptive" if adaptive else f"fixed-{tick_seconds:.0f}s",
+        "charged": stats["charged"],
+        "not_modified": stats["not_modified"],
+        "throttled": stats["throttled"],
+        "fetched": len(seen),
+        "generated": generated,
+        "duplicates": duplicates,
+        "lag_mean": sum(lags) / len(lags) if lags else 0.0,
+        "lag_p95": percentile(lags, 0.95),
+        "cold_starts": cold_starts,
+    }
+
+def print_results(rows):
+    header = (f"{'source':<8} {'strategy':<10} {'charged':>8} {'304s':>6} {'429s':>6} {'fetched':>9} "
+              f"{'dupes':>6} {'lag mean':>9} {'lag p95':>8} {'items/call':>10}")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        per_call = row["fetched"] / row["charged"] if row["charged"] else 0.0
+        print(f"{row['source']:<8} {row['strategy']:<10} {row['charged']:>8} {row['not_modified']:>6} "
+              f"{row['throttled']:>6} {row['fetched']:>4}/{row['generated']:<4} {row['duplicates']:>6} "
+              f"{row['lag_mean']:>8.0f}s {row['lag_p95']:>7.0f}s {per_call:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fixed and adaptive connector polling against the fake APIs.")
+    parser.add_argument("--hours", type=float, default=6.0)
+    parser.add_argument("--tick-seconds", type=float, nargs="+", default=[60.0, 15.0],
+                        help="Scheduler tick(s) for the fixed-cadence baselines; adaptive runs on the first.")
+    parser.add_argument("--cold-start-probability", type=float, default=0.1,
+                        help="Chance per tick that the instance is recycled and reloads its saved state.")
+    parser.add_argument("--sources", nargs="+", default=list(CONNECTORS), choices=list(CONNECTORS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--charge-304s", action="store_true",
+                        help="Make the fake APIs count 304s against the rate limit (as Twitter's search does).")
+    parser.add_argument("--verbose", action="store_true", help="Show the connectors' per-invocation log lines.")
+    args = parser.parse_args()
+
+    results = []
+    common = (args.hours, args.cold_start_probability, args.seed, args.charge_304s, args.verbose)
+    for source_name in args.sources:
+        for tick_seconds in args.tick_seconds:
+            results.append(simulate(source_name, False, tick_seconds, *common))
+        results.append(simulate(source_name, True, args.tick_seconds[0], *common))
+    print_results(results)
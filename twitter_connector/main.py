@@ -1,15 +1,30 @@
 import json
 import datetime
+import os
 import uuid
-from google.cloud import pubsub_v1
+from shared.clients import get_topic_path
+from shared.connectors import register_connector, run_connector
+from shared.polling import PollingController, fetch_page_json, page_from_response, poll_interval_summary
+from shared.profiling import profiled
 
 # --- Configuration ---
 # !!! IMPORTANT: REPLACE THESE WITH YOUR ACTUAL GOOGLE CLOUD PROJECT ID AND TOPIC NAME !!!
 PROJECT_ID = "zenithflow-feedback-automation"
 RAW_FEEDBACK_TOPIC_NAME = "raw-feedback-toc" # This is the Pub/Sub topic for all raw, normalized data
 
-publisher = pubsub_v1.PublisherClient()
-raw_feedback_topic_path = publisher.topic_path(PROJECT_ID, RAW_FEEDBACK_TOPIC_NAME)
+# The publisher is created lazily on first publish (see shared/clients.py)
+raw_feedback_topic_path = get_topic_path(PROJECT_ID, RAW_FEEDBACK_TOPIC_NAME)
+
+# --- Twitter (X) API Configuration ---
+# Leave TWITTER_API_BASE_URL empty to emit the dummy data below. When set (to the API, or to
+# the local fake in tools/fake_social_api.py), the search endpoint is polled adaptively with
+# since_id/ETag conditional requests and a rate-limit budget (see shared/polling.py).
+TWITTER_API_BASE_URL = os.environ.get("TWITTER_API_BASE_URL", "")
+TWITTER_BEARER_TOKEN = os.environ.get("TWITTER_BEARER_TOKEN", "your_fictitious_twitter_bearer_token")
+TWITTER_SEARCH_QUERY = os.environ.get("TWITTER_SEARCH_QUERY", "FlowHub OR @ZenithFlowSupport")
+TWITTER_PAGE_SIZE = 100
+
+TWITTER_POLLER = PollingController("twitter")
 
 # --- Fictitious Dummy Twitter (X) Data for ZenithFlow Solutions ---
 # This list simulates tweets that our connector would fetch from the Twitter (X) API.
@@ -99,6 +114,40 @@ def process_raw_tweet_to_normalized_schema(raw_tweet):
 
     return normalized_feedback
 
+def fetch_tweet_page(since_id, etag, page_token=None):
+    """
+    One search call for tweets newer than `since_id`, returned newest first. meta.next_token
+    means older ones are waiting; it is sent back as `next_token` for the next page.
+    Returns the page dict used by PollingController.
+    """
+    response = fetch_page_json(
+        f"{TWITTER_API_BASE_URL}/tweets/search/recent",
+        params={"query": TWITTER_SEARCH_QUERY, "since_id": since_id, "max_results": TWITTER_PAGE_SIZE,
+                "next_token": page_token},
+        headers={"Authorization": f"Bearer {TWITTER_BEARER_TOKEN}"},
+        etag=etag,
+    )
+    if response.status_code != 200:
+        return page_from_response(response)
+    body = response.json()
+    meta = body.get("meta", {})
+    return page_from_response(response, body.get("data", []), meta.get("newest_id"), meta.get("next_token"))
+
+def fetch_raw_tweets():
+    """
+    Yields raw Twitter items: from the Twitter API when TWITTER_API_BASE_URL is set,
+    otherwise from our predefined dummy list.
+    """
+    if not TWITTER_API_BASE_URL:
+        yield from dummy_twitter_data
+        return
+    yield from TWITTER_POLLER.poll(fetch_tweet_page)
+    print(poll_interval_summary(TWITTER_POLLER))
+
+# Registered so the connector scheduler (connector_scheduler/main.py) can run this source too.
+TWITTER_CONNECTOR = register_connector("twitter", fetch_raw_tweets, process_raw_tweet_to_normalized_schema)
+
+@profiled
 def twitter_connector_entrypoint(request):
     """
     Cloud Function entry point for the Twitter Connector.
@@ -106,24 +155,7 @@ def twitter_connector_entrypoint(request):
     """
     print(f"Twitter Connector triggered. Project: {PROJECT_ID}, Topic: {RAW_FEEDBACK_TOPIC_NAME}")
 
-    processed_count = 0
-    # In a real function, you'd call the Twitter API here to fetch new data.
-    # For this dummy setup, we iterate our predefined list.
-    for tweet in dummy_twitter_data:
-        normalized_data = process_raw_tweet_to_normalized_schema(tweet)
-        if normalized_data:
-            try:
-                # Convert the normalized dictionary to a JSON string, then encode to bytes
-                data_bytes = json.dumps(normalized_data).encode('utf-8')
-
-                # Publish the message to Pub/Sub
-                future = publisher.publish(raw_feedback_topic_path, data_bytes)
-                message_id = future.result() # Blocks until message is published
-                print(f"Published message {message_id} from Twitter (ID: {normalized_data['message_id']}) to raw-feedback-toc.")
-                processed_count += 1
-            except Exception as e:
-                print(f"ERROR: Failed to publish message for Twitter ID {normalized_data.get('message_id', 'N/A')}: {e}")
-                # Log to Cloud Logging
-
-    print(f"Finished processing {processed_count} dummy Twitter messages.")
-    return 'OK', 200  # Return HTTP 200 OK response for Cloud Function success
\ No newline at end of file
+    summary = run_connector(TWITTER_CONNECTOR, raw_feedback_topic_path)
+
+    print(f"Finished processing {summary['published']} Twitter messages.")
+    return 'OK', 200  # Return HTTP 200 OK response for Cloud Function success